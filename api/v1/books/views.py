@@ -1,92 +1,309 @@
-from typing import List
-
-from fastapi import APIRouter, Body, Depends, status
-from fastapi.responses import JSONResponse
-from fastapi_pagination import Page, paginate
-from sqlalchemy.orm import Session
-
-from database.config import get_db
-from database.crud.books import db_delete, db_get_by_id, db_get_by_ids, db_get_censored, db_insert, db_search, db_update
+import csv
+import io
+import json
+import math
+from collections.abc import AsyncIterator, Awaitable, Callable, Hashable
+from typing import List, Literal, Optional, Tuple, TypeVar, Union
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, status
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
+from fastapi_pagination import Page, Params, paginate
+from fastapi_pagination.cursor import CursorPage
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.config import ReadSessionLocal, get_read_db, get_write_db, settings
+from database.crud.catalog import (
+    BOOK_FIELDS,
+    CENSORED_BOOK_FIELDS,
+    BookFilters,
+    BookSort,
+    SearchMode,
+    db_bulk_delete,
+    db_bulk_insert,
+    db_bulk_update,
+    db_count_by_genre,
+    db_count_filtered,
+    db_count_genres,
+    db_delete,
+    db_filter,
+    db_get_by_id,
+    db_get_censored,
+    db_get_censored_after,
+    db_get_stats,
+    db_get_version,
+    db_insert,
+    db_iter_censored,
+    db_search,
+    sort_keyset,
+)
 from models.book import Book
-from schemas.book import BookCreate, BookGet, BooksWithGenres
+from schemas.book import (
+    BookCreate,
+    BookGet,
+    BookSuggestion,
+    BooksWithGenres,
+    BulkAccepted,
+    BulkCreateResult,
+    BulkDeleteRejected,
+    BulkDeleteResult,
+    BulkRejected,
+    CatalogStats,
+    CensoredBook,
+)
+from utils.json_stream import RecordError, iter_json_records
 from utils.logger import logger
+from utils.pagination import PaginationMode, decode_keyset, encode_keyset
+from utils.prefix_index import suggest_index
+from utils.single_flight import read_flights
+from utils.snapshot import CatalogSnapshot, catalog_snapshot
 
 router = APIRouter(prefix="/books")
 
+T = TypeVar("T")
+
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def book_fields(
+    fields: Optional[str] = Query(None, description=f"Comma separated fields of books to return, among {', '.join(BOOK_FIELDS)}; all by default."),
+) -> Optional[Tuple[str, ...]]:
+    """Dependency parsing a sparse fieldset into fields in the order of BOOK_FIELDS, None for all fields."""
+    if fields is None:
+        return None
+
+    requested = {field.strip() for field in fields.split(",")} - {""}
+    unknown = requested.difference(BOOK_FIELDS)
+    if not requested or unknown:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid fields: {', '.join(sorted(unknown)) or fields!r}")
+    return None if requested == set(BOOK_FIELDS) else tuple(field for field in BOOK_FIELDS if field in requested)
+
 
 @router.post("/", response_model=BookGet, status_code=status.HTTP_201_CREATED)
-async def create_book(book: BookCreate = Body(...), db: Session = Depends(get_db)):
+async def create_book(book: BookCreate = Body(...), db: AsyncSession = Depends(get_write_db)):
     """Endpoint to add a New Book. Books with the genre "Horror" cannot be added."""
-    logger.info(f"Creating a book {book!s}")
+    logger.info("Creating a book.", extra={"book": book})
 
-    if book.genre.lower() == "horror":
+    reason = _rejection_reason(book)
+    if reason:
         return JSONResponse(
             content={
-                "reason": f"Books with genre {book.genre} cannot be added.",
+                "reason": reason,
             },
             status_code=status.HTTP_400_BAD_REQUEST,
         )
     db_book = Book(**book.model_dump())
-    db_insert(db, db_book)
+    await db_insert(db, db_book)
+    suggest_index.add(db_book.id, db_book.title, db_book.author, db_book.genre)
+    await _advance_suggest_index()
     return db_book
 
 
-@router.get("/", response_model=Page[BooksWithGenres], status_code=status.HTTP_200_OK)
-async def get_all_books(db: Session = Depends(get_db)):
+@router.post(
+    "/bulk",
+    response_model=BulkCreateResult,
+    status_code=status.HTTP_200_OK,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": {"type": "array", "items": BookCreate.model_json_schema()}},
+                "application/x-ndjson": {"schema": BookCreate.model_json_schema()},
+            },
+        },
+    },
+)
+async def create_books_bulk(request: Request, db: AsyncSession = Depends(get_write_db)):
+    """
+    Endpoint to add many books at once from a JSON array or an NDJSON stream.
+
+    Rows are parsed and validated as the body streams in and added in chunks of settings.BULK_INSERT_CHUNK_SIZE.
+    Books with the genre "Horror" and invalid rows are rejected, the other rows are still added.
+    """
+    logger.info("Creating books in bulk.")
+    result = BulkCreateResult()
+    chunk: List[Tuple[int, BookCreate]] = []
+
+    row = 0
+    async for record in iter_json_records(request.stream(), max_record_size=settings.BULK_MAX_RECORD_SIZE):
+        if isinstance(record, RecordError):
+            reason = str(record)
+        else:
+            try:
+                book = BookCreate.model_validate(record)
+                reason = _rejection_reason(book)
+            except ValidationError as error:
+                reason = "; ".join(f"{'.'.join(map(str, item['loc'])) or 'row'}: {item['msg']}" for item in error.errors(include_url=False))
+
+        if reason:
+            result.rejected.append(BulkRejected(row=row, reason=reason))
+        else:
+            chunk.append((row, book))
+        if len(chunk) >= settings.BULK_INSERT_CHUNK_SIZE:
+            await _insert_chunk(db, chunk, result)
+            chunk = []
+        row += 1
+
+    if chunk:
+        await _insert_chunk(db, chunk, result)
+
+    logger.info("Created books in bulk.", extra={"accepted": len(result.accepted), "rejected": len(result.rejected)})
+    return result
+
+
+@router.get("/", response_model=Union[Page[BooksWithGenres], CursorPage[BooksWithGenres]], status_code=status.HTTP_200_OK)
+async def get_all_books(
+    params: Params = Depends(),
+    cursor: Optional[str] = None,
+    pagination: Optional[PaginationMode] = None,
+    fields: Optional[Tuple[str, ...]] = Depends(book_fields),
+):
     """
     Endpoint to retrieve a List of All Books.
 
     Group books by genre and provide a count for each group.
     Mask titles for books with the genre "18+".
-    """
-    db_books_result = db_get_censored(db)
-    logger.info(f"Found {len(db_books_result)} genres with books.")
+    Paginated by genre, or by (genre, id) keyset in cursor mode.
+    Rows are encoded straight to JSON, skipping response model validation.
+    Served from the catalog snapshot when enabled and up to date, concurrent identical requests share one read.
 
-    if not db_books_result:
+    :param cursor: cursor of the next page, implies cursor mode.
+    :param pagination: pagination mode, settings.PAGINATION_MODE by default.
+    :param fields: fields of books to select and return, all by default.
+    """
+    version = await _catalog_version()
+
+    if cursor or (pagination or settings.PAGINATION_MODE) == "cursor":
+        after = decode_keyset(cursor, str, int)
+        # The ID of the last book makes the next cursor, even if not returned.
+        read_fields = fields and tuple(field for field in BOOK_FIELDS if field in fields or field == "id")
+        db_books_result = await _shared_read(version, _books_after, limit=params.size + 1, after=after, fields=read_fields)
+        logger.info("Found genres with books.", extra={"genres": len(db_books_result), "after": after})
+
+        if not (db_books_result or after):
+            return JSONResponse(
+                content={
+                    "reason": "No books in the library. Sorry!",
+                },
+                status_code=status.HTTP_404_NOT_FOUND,
+            )
+        return _cursor_page_by_genre(db_books_result, params.size, cursor, fields)
+
+    raw_params = params.to_raw_params()
+    total, db_books_result = await _shared_read(version, _books_page, limit=raw_params.limit, offset=raw_params.offset, fields=fields)
+    logger.info("Found genres with books.", extra={"total": total})
+
+    if not total:
         return JSONResponse(
             content={
                 "reason": "No books in the library. Sorry!",
             },
             status_code=status.HTTP_404_NOT_FOUND,
         )
-    return paginate(db_books_result)
+
+    return ORJSONResponse(
+        {
+            "items": db_books_result,
+            "total": total,
+            "page": params.page,
+            "size": params.size,
+            "pages": math.ceil(total / params.size),
+        },
+    )
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={status.HTTP_200_OK: {"content": {media_type: {} for media_type in EXPORT_MEDIA_TYPES.values()}}},
+)
+async def export_books(
+    export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    fields: Optional[Tuple[str, ...]] = Depends(book_fields),
+):
+    """
+    Endpoint to export the whole catalog, streamed from a server-side cursor.
+
+    Books are ordered by ID, one per line.
+    Mask titles for books with the genre "18+".
+
+    :param format: "ndjson" or "csv".
+    :param fields: fields of books to select and export, all by default.
+    """
+    logger.info("Exporting books.", extra={"format": export_format, "fields": fields})
+
+    return StreamingResponse(
+        _export_lines(export_format, fields),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="books.{export_format}"'},
+    )
 
 
 @router.put("/", response_model=List[BookGet], status_code=status.HTTP_200_OK)
-async def update_books(books: List[BookGet] = Body(...), db: Session = Depends(get_db)):
+async def update_books(books: List[BookGet] = Body(...), db: AsyncSession = Depends(get_write_db)):
     """
     Endpoint to update books by IDs. Supports multiple books at once.
 
+    Applied in a single transaction: either all books are updated or none.
+
     :param query: List of IDs separated by comma
     """
-    logger.info(f"Updating books {books!s}")
-    db_books = db_get_by_ids(db, [book.id for book in books])
+    logger.info("Updating books.", extra={"count": len(books), "books": books})
+    db_books = await db_bulk_update(db, books)
 
-    if len(db_books) < len(books):
+    if db_books is None:
         return JSONResponse(
             content={"reason": "Not all books found. Update is allowed only for existing books."},
             status_code=status.HTTP_404_NOT_FOUND,
         )
 
-    for book in books:
-        db_update(db, book)
-
-    db_books = db_get_by_ids(db, [book.id for book in books])
+    suggest_index.add_many((db_book.id, db_book.title, db_book.author, db_book.genre) for db_book in db_books)
+    await _advance_suggest_index()
 
     return db_books
 
 
+@router.delete("/", response_model=BulkDeleteResult, status_code=status.HTTP_200_OK)
+async def delete_books(
+    ids: List[int] = Body(..., min_length=1, max_length=settings.BULK_DELETE_MAX_IDS),
+    db: AsyncSession = Depends(get_write_db),
+):
+    """
+    Endpoint to delete books by IDs in a single transaction.
+
+    Cannot delete the last remaining book in a genre: as if books were deleted one by one in the given order,
+    the last requested book of a genre the batch would empty is kept and reported as rejected.
+
+    :param ids: list of book IDs, at most settings.BULK_DELETE_MAX_IDS.
+    """
+    logger.info("Deleting books in bulk.", extra={"count": len(ids), "ids": ids})
+    deleted, kept = await db_bulk_delete(db, ids)
+
+    suggest_index.remove_many(deleted)
+    await _advance_suggest_index()
+
+    result = BulkDeleteResult(deleted=deleted)
+    deleted_ids = set(deleted)
+    for book_id in dict.fromkeys(ids):
+        if book_id in kept:
+            result.rejected.append(BulkDeleteRejected(id=book_id, reason=f"Cannnot delete the last book from the genre {kept[book_id]}."))
+        elif book_id not in deleted_ids:
+            result.rejected.append(BulkDeleteRejected(id=book_id, reason=f"Book with ID {book_id} not found."))
+    logger.info("Deleted books in bulk.", extra={"deleted": len(result.deleted), "rejected": len(result.rejected)})
+    return result
+
+
 @router.delete("/{book_id}", status_code=status.HTTP_200_OK)
-async def delete_book(book_id: int, db: Session = Depends(get_db)):
+async def delete_book(book_id: int, db: AsyncSession = Depends(get_write_db)):
     """
     Endpoint to delete book by IDs.
 
     :param book_id: book ID, integer.
 
     """
-    logger.info(f"Deleting the book with ID {book_id!s}")
+    logger.info("Deleting a book.", extra={"book_id": book_id})
 
-    db_book = db_get_by_id(db, book_id)
+    db_book = await db_get_by_id(db, book_id)
 
     if not db_book:
         return JSONResponse(
@@ -94,7 +311,7 @@ async def delete_book(book_id: int, db: Session = Depends(get_db)):
             status_code=status.HTTP_404_NOT_FOUND,
         )
 
-    count = db.query(Book).filter(Book.genre == db_book.genre).count()
+    count = await db_count_by_genre(db, db_book.genre)
 
     if count == 1:
         return JSONResponse(
@@ -102,22 +319,40 @@ async def delete_book(book_id: int, db: Session = Depends(get_db)):
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
         )
 
-    db_delete(db, db_book.id)  # type: ignore # noqa: RET503
-
-
-@router.get("/search", response_model=Page[BookGet])
-async def search_books(title: str = "", author: str = "", db: Session = Depends(get_db)):
+    await db_delete(db, db_book.id)
+    suggest_index.remove(db_book.id)
+    await _advance_suggest_index()
+    return None
+
+
+@router.get("/search", response_model=Union[Page[BookGet], CursorPage[BookGet]])
+async def search_books(
+    title: str = "",
+    author: str = "",
+    params: Params = Depends(),
+    cursor: Optional[str] = None,
+    pagination: Optional[PaginationMode] = None,
+    mode: Optional[SearchMode] = None,
+    fields: Optional[Tuple[str, ...]] = Depends(book_fields),
+):
     """
     Endpoint to search for Books by Title or Author.
 
     At least one of Title or Author is required.
     Cannot search for books with the genre "18+".
     Case insensitive, partial.
+    Substring searches are served from the catalog snapshot when enabled and up to date.
+    Concurrent searches for the same terms, case aside, share one read.
 
     :param title: title of the book
     :param author: author of the book
+    :param mode: "substring" or "fulltext" (word prefix) matching, settings.SEARCH_MODE by default.
+    :param cursor: cursor of the next page, implies cursor mode.
+    :param pagination: pagination mode, settings.PAGINATION_MODE by default.
+    :param fields: fields of books to select and return, all by default; the response is then encoded without validation.
     """
-    logger.info(f"Searching for books with parameters: title={title!s}, author={author!s}.")
+    logger.info("Searching for books.", extra={"title": title, "author": author})
+    mode = mode or settings.SEARCH_MODE
 
     if not (title or author):
         return JSONResponse(
@@ -125,11 +360,328 @@ async def search_books(title: str = "", author: str = "", db: Session = Depends(
             status_code=status.HTTP_400_BAD_REQUEST,
         )
 
-    db_books = db_search(db=db, title=title, author=author)
+    version = await _catalog_version()
+    # Both modes are case insensitive: differently cased terms share a read.
+    search = {"title": title.lower(), "author": author.lower(), "mode": mode, "fields": fields}
+
+    if cursor or (pagination or settings.PAGINATION_MODE) == "cursor":
+        (after,) = decode_keyset(cursor, int) or (None,)
+        db_books = await _shared_read(version, _search, **search, limit=params.size + 1, after=after)
+
+        if not (db_books or after):
+            return JSONResponse(
+                content={"reason": "Books not found."},
+                status_code=status.HTTP_404_NOT_FOUND,
+            )
+
+        has_next = len(db_books) > params.size
+        db_books = db_books[: params.size]
+        if fields is not None:
+            return ORJSONResponse(
+                {
+                    "items": [{field: book[field] for field in fields} for book in db_books],
+                    "total": None,
+                    "current_page": cursor,
+                    "current_page_backwards": None,
+                    "previous_page": None,
+                    "next_page": encode_keyset(db_books[-1]["id"]) if has_next else None,
+                },
+            )
+        return CursorPage[BookGet](
+            items=[BookGet.model_validate(book, from_attributes=True) for book in db_books],
+            current_page=cursor,
+            next_page=encode_keyset(db_books[-1].id) if has_next else None,
+        )
+
+    db_books = await _shared_read(version, _search, **search)
 
     if not db_books:
         return JSONResponse(
             content={"reason": "Books not found."},
             status_code=status.HTTP_404_NOT_FOUND,
         )
-    return paginate(db_books)
+    if fields is not None:
+        raw_params = params.to_raw_params()
+        return ORJSONResponse(
+            {
+                "items": [{field: book[field] for field in fields} for book in db_books[raw_params.offset : raw_params.offset + raw_params.limit]],
+                "total": len(db_books),
+                "page": params.page,
+                "size": params.size,
+                "pages": math.ceil(len(db_books) / params.size),
+            },
+        )
+    return paginate(db_books, params)
+
+
+@router.get("/filter", response_model=Union[Page[CensoredBook], CursorPage[CensoredBook]])
+async def filter_books(
+    genre: Optional[str] = None,
+    author: Optional[str] = None,
+    year_from: Optional[int] = None,
+    year_to: Optional[int] = None,
+    sort: BookSort = "id",
+    params: Params = Depends(),
+    cursor: Optional[str] = None,
+    pagination: Optional[PaginationMode] = None,
+):
+    """
+    Endpoint to filter Books by Genre, Author and range of Publication Years.
+
+    Filters are exact and all of them apply; without filters, every book is listed.
+    Mask titles for books with the genre "18+".
+    Concurrent identical requests share one read.
+
+    :param genre: genre of the books.
+    :param author: author of the books.
+    :param year_from: first publication year, inclusive.
+    :param year_to: last publication year, inclusive.
+    :param sort: "id" or "publication_year", descending with a "-" prefix; ties are broken by ID.
+    :param cursor: cursor of the next page, implies cursor mode.
+    :param pagination: pagination mode, settings.PAGINATION_MODE by default.
+    """
+    filters = BookFilters(genre=genre, author=author, year_from=year_from, year_to=year_to)
+    logger.info("Filtering books.", extra={**filters._asdict(), "sort": sort})
+    version = await _catalog_version()
+
+    if cursor or (pagination or settings.PAGINATION_MODE) == "cursor":
+        after = decode_keyset(cursor, int) if sort.lstrip("-") == "id" else decode_keyset(cursor, (int, type(None)), int)
+        db_books = await _shared_read(version, _filter, filters=filters, sort=sort, limit=params.size + 1, after=after)
+
+        if not (db_books or after):
+            return JSONResponse(
+                content={"reason": "Books not found."},
+                status_code=status.HTTP_404_NOT_FOUND,
+            )
+
+        has_next = len(db_books) > params.size
+        db_books = db_books[: params.size]
+        return ORJSONResponse(
+            {
+                "items": db_books,
+                "total": None,
+                "current_page": cursor,
+                "current_page_backwards": None,
+                "previous_page": None,
+                "next_page": encode_keyset(*sort_keyset(sort, db_books[-1])) if has_next else None,
+            },
+        )
+
+    raw_params = params.to_raw_params()
+    total, db_books = await _shared_read(version, _filter_page, filters=filters, sort=sort, limit=raw_params.limit, offset=raw_params.offset)
+
+    if not total:
+        return JSONResponse(
+            content={"reason": "Books not found."},
+            status_code=status.HTTP_404_NOT_FOUND,
+        )
+    return ORJSONResponse(
+        {
+            "items": db_books,
+            "total": total,
+            "page": params.page,
+            "size": params.size,
+            "pages": math.ceil(total / params.size),
+        },
+    )
+
+
+@router.get("/stats", response_model=CatalogStats)
+async def get_stats(db: AsyncSession = Depends(get_read_db)):
+    """
+    Endpoint to retrieve the number of books per genre and per decade of publication.
+
+    Served from counts maintained by triggers on every write, without reading books.
+    Decades are keyed by their first year; books without a genre or a year are left out of the matching histogram.
+    """
+    return await db_get_stats(db)
+
+
+@router.get("/suggest", response_model=List[BookSuggestion])
+async def suggest_books(prefix: str = Query(..., min_length=1), limit: int = Query(10, ge=1, le=100)):
+    """
+    Endpoint to autocomplete titles and authors.
+
+    Served from the in-memory prefix index without reading the database. Writes of this process show up at once,
+    those of other processes once the index is refreshed, every settings.SUGGEST_REFRESH_INTERVAL seconds.
+    Cannot suggest books with the genre "18+".
+
+    :param prefix: beginning of a title or an author, case and accent insensitive.
+    :param limit: max number of suggestions.
+    """
+    return [BookSuggestion(id=_id, title=title, author=author) for _id, title, author in suggest_index.suggest(prefix, limit)]
+
+
+def _cursor_page_by_genre(groups: List[dict], size: int, cursor: Optional[str], fields: Optional[Tuple[str, ...]] = None) -> ORJSONResponse:
+    """
+    Build a cursor page out of genre groups holding up to size + 1 books.
+
+    The extra book only tells whether there is a next page and is not returned.
+    Books hold their ID for the next cursor, dropped unless among the requested fields.
+    Groups may be shared with concurrent requests and are left unchanged.
+    """
+    has_next = sum(len(group["books"]) for group in groups) > size
+    if has_next:
+        *groups, last_group = groups
+        if len(last_group["books"]) > 1:
+            groups.append({**last_group, "books": last_group["books"][:-1]})
+
+    next_page = encode_keyset(groups[-1]["genre"], groups[-1]["books"][-1]["id"]) if has_next else None
+    if fields is not None and "id" not in fields:
+        groups = [{**group, "books": [{name: value for name, value in book.items() if name != "id"} for book in group["books"]]} for group in groups]
+    return ORJSONResponse(
+        {
+            "items": groups,
+            "total": None,
+            "current_page": cursor,
+            "current_page_backwards": None,
+            "previous_page": None,
+            "next_page": next_page,
+        },
+    )
+
+
+async def _catalog_version() -> int:
+    """Return the catalog version, on a connection released before the read it keys."""
+    async with ReadSessionLocal() as db:
+        return await db_get_version(db)
+
+
+async def _shared_read(version: int, read: Callable[..., Awaitable[T]], **params: Hashable) -> T:
+    """
+    Return read(db, snapshot, **params), shared with concurrent requests making the same read at the same catalog version.
+
+    The read runs on a session of its own, which outlives the request that started it if needed;
+    snapshot is the catalog snapshot if enabled and at the version. Results are shared and must not be mutated.
+    Keying on the version keeps reads started before a write from being returned to requests made after it.
+    """
+
+    async def run() -> T:
+        async with ReadSessionLocal() as db:
+            return await read(db, catalog_snapshot.current(version), **params)
+
+    return await read_flights.run((version, read.__name__, *sorted(params.items())), run)
+
+
+async def _books_after(
+    db: AsyncSession,
+    snapshot: Optional[CatalogSnapshot],
+    limit: int,
+    after: Optional[Tuple[str, int]],
+    fields: Optional[Tuple[str, ...]],
+) -> List[dict]:
+    """Return the books following the keyset grouped by genre, see db_get_censored_after."""
+    if snapshot is not None:
+        return _groups_with_fields(snapshot.get_censored_after(limit=limit, after=after), fields)
+    return await db_get_censored_after(db, limit=limit, after=after, fields=fields)
+
+
+async def _books_page(
+    db: AsyncSession,
+    snapshot: Optional[CatalogSnapshot],
+    limit: int,
+    offset: int,
+    fields: Optional[Tuple[str, ...]],
+) -> Tuple[int, List[dict]]:
+    """Return the number of genres and a page of books grouped by genre, see db_get_censored."""
+    if snapshot is not None:
+        return snapshot.count_genres(), _groups_with_fields(snapshot.get_censored(limit=limit, offset=offset), fields)
+    total = await db_count_genres(db)
+    return total, await db_get_censored(db, limit=limit, offset=offset, fields=fields) if total else []
+
+
+async def _filter(
+    db: AsyncSession,
+    _snapshot: Optional[CatalogSnapshot],
+    filters: BookFilters,
+    sort: BookSort,
+    limit: int,
+    after: Optional[Tuple],
+) -> List[dict]:
+    """Return the books matching the filters following the keyset, see db_filter."""
+    return await db_filter(db, filters, sort, limit=limit, after=after)
+
+
+async def _filter_page(
+    db: AsyncSession,
+    _snapshot: Optional[CatalogSnapshot],
+    filters: BookFilters,
+    sort: BookSort,
+    limit: int,
+    offset: int,
+) -> Tuple[int, List[dict]]:
+    """Return the number of books matching the filters and a page of them, see db_filter."""
+    total = await db_count_filtered(db, filters)
+    return total, await db_filter(db, filters, sort, limit=limit, offset=offset) if total else []
+
+
+def _groups_with_fields(groups: List[dict], fields: Optional[Tuple[str, ...]]) -> List[dict]:
+    """Keep the given fields of the books of genre groups, in the order of schemas.book.CensoredBook."""
+    if fields is None:
+        return groups
+    names = [field for field in CENSORED_BOOK_FIELDS if field in fields]
+    return [{**group, "books": [{name: book[name] for name in names} for book in group["books"]]} for group in groups]
+
+
+async def _search(
+    db: AsyncSession,
+    snapshot: Optional[CatalogSnapshot],
+    mode: SearchMode,
+    fields: Optional[Tuple[str, ...]],
+    **search: object,
+) -> Union[List[Union[Book, BookGet]], List[dict]]:
+    """Search for books in the snapshot if given and able to, in the database otherwise, see db_search."""
+    # LIKE wildcards in search terms and fulltext searches are matched by the database only.
+    if snapshot is not None and mode == "substring" and not {"%", "_"}.intersection(f"{search['title']}{search['author']}"):
+        books = snapshot.search(**search)
+        return books if fields is not None else [BookGet(**book) for book in books]
+    return await db_search(db=db, mode=mode, fields=fields, **search)
+
+
+def _rejection_reason(book: BookCreate) -> Optional[str]:
+    """Return why the book cannot be added, if it cannot."""
+    if book.genre.lower() == "horror":
+        return f"Books with genre {book.genre} cannot be added."
+    return None
+
+
+async def _insert_chunk(db: AsyncSession, chunk: List[Tuple[int, BookCreate]], result: BulkCreateResult) -> None:
+    """Insert a chunk of (row, book) of a bulk upload and record them as accepted."""
+    ids = await db_bulk_insert(db, [book.model_dump() for _, book in chunk])
+
+    for (row, _), _id in zip(chunk, ids, strict=True):
+        result.accepted.append(BulkAccepted(row=row, id=_id))
+    suggest_index.add_many((_id, book.title, book.author, book.genre) for (_, book), _id in zip(chunk, ids, strict=True))
+    await _advance_suggest_index()
+
+
+async def _advance_suggest_index() -> None:
+    """Move the suggest index to the catalog version following a write applied to it, see PrefixIndex.advance."""
+    suggest_index.advance(await _catalog_version())
+
+
+async def _export_lines(export_format: str, fields: Optional[Tuple[str, ...]] = None) -> AsyncIterator[str]:
+    """
+    Yield the exported catalog, one chunk of lines per cursor batch.
+
+    The session is opened here rather than injected, as it has to outlive the endpoint while the response streams.
+    """
+    columns = fields or BOOK_FIELDS
+    if export_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(columns)
+        yield buffer.getvalue()
+
+    async with ReadSessionLocal() as db:
+        async for rows in db_iter_censored(db, batch_size=settings.EXPORT_BATCH_SIZE, fields=fields):
+            if "id" not in columns:
+                # Rows start with the ID, which orders them.
+                rows = [row[1:] for row in rows]  # noqa: PLW2901
+            if export_format == "csv":
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows(rows)
+                yield buffer.getvalue()
+            else:
+                yield "".join(json.dumps(dict(zip(columns, row, strict=True))) + "\n" for row in rows)
@@ -0,0 +1,101 @@
+"""
+Benchmark the CRUD layer and the API routes on synthetic catalogs.
+
+Usage: python -m benchmarks --sizes 10000 100000 1000000 --output results.json [--baseline baseline.json]
+
+Every catalog size runs in its own process against its own database. Results hold p50/p95/p99 latency
+and queries per call of every CRUD function and route, and can be compared against a saved baseline:
+the exit code is 1 when a latency or a number of queries regressed beyond the tolerance.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks.catalog import generate_catalog
+
+Results = Dict[str, Dict[str, Dict[str, float]]]
+
+
+def run_size(size: int, genres: int, workdir: Path, repeat: int, heavy_repeat: int) -> Dict[str, Dict[str, float]]:
+    """Generate (or reuse) the catalog of size books and run the suite in a separate process on a copy of it, as the suite writes."""
+    catalog = workdir / f"catalog_{size}.db"
+    started = time.perf_counter()
+    generate_catalog(catalog, size, genres=genres)
+    print(f"Catalog of {size} books ready in {time.perf_counter() - started:.1f}s.", file=sys.stderr)  # noqa: T201
+
+    path = workdir / f"run_{size}.db"
+    for leftover in (path.with_name(f"{path.name}-wal"), path.with_name(f"{path.name}-shm")):
+        leftover.unlink(missing_ok=True)
+    shutil.copyfile(catalog, path)
+
+    command = [sys.executable, "-m", "benchmarks.suite", "--size", str(size), "--genres", str(genres), "--repeat", str(repeat), "--heavy-repeat", str(heavy_repeat)]
+    environment = {**os.environ, "DATABASE_URL": f"sqlite:///{path}"}
+    output = subprocess.run(command, env=environment, check=True, capture_output=True, text=True).stdout  # noqa: S603
+    return json.loads(output)
+
+
+def compare(results: Results, baseline: Results, tolerance: float) -> List[str]:
+    """Return regressions of results against baseline: p95 above tolerance or more queries per call."""
+    regressions = []
+
+    for size, benchmarks in results.items():
+        for name, current in benchmarks.items():
+            previous = baseline.get(size, {}).get(name)
+            if previous is None:
+                continue
+            if current["queries"] > previous["queries"]:
+                regressions.append(f"[{size}] {name}: {previous['queries']} -> {current['queries']} queries per call")
+            if current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+                regressions.append(f"[{size}] {name}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+    return regressions
+
+
+def report(results: Results) -> None:
+    """Print results as a table."""
+    for size, benchmarks in results.items():
+        print(f"\n{size} books")  # noqa: T201
+        print(f"{'benchmark':<40}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}{'queries':>10}")  # noqa: T201
+        for name, result in benchmarks.items():
+            print(f"{name:<40}{result['p50_ms']:>12.3f}{result['p95_ms']:>12.3f}{result['p99_ms']:>12.3f}{result['queries']:>10}")  # noqa: T201
+
+
+def main() -> None:
+    """Run the benchmarks, save results and compare them against the baseline."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000], help="catalog sizes, in books")
+    parser.add_argument("--genres", type=int, default=200, help="number of genres of the catalogs")
+    parser.add_argument("--repeat", type=int, default=50, help="calls per benchmark")
+    parser.add_argument("--heavy-repeat", type=int, default=3, help="calls per benchmark going through the whole catalog")
+    parser.add_argument("--workdir", type=Path, default=Path(tempfile.gettempdir()) / "library_api_benchmarks", help="where catalogs are generated and kept")
+    parser.add_argument("--output", type=Path, help="where to write results as JSON")
+    parser.add_argument("--baseline", type=Path, help="results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 increase over the baseline, 0.2 is 20%%")
+    args = parser.parse_args()
+
+    args.workdir.mkdir(parents=True, exist_ok=True)
+    results: Results = {str(size): run_size(size, args.genres, args.workdir, args.repeat, args.heavy_repeat) for size in args.sizes}
+    report(results)
+
+    if args.output:
+        meta = {"python": platform.python_version(), "platform": platform.platform(), "repeat": args.repeat, "genres": args.genres}
+        args.output.write_text(json.dumps({"meta": meta, "results": results}, indent=2))
+
+    if args.baseline:
+        regressions = compare(results, json.loads(args.baseline.read_text())["results"], args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)  # noqa: T201
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
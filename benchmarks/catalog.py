@@ -0,0 +1,58 @@
+import random
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+from sqlalchemy import create_engine
+
+from models.book import Base
+
+WORDS = ("shadow", "river", "empire", "garden", "winter", "silent", "golden", "night", "stone", "city", "secret", "fire", "ocean", "glass", "iron", "lost", "last", "dream", "storm", "blue")
+FIRST_NAMES = ("Anna", "Boris", "Clara", "David", "Emile", "Frida", "Gunnar", "Helga", "Ivan", "Jane", "Karl", "Lena")
+LAST_NAMES = ("Andersen", "Brown", "Chekhov", "Dumas", "Eco", "Flaubert", "Grass", "Hesse", "Ibsen", "James", "King", "Lagerlof")
+
+
+def genre_names(count: int) -> list:
+    """Return count synthetic genre names, the first one being "18+"."""
+    return ["18+", *(f"Genre {index:04d}" for index in range(1, count))]
+
+
+def generate_catalog(path: Path, size: int, genres: int = 200, seed: int = 0) -> None:
+    """
+    Create a database at path holding size synthetic books spread over genres.
+
+    An existing database with the same number of books is reused.
+
+    :param size: number of books.
+    :param genres: number of distinct genres.
+    :param seed: random seed, the same seed gives the same catalog.
+    """
+    if path.exists():
+        with closing(sqlite3.connect(path)) as connection:
+            try:
+                if connection.execute("SELECT count(*) FROM books").fetchone()[0] == size:
+                    return
+            except sqlite3.Error:
+                pass
+
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+
+    rng = random.Random(seed)  # noqa: S311 - reproducible benchmark data, not secrets.
+    names = genre_names(genres)
+    rows = (
+        (
+            f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} {index}",
+            f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            rng.randint(1450, 2025),
+            names[index % genres],
+        )
+        for index in range(size)
+    )
+
+    with closing(sqlite3.connect(path)) as connection:
+        connection.execute("PRAGMA synchronous = OFF")
+        connection.executemany("INSERT INTO books(title, author, publication_year, genre) VALUES (?, ?, ?, ?)", rows)
+        connection.commit()
@@ -0,0 +1,113 @@
+"""
+Compare the per-call overhead of statements built on every call with the cached statements of database.crud.books.
+
+Usage: python -m benchmarks.statements [--size 10000] [--repeat 2000]
+
+Both variants run the same SQL against the same small catalog, so that the difference is the Python overhead
+of building the statement and looking its compiled form up in the engine cache.
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import tempfile
+import time
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from typing import Dict
+
+from sqlalchemy import and_, func, literal_column, not_, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from benchmarks.catalog import generate_catalog
+from database.crud import books as crud
+from models.book import Book, BookSearch
+
+Call = Callable[[AsyncSession, int], Awaitable[object]]
+
+
+async def built_get_by_id(db: AsyncSession, book_id: int) -> object:
+    """Get a book by ID, building the statement of crud.db_get_by_id on every call."""
+    return await db.scalar(select(Book).filter(Book.id == book_id))
+
+
+async def built_get_by_ids(db: AsyncSession, book_id: int) -> object:
+    """Get 20 books from an ID, building the statement of crud.db_get_by_ids on every call."""
+    return (await db.scalars(select(Book).filter(Book.id.in_(range(book_id, book_id + 20))).order_by(Book.id))).all()
+
+
+async def built_search(db: AsyncSession, book_id: int) -> object:
+    """Search titles for an ID after it, building the statement of crud.db_search on every call."""
+    filters = and_(func.lower(Book.title).contains(str(book_id)), not_(Book.genre.contains("18+")), Book.id > book_id)
+    return (await db.scalars(select(Book).filter(filters).order_by(Book.id).limit(10))).all()
+
+
+async def built_search_fulltext(db: AsyncSession, book_id: int) -> object:
+    """Search the full-text index of titles for an ID, building the statement of crud.db_search on every call."""
+    matches = Book.id.in_(select(BookSearch.c.rowid).where(literal_column(BookSearch.name).match(f'title : ("{book_id}"*)')))
+    filters = and_(matches, not_(Book.genre.contains("18+")))
+    return (await db.scalars(select(Book).filter(filters).order_by(Book.id).limit(10))).all()
+
+
+CASES: Dict[str, Dict[str, Call]] = {
+    "get_by_id": {
+        "built": built_get_by_id,
+        "cached": crud.db_get_by_id,
+    },
+    "get_by_ids": {
+        "built": built_get_by_ids,
+        "cached": lambda db, book_id: crud.db_get_by_ids(db, list(range(book_id, book_id + 20))),
+    },
+    "search.substring": {
+        "built": built_search,
+        "cached": lambda db, book_id: crud.db_search(db, title=str(book_id), limit=10, after=book_id),
+    },
+    "search.fulltext": {
+        "built": built_search_fulltext,
+        "cached": lambda db, book_id: crud.db_search(db, title=str(book_id), limit=10, mode="fulltext"),
+    },
+}
+
+
+async def per_call_us(session_factory: async_sessionmaker, call: Call, size: int, repeat: int) -> float:
+    """Return the mean time of a call in microseconds, after a warm up filling the caches."""
+    rng = random.Random(0)  # noqa: S311 - reproducible benchmark data, not secrets.
+    async with session_factory() as db:
+        for _ in range(50):
+            await call(db, rng.randint(1, size))
+        started = time.perf_counter()
+        for _ in range(repeat):
+            await call(db, rng.randint(1, size))
+        return (time.perf_counter() - started) / repeat * 1_000_000
+
+
+async def run(size: int, repeat: int) -> None:
+    """Time every case in both variants on a temporary catalog of size books and print a table of them."""
+    with tempfile.TemporaryDirectory() as workdir:
+        path = Path(workdir) / "statements.db"
+        generate_catalog(path, size)
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        try:
+            print(f"{'case':<20}{'built us':>12}{'cached us':>12}{'speedup':>10}")  # noqa: T201
+            for name, variants in CASES.items():
+                built = await per_call_us(session_factory, variants["built"], size, repeat)
+                cached = await per_call_us(session_factory, variants["cached"], size, repeat)
+                print(f"{name:<20}{built:>12.1f}{cached:>12.1f}{built / cached:>9.2f}x")  # noqa: T201
+        finally:
+            await engine.dispose()
+
+
+def main() -> int:
+    """Parse the command line and run the comparison."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=10_000, help="number of books in the catalog")
+    parser.add_argument("--repeat", type=int, default=2_000, help="calls per case and variant")
+    args = parser.parse_args()
+    asyncio.run(run(args.size, args.repeat))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
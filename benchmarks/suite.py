@@ -0,0 +1,274 @@
+"""
+Time CRUD functions and API routes against the database of settings.DATABASE_URL.
+
+Run by benchmarks.__main__ in a separate process per catalog size, as engines are bound to settings.DATABASE_URL on import.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+import time
+from collections.abc import Awaitable, Callable
+from typing import AsyncIterator, Dict, List, Tuple, Union
+
+import httpx
+from sqlalchemy import Engine, event
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from benchmarks.catalog import genre_names
+from database.config import ReadSessionLocal, WriteSessionLocal, read_engine, write_engine
+from database.crud import books as crud
+from main import app, response_cache
+from models.book import Book
+from schemas.book import BookGet
+from utils.logger import logger
+
+# Prefixes of words of generated titles and author names, and one matching nothing.
+WORDS_PREFIXES = ("sh", "ri", "emp", "gar", "win", "anna", "karl", "lost", "x")
+
+# Calls to time by name, with the number of times to call each of them.
+Calls = Dict[str, Tuple[Callable[[], Awaitable[object]], int]]
+
+
+class QueryCounter:
+    """Count SQL statements executed through the engines."""
+
+    def __init__(self, engines: List[Engine]) -> None:
+        """Listen to the statements of engines."""
+        self.count = 0
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *_: object) -> None:
+        self.count += 1
+
+
+def percentile(samples: List[float], rank: float) -> float:
+    """Return the nearest-rank percentile of sorted samples."""
+    return samples[min(len(samples) - 1, max(0, round(rank / 100 * len(samples) + 0.5) - 1))]
+
+
+def summarize(samples: List[float], queries: List[int]) -> Dict[str, float]:
+    """Return latency percentiles in milliseconds and queries per call."""
+    samples = sorted(samples)
+    return {
+        "runs": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 95) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 3),
+        "queries": round(sum(queries) / len(queries), 2),
+    }
+
+
+async def measure(counter: QueryCounter, call: Callable[[], Awaitable[object]], repeat: int) -> Dict[str, float]:
+    """Await call repeat times and summarize its latency and number of queries."""
+    samples, queries = [], []
+    for _ in range(repeat):
+        counter.count = 0
+        started = time.perf_counter()
+        await call()
+        samples.append(time.perf_counter() - started)
+        queries.append(counter.count)
+    return summarize(samples, queries)
+
+
+class Workload:
+    """Random books, IDs and genres of a catalog of size books, reproducible across runs."""
+
+    def __init__(self, size: int, genres: int) -> None:
+        """Draw from size books spread over genres genres."""
+        self.size = size
+        self.genres = genres
+        self.names = genre_names(genres)
+        self.rng = random.Random(1)  # noqa: S311 - reproducible benchmark data, not secrets.
+
+    def book(self) -> dict:
+        """Return the column values of a new book outside of the first genre."""
+        return {"title": f"Benchmark {self.rng.random()}", "author": "Bench Mark", "publication_year": self.rng.randint(1450, 2025), "genre": self.rng.choice(self.names[1:])}
+
+    def books(self, count: int) -> List[dict]:
+        """Return the column values of count new books."""
+        return [self.book() for _ in range(count)]
+
+    def random_id(self) -> int:
+        """Return the ID of a book of the generated catalog, which may have been deleted since."""
+        return self.rng.randint(1, self.size)
+
+    def random_ids(self, count: int) -> List[int]:
+        """Return count IDs of books of the generated catalog."""
+        return [self.random_id() for _ in range(count)]
+
+    def random_genre(self) -> str:
+        """Return the name of a genre of the generated catalog."""
+        return self.rng.choice(self.names)
+
+
+def reading(function: Callable[..., Awaitable[object]], *args: object, **kwargs: object) -> Callable[[], Awaitable[object]]:
+    """Return a call of a CRUD function on a read session, calling args which are callable for fresh values."""
+
+    async def call() -> object:
+        async with ReadSessionLocal() as db:
+            return await function(db, *(arg() if callable(arg) else arg for arg in args), **kwargs)
+
+    return call
+
+
+def writing(function: Callable[..., Awaitable[object]], *args: object) -> Callable[[], Awaitable[object]]:
+    """Return a call of a CRUD function on a write session, calling args which are callable for fresh values."""
+
+    async def call() -> object:
+        async with WriteSessionLocal() as db:
+            return await function(db, *(arg() if callable(arg) else arg for arg in args))
+
+    return call
+
+
+def consuming(function: Callable[[AsyncSession], AsyncIterator[object]]) -> Callable[[], Awaitable[None]]:
+    """Return a call going through every item a CRUD generator yields on a read session."""
+
+    async def call() -> None:
+        async with ReadSessionLocal() as db:
+            async for _ in function(db):
+                pass
+
+    return call
+
+
+async def existing_books(workload: Workload, count: int) -> List[BookGet]:
+    """Return up to count random books of the catalog."""
+    async with ReadSessionLocal() as db:
+        db_books = await crud.db_get_by_ids(db, workload.random_ids(count))
+    return [BookGet.model_validate(db_book, from_attributes=True) for db_book in db_books]
+
+
+def crud_calls(workload: Workload, repeat: int, heavy_repeat: int) -> Calls:
+    """Return the CRUD functions to time, with the number of calls of each of them."""
+    names, size = workload.names, workload.size
+    fields = ("title",)
+    author_years = crud.BookFilters(author="Anna Andersen", year_from=1900, year_to=1999)
+    return {
+        "db_get_version": (reading(crud.db_get_version), repeat),
+        "db_count_genres": (reading(crud.db_count_genres), repeat),
+        "db_count_by_genre": (reading(crud.db_count_by_genre, workload.random_genre), repeat),
+        "db_get_censored": (reading(crud.db_get_censored, limit=50), repeat),
+        "db_get_censored.deep": (reading(crud.db_get_censored, limit=50, offset=workload.genres - 50), repeat),
+        "db_get_censored.fields": (reading(crud.db_get_censored, limit=50, fields=fields), repeat),
+        "db_get_censored_after": (reading(crud.db_get_censored_after, 50), repeat),
+        "db_get_censored_after.deep": (reading(crud.db_get_censored_after, 50, (names[-1], size - 100)), repeat),
+        "db_get_by_id": (reading(crud.db_get_by_id, workload.random_id), repeat),
+        "db_get_by_ids": (reading(crud.db_get_by_ids, lambda: workload.random_ids(100)), repeat),
+        "db_search.substring": (reading(crud.db_search, "river", "", limit=50), repeat),
+        "db_search.substring.rare": (reading(crud.db_search, lambda: str(workload.random_id()), ""), heavy_repeat),
+        "db_search.fulltext": (reading(crud.db_search, "river", "", limit=50, mode="fulltext"), repeat),
+        "db_search.fields": (reading(crud.db_search, "river", "", limit=50, fields=fields), repeat),
+        "db_filter.genre": (reading(crud.db_filter, lambda: crud.BookFilters(genre=workload.random_genre()), limit=50), repeat),
+        "db_filter.author_years": (reading(crud.db_filter, author_years, "-publication_year", limit=50), repeat),
+        "db_count_filtered.genre": (reading(crud.db_count_filtered, lambda: crud.BookFilters(genre=workload.random_genre())), repeat),
+        "db_count_filtered.author_years": (reading(crud.db_count_filtered, author_years), repeat),
+        "db_get_stats": (reading(crud.db_get_stats), repeat),
+        "db_iter_books": (consuming(crud.db_iter_books), heavy_repeat),
+        "db_iter_censored": (consuming(crud.db_iter_censored), heavy_repeat),
+        "db_iter_censored.fields": (consuming(lambda db: crud.db_iter_censored(db, fields=fields)), heavy_repeat),
+        "db_insert": (writing(crud.db_insert, lambda: Book(**workload.book())), repeat),
+        "db_bulk_insert": (writing(crud.db_bulk_insert, lambda: workload.books(1000)), heavy_repeat),
+        "db_delete": (writing(crud.db_delete, workload.random_id), repeat),
+        "db_bulk_delete": (writing(crud.db_bulk_delete, lambda: workload.random_ids(100)), repeat),
+    }
+
+
+def requesting(client: httpx.AsyncClient, method: str, url: Union[Callable[[], str], str], *, cached: bool = False, **kwargs: Callable[[], object]) -> Callable[[], Awaitable[None]]:
+    """
+    Return a request through the client, clearing the response cache first unless cached.
+
+    :param url: the URL, or a callable returning a fresh one for every request.
+    :param kwargs: arguments of the request, as callables returning fresh values for every request.
+    """
+
+    async def call() -> None:
+        if not cached:
+            response_cache.clear()
+        response = await client.request(method, url() if callable(url) else url, **{key: value() for key, value in kwargs.items()})
+        if response.is_server_error:
+            raise RuntimeError(f"{method} {response.url} failed with {response.status_code}")
+
+    return call
+
+
+def route_calls(client: httpx.AsyncClient, workload: Workload, sample: List[BookGet], repeat: int, heavy_repeat: int) -> Calls:
+    """Return the routes to time, with the number of calls of each of them."""
+    deep_page = max(1, workload.genres // 50)
+    author_years = "author=Anna%20Andersen&year_from=1900&year_to=1999&sort=-publication_year"
+    return {
+        "GET /books": (requesting(client, "GET", "/api/v1/books/?size=50"), repeat),
+        "GET /books.cached": (requesting(client, "GET", "/api/v1/books/?size=50", cached=True), repeat),
+        "GET /books.deep": (requesting(client, "GET", f"/api/v1/books/?size=50&page={deep_page}"), repeat),
+        "GET /books.cursor": (requesting(client, "GET", "/api/v1/books/?size=50&pagination=cursor"), repeat),
+        "GET /books.fields": (requesting(client, "GET", "/api/v1/books/?size=50&fields=title"), repeat),
+        "GET /books/search": (requesting(client, "GET", "/api/v1/books/search?title=river&size=50"), repeat),
+        "GET /books/search.fulltext": (requesting(client, "GET", "/api/v1/books/search?title=river&size=50&mode=fulltext"), repeat),
+        "GET /books/search.cursor": (requesting(client, "GET", "/api/v1/books/search?title=river&size=50&pagination=cursor"), repeat),
+        "GET /books/search.fields": (requesting(client, "GET", "/api/v1/books/search?title=river&size=50&fields=id,title"), repeat),
+        "GET /books/filter": (requesting(client, "GET", lambda: f"/api/v1/books/filter?genre={workload.rng.choice(workload.names[1:])}&size=50"), repeat),
+        "GET /books/filter.author_years": (requesting(client, "GET", f"/api/v1/books/filter?{author_years}&size=50"), repeat),
+        "GET /books/filter.cursor": (requesting(client, "GET", "/api/v1/books/filter?year_from=2000&size=50&pagination=cursor"), repeat),
+        "GET /books/stats": (requesting(client, "GET", "/api/v1/books/stats"), repeat),
+        "GET /books/suggest": (requesting(client, "GET", lambda: f"/api/v1/books/suggest?prefix={workload.rng.choice(WORDS_PREFIXES)}"), repeat),
+        "GET /books/export": (requesting(client, "GET", "/api/v1/books/export?format=ndjson"), heavy_repeat),
+        "GET /books/export.fields": (requesting(client, "GET", "/api/v1/books/export?format=ndjson&fields=id,title"), heavy_repeat),
+        "POST /books": (requesting(client, "POST", "/api/v1/books/", json=workload.book), repeat),
+        "POST /books/bulk": (requesting(client, "POST", "/api/v1/books/bulk", json=lambda: workload.books(1000)), heavy_repeat),
+        "PUT /books": (requesting(client, "PUT", "/api/v1/books/", json=lambda: [item.model_dump() for item in sample]), heavy_repeat),
+        "DELETE /books/{id}": (requesting(client, "DELETE", lambda: f"/api/v1/books/{workload.random_id()}"), repeat),
+        "DELETE /books": (requesting(client, "DELETE", "/api/v1/books/", json=lambda: workload.random_ids(100)), repeat),
+    }
+
+
+async def measure_all(counter: QueryCounter, calls: Calls, prefix: str) -> Dict[str, Dict[str, float]]:
+    """Measure calls one after the other, naming results after the calls with a prefix."""
+    return {f"{prefix}.{name}": await measure(counter, call, times) for name, (call, times) in calls.items()}
+
+
+async def run(size: int, genres: int, repeat: int, heavy_repeat: int) -> Dict[str, Dict[str, float]]:
+    """
+    Benchmark every CRUD function and route on a catalog of size books.
+
+    :param repeat: number of calls of each function or route.
+    :param heavy_repeat: number of calls of functions and routes going through the whole catalog.
+    """
+    counter = QueryCounter([read_engine.sync_engine, write_engine.sync_engine])
+    workload = Workload(size, genres)
+
+    results = await measure_all(counter, crud_calls(workload, repeat, heavy_repeat), "crud")
+    # Books updated by db_bulk_update and PUT /books, drawn once the CRUD calls deleted theirs.
+    sample = await existing_books(workload, 100)
+    results["crud.db_bulk_update"] = await measure(counter, writing(crud.db_bulk_update, lambda: sample), heavy_repeat)
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app), httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        results |= await measure_all(counter, route_calls(client, workload, sample, repeat, heavy_repeat), "route")
+
+    await read_engine.dispose()
+    await write_engine.dispose()
+    return results
+
+
+def main() -> None:
+    """Run the suite against settings.DATABASE_URL and print results as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, required=True)
+    parser.add_argument("--genres", type=int, required=True)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--heavy-repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    logger.setLevel(logging.WARNING)
+    results = asyncio.run(run(args.size, args.genres, args.repeat, args.heavy_repeat))
+    json.dump(results, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
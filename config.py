@@ -1,5 +1,77 @@
+from typing import Dict, List, Literal, Optional
+
+from pydantic import BaseModel, model_validator
 from pydantic_settings import BaseSettings
 
 
+class RouteLimit(BaseModel):
+    """Admission limits of a route class: concurrent requests, requests waiting beyond them, and for how long (seconds)."""
+
+    concurrency: int
+    queue: int
+    timeout: float
+
+
 class Settings(BaseSettings):
     DATABASE_URL: str = "sqlite:///./library.db"
+    PAGINATION_MODE: Literal["offset", "cursor"] = "offset"
+    SEARCH_MODE: Literal["substring", "fulltext"] = "substring"
+    BULK_INSERT_CHUNK_SIZE: int = 1000
+    BULK_MAX_RECORD_SIZE: int = 64 * 1024
+    BULK_DELETE_MAX_IDS: int = 10_000
+    RESPONSE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    EXPORT_BATCH_SIZE: int = 5000
+    IMPORT_CHUNK_SIZE: int = 10_000
+    SLOW_QUERY_SECONDS: float = 0.5
+
+    # Logging: "text" or one JSON object per line, structured fields are truncated to these limits.
+    LOG_FORMAT: Literal["text", "json"] = "text"
+    LOG_MAX_FIELD_LENGTH: int = 1000
+    LOG_MAX_FIELD_ITEMS: int = 20
+    # Share of records below WARNING to keep per logger name, e.g. {"uvicorn.access": 0.1}.
+    LOG_SAMPLE_RATES: Dict[str, float] = {}
+
+    # SQLite engine tuning, applied with PRAGMA on every new connection.
+    SQLITE_JOURNAL_MODE: Literal["DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"] = "WAL"
+    SQLITE_SYNCHRONOUS: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"
+    SQLITE_CACHE_SIZE: int = -64_000  # Negative values are KiB.
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_BUSY_TIMEOUT: int = 5_000  # Milliseconds.
+
+    # Writes go through a single connection, reads through a pool of read-only connections.
+    DB_READ_POOL_SIZE: int = 8
+    DB_POOL_TIMEOUT: float = 30.0
+
+    # Partition books by ID across these databases instead of DATABASE_URL, one writer per shard.
+    # The number of shards is fixed once books are stored: it decides which shard holds an ID.
+    SHARD_URLS: List[str] = []
+
+    # Serve listings and substring searches from a columnar snapshot file mapped by every worker process,
+    # rebuilt by one of them once the catalog version moves on, at most once per interval (seconds) per worker.
+    CATALOG_SNAPSHOT_PATH: Optional[str] = None
+    CATALOG_SNAPSHOT_MIN_INTERVAL: float = 1.0
+
+    # Suggestions are served from memory: the prefix index follows writes of other processes every interval (seconds).
+    SUGGEST_REFRESH_INTERVAL: float = 1.0
+
+    # Number of uvicorn worker processes started by main.py.
+    WORKERS: int = 1
+
+    # Admission control per route class of the books API: "read", "search" and "write". Requests beyond the limits
+    # get 503 with Retry-After (seconds); leave a class out to never limit it.
+    # Reads and searches share the read pool: together they run no more requests than DB_READ_POOL_SIZE,
+    # so admitted requests never wait again for a connection.
+    ADMISSION_LIMITS: Dict[str, RouteLimit] = {
+        "read": RouteLimit(concurrency=6, queue=64, timeout=2.0),
+        "search": RouteLimit(concurrency=2, queue=32, timeout=2.0),
+        "write": RouteLimit(concurrency=2, queue=32, timeout=5.0),
+    }
+    ADMISSION_RETRY_AFTER: float = 1.0
+
+    @model_validator(mode="after")
+    def check_read_admission(self) -> "Settings":
+        """Reject read and search limits running more requests than the read pool has connections."""
+        concurrency = sum(limit.concurrency for name, limit in self.ADMISSION_LIMITS.items() if name in {"read", "search"})
+        if concurrency > self.DB_READ_POOL_SIZE:
+            raise ValueError(f"read and search admission limits run {concurrency} requests, more than DB_READ_POOL_SIZE={self.DB_READ_POOL_SIZE}")
+        return self
@@ -1,21 +1,85 @@
-from collections.abc import Generator
+from collections.abc import AsyncGenerator
+from typing import Tuple
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy import Engine, event, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 
 from config import Settings
+from database.sharding import ShardedSessionMaker
 
 settings = Settings()
 
-# Database setup
-engine = create_engine(settings.DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def configure_sqlite(engine: Engine, query_only: bool = False, immediate: bool = False) -> None:
+    """
+    Apply settings.SQLITE_* pragmas to every new connection of the engine.
 
-def get_db() -> Generator[Session, None, None]:
-    """Yield DB."""
-    db = SessionLocal()
-    try:
+    :param query_only: reject any write through the engine connections.
+    :param immediate: take the write lock when a transaction begins instead of on its first write,
+        so concurrent writers wait on busy_timeout instead of failing to upgrade their snapshot.
+    """
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, _) -> None:  # noqa: ANN001
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA busy_timeout = {int(settings.SQLITE_BUSY_TIMEOUT)}")
+        cursor.execute(f"PRAGMA journal_mode = {settings.SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous = {settings.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA cache_size = {int(settings.SQLITE_CACHE_SIZE)}")
+        cursor.execute(f"PRAGMA mmap_size = {int(settings.SQLITE_MMAP_SIZE)}")
+        if query_only:
+            cursor.execute("PRAGMA query_only = ON")
+        cursor.close()
+
+        if immediate:
+            # Let SQLAlchemy emit BEGIN itself, see the "begin" listener below.
+            dbapi_connection.isolation_level = None
+
+    if immediate:
+
+        @event.listens_for(engine, "begin")
+        def _begin_immediate(connection) -> None:  # noqa: ANN001
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def create_async_engines(url: str) -> Tuple[AsyncEngine, AsyncEngine]:
+    """Return the writer and the reader engines of the API for a database, through the aiosqlite driver."""
+    async_url = make_url(url).set(drivername="sqlite+aiosqlite")
+
+    # SQLite allows a single writer per file: writes queue for one connection instead of contending for the lock.
+    write_engine = create_async_engine(async_url, pool_size=1, max_overflow=0, pool_timeout=settings.DB_POOL_TIMEOUT)
+    configure_sqlite(write_engine.sync_engine, immediate=True)
+
+    # With WAL readers never wait behind the writer.
+    read_engine = create_async_engine(async_url, pool_size=settings.DB_READ_POOL_SIZE, max_overflow=0, pool_timeout=settings.DB_POOL_TIMEOUT)
+    configure_sqlite(read_engine.sync_engine, query_only=True)
+    return write_engine, read_engine
+
+
+def make_session(engine: AsyncEngine) -> async_sessionmaker:
+    """Return the API session factory of an engine."""
+    return async_sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+
+# Async database setup for the API: one database, or settings.SHARD_URLS with books partitioned by ID.
+write_engines, read_engines = zip(*(create_async_engines(url) for url in settings.SHARD_URLS or [settings.DATABASE_URL]), strict=True)
+write_engine, read_engine = write_engines[0], read_engines[0]
+
+if settings.SHARD_URLS:
+    ReadSessionLocal = ShardedSessionMaker([make_session(engine) for engine in read_engines])
+    WriteSessionLocal = ShardedSessionMaker([make_session(engine) for engine in write_engines], ReadSessionLocal.session_makers)
+else:
+    WriteSessionLocal = make_session(write_engine)
+    ReadSessionLocal = make_session(read_engine)
+
+
+async def get_write_db() -> AsyncGenerator[AsyncSession, None]:
+    """Yield async DB on the writer connection, for endpoints that change data."""
+    async with WriteSessionLocal() as db:
+        yield db
+
+
+async def get_read_db() -> AsyncGenerator[AsyncSession, None]:
+    """Yield async DB on a read-only connection, for endpoints that only read data."""
+    async with ReadSessionLocal() as db:
         yield db
-    finally:
-        db.close()
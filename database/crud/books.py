@@ -1,100 +1,474 @@
-from typing import List
+import re
+from collections.abc import AsyncIterator
+from itertools import groupby
+from operator import itemgetter
+from typing import Dict, List, Literal, NamedTuple, Optional, Sequence, Tuple, Union
 
-from sqlalchemy import and_, func, not_
-from sqlalchemy.orm import Session
+from sqlalchemy import ColumnElement, and_, bindparam, case, delete, func, insert, lambda_stmt, literal, literal_column, not_, or_, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.exc import StaleDataError
 
-from models.book import Book
-from schemas.book import BooksWithGenres, CensoredBook
+from models.book import Book, BookSearch, CatalogVersion, DecadeCount, GenreCount
+from schemas.book import BookGet
 
+SearchMode = Literal["substring", "fulltext"]
 
-def db_insert(db: Session, data: object) -> None:
+# Sorts of filtered listings, descending with a "-" prefix; ties are broken by ID.
+BookSort = Literal["id", "-id", "publication_year", "-publication_year"]
+
+# Title masked in SQL for books with the genre "18+", same as schemas.book.CensoredBook.
+censored_title = case((Book.genre == "18+", literal("CENSORED")), else_=Book.title).label("title")
+
+# Columns of schemas.book.CensoredBook, in the order of its fields.
+CENSORED_BOOK_FIELDS = ("title", "author", "publication_year", "genre", "id")
+censored_book_columns = (censored_title, Book.author, Book.publication_year, Book.genre, Book.id)
+
+# Fields of a book in the order of exports, ID first.
+BOOK_FIELDS = ("id", "title", "author", "publication_year", "genre")
+
+
+def grouped_columns(fields: Optional[Sequence[str]] = None) -> Tuple:
+    """
+    Return the censored columns of the fields of a book in the order of schemas.book.CensoredBook, all by default.
+
+    Genre and id always come last, as books are grouped and paginated by them.
+    """
+    if fields is None:
+        return censored_book_columns
+    return (*(column for field, column in zip(CENSORED_BOOK_FIELDS[:3], censored_book_columns, strict=False) if field in fields), Book.genre, Book.id)
+
+
+# Hot statements are built once with bound parameters: executing them skips statement construction,
+# and their compiled form is found in the engine's cache with a cache key computed once.
+book_by_id = select(Book).filter(Book.id == bindparam("id"))
+books_by_ids = select(Book).filter(Book.id.in_(bindparam("ids", expanding=True))).order_by(Book.id)
+update_books = update(Book)
+catalog_version = select(CatalogVersion.version).filter(CatalogVersion.id == 1)
+bump_version = update(CatalogVersion).filter(CatalogVersion.id == 1).values(version=CatalogVersion.version + 1).execution_options(synchronize_session=False)
+
+
+async def db_insert(db: AsyncSession, data: object) -> None:
     """
     Insert a book.
 
     : param data: data to insert.
     """
     db.add(data)
-    db.commit()
+    await _bump_version(db)
+    await db.commit()
 
 
-def db_update(db: Session, data) -> int:
+async def db_bulk_insert(db: AsyncSession, data: List[dict], remainder: int = 0, modulus: int = 1) -> List[int]:
     """
-    Update a book.
+    Insert books with a single executemany statement and commit.
 
-    : param data: data to update.
+    IDs are assigned from the current max ID: the write transaction holds the database lock from its start,
+    and SQLite cannot return the IDs of a batched insert in the order of its rows.
+    Return IDs of the inserted books, in the order of data, as POST /books/bulk reports them per row.
+
+    : param data: column values of books to insert.
+    : param remainder: assign IDs equal to remainder modulo modulus only, the residue class of a shard.
+    : param modulus: number of shards.
     """
-    result = db.query(Book).filter(Book.id == data.id).update(data.model_dump())
-    db.commit()
+    last = await db.scalar(select(func.max(Book.id))) or 0
+    first = last + 1 + (remainder - last - 1) % modulus
+    ids = list(range(first, first + len(data) * modulus, modulus))
 
-    return result
+    await db.execute(insert(Book), [{**row, "id": _id} for row, _id in zip(data, ids, strict=True)])
+    await _bump_version(db)
+    await db.commit()
+
+    return ids
 
 
-def db_get_censored(db: Session) -> List[BooksWithGenres]:
+async def db_bulk_update(db: AsyncSession, data: List[BookGet]) -> Optional[List[Book]]:
     """
-    Return all books grouped by genre and provide a count for each group.
+    Update books with a single executemany statement and commit, all or nothing.
 
-    Mask titles for books with the genre "18+".
+    Return updated books ordered by ID, or None without changing anything if some of the books do not exist.
+
+    : param data: books to update.
+    """
+    try:
+        await db.execute(update_books, [book.model_dump() for book in data])
+    except StaleDataError:
+        await db.rollback()
+        return None
+    await _bump_version(db)
+    await db.commit()
+
+    return (await db.scalars(books_by_ids, {"ids": list({book.id for book in data})})).all()
+
+
+async def db_get_version(db: AsyncSession) -> int:
+    """Return the catalog version, bumped by every write."""
+    return await db.scalar(catalog_version) or 0
+
+
+async def _bump_version(db: AsyncSession) -> None:
+    """Bump the catalog version within the current write transaction."""
+    await db.execute(bump_version)
+
+
+async def db_count_genres(db: AsyncSession) -> int:
+    """Return the number of distinct genres."""
+    return await db.scalar(select(func.count()).select_from(GenreCount))
+
+
+async def db_count_by_genre(db: AsyncSession, genre: str) -> int:
+    """
+    Return the number of books of the genre.
+
+    :param genre: genre of books.
     """
-    result: BooksWithGenres = []
+    return await db.scalar(select(GenreCount.count).filter(GenreCount.genre == genre)) or 0
 
-    genres = (db.query(Book.genre, func.count().label("count")).group_by(Book.genre).order_by(Book.genre)).all()
 
-    for genre in genres:
-        books = db.query(Book).filter(Book.genre == genre[0]).all()
+async def db_get_censored(db: AsyncSession, limit: Optional[int] = None, offset: int = 0, fields: Optional[Sequence[str]] = None) -> List[dict]:
+    """
+    Return a page of books grouped by genre and provide a count for each group.
+
+    Genres and their counts are paginated over the genre_counts table; books of the page are fetched with a single statement.
+    Mask titles for books with the genre "18+" in SQL, groups are plain dicts shaped as schemas.book.BooksWithGenres.
+
+    :param limit: max number of genres to return.
+    :param offset: number of genres to skip.
+    :param fields: fields of books to select and return, all by default.
+    """
+    genres = select(GenreCount.genre).order_by(GenreCount.genre).limit(limit).offset(offset).subquery()
+
+    # Genres of a page are contiguous: their books are a single range of ix_books_genre_id, read in order without sorting.
+    statement = (
+        select(*grouped_columns(fields), GenreCount.count)
+        .join(GenreCount, Book.genre == GenreCount.genre)
+        .filter(Book.genre.between(select(func.min(genres.c.genre)).scalar_subquery(), select(func.max(genres.c.genre)).scalar_subquery()))
+        .order_by(Book.genre, Book.id)
+    )
+    rows = (await db.execute(statement)).all()
+
+    return group_by_genre(rows, fields)
+
+
+async def db_get_censored_after(
+    db: AsyncSession,
+    limit: int,
+    after: Optional[Tuple[str, int]] = None,
+    fields: Optional[Sequence[str]] = None,
+) -> List[dict]:
+    """
+    Return the books following the (genre, id) keyset grouped by genre and provide a count for each group.
+
+    Pages never skip or repeat books under concurrent writes and cost the same regardless of their depth.
+    Mask titles for books with the genre "18+" in SQL, groups are plain dicts shaped as schemas.book.BooksWithGenres.
+
+    :param limit: max number of books to return.
+    :param after: (genre, id) of the last book of the previous page.
+    :param fields: fields of books to select and return, all by default.
+    """
+    # A single range of ix_books_genre_id, which covers every column.
+    statement = select(*grouped_columns(fields), GenreCount.count).join(GenreCount, Book.genre == GenreCount.genre).order_by(Book.genre, Book.id).limit(limit)
+    if after:
+        statement = statement.where(tuple_(Book.genre, Book.id) > tuple_(*after))
+
+    rows = (await db.execute(statement)).all()
+
+    return group_by_genre(rows, fields)
 
-        aggregated_books = BooksWithGenres(
-            genre=genre[0],
-            count=genre[1],
-            books=[CensoredBook.model_validate(book.__dict__) for book in books],
-        )
+
+def group_by_genre(rows: List[Tuple], fields: Optional[Sequence[str]] = None) -> List[dict]:
+    """
+    Group (*grouped columns, genre count) rows ordered by genre into genre groups, without model validation.
+
+    :param fields: fields of the grouped columns, see grouped_columns; genre and id are only returned if among them.
+    """
+    result: List[dict] = []
+    names = CENSORED_BOOK_FIELDS if fields is None else (*(field for field in CENSORED_BOOK_FIELDS[:3] if field in fields), "genre", "id")
+    hidden = () if fields is None else {"genre", "id"}.difference(fields)
+
+    for genre, group in groupby(rows, key=itemgetter(-3)):
+        books = list(group)
+
+        aggregated_books = {
+            "books": [dict(zip(names, book, strict=False)) if not hidden else {name: value for name, value in zip(names, book, strict=False) if name not in hidden} for book in books],
+            "genre": genre,
+            "count": books[0][-1],
+        }
 
         result.append(aggregated_books)
     return result
 
 
-def db_get_by_ids(db: Session, ids: List[int]) -> List[Book]:
+async def db_iter_books(db: AsyncSession, batch_size: int = 10_000) -> AsyncIterator[Tuple[int, str, str, str]]:
+    """
+    Stream (id, title, author, genre) of all books without loading ORM entities.
+
+    :param batch_size: number of rows fetched from the cursor at once.
+    """
+    result = await db.stream(select(Book.id, Book.title, Book.author, Book.genre).execution_options(yield_per=batch_size))
+    async for row in result:
+        yield tuple(row)
+
+
+async def db_iter_censored(
+    db: AsyncSession,
+    batch_size: int = 10_000,
+    fields: Optional[Sequence[str]] = None,
+) -> AsyncIterator[List[Tuple[int, str, str, int, str]]]:
+    """
+    Stream all books as batches of (id, title, author, publication_year, genre) rows ordered by ID.
+
+    Mask titles for books with the genre "18+".
+
+    :param batch_size: number of rows fetched from the cursor at once.
+    :param fields: fields of books to select, in the order of BOOK_FIELDS; the ID always comes first.
+    """
+    columns = dict(zip(BOOK_FIELDS, (Book.id, censored_title, Book.author, Book.publication_year, Book.genre), strict=True))
+    statement = select(*(column for field, column in columns.items() if fields is None or field in fields or field == "id")).order_by(Book.id)
+    result = await db.stream(statement.execution_options(yield_per=batch_size))
+    async for partition in result.partitions():
+        yield [tuple(row) for row in partition]
+
+
+async def db_get_by_ids(db: AsyncSession, ids: List[int]) -> List[Book]:
     """
-    Get books by ID.
+    Get books by ID, ordered by ID.
 
     :param ids: list if IDs.
     """
-    return db.query(Book).filter(Book.id.in_(ids)).all()
+    return (await db.scalars(books_by_ids, {"ids": list(ids)})).all()
 
 
-def db_get_by_id(db: Session, _id: int) -> Book:
+async def db_get_by_id(db: AsyncSession, _id: int) -> Book:
     """
     Get book by ID.
 
     :param _id: book ID.
     """
-    return db.query(Book).filter(Book.id == _id).first()
+    return await db.scalar(book_by_id, {"id": _id})
 
 
-def db_search(db: Session, title: str = None, author: str = None) -> List[Book]:
+async def db_search(
+    db: AsyncSession,
+    title: Optional[str] = None,
+    author: Optional[str] = None,
+    limit: Optional[int] = None,
+    after: Optional[int] = None,
+    mode: SearchMode = "substring",
+    fields: Optional[Sequence[str]] = None,
+) -> Union[List[Book], List[dict]]:
     """
     Endpoint to search for Books by Title or Author.
 
     At least one of Title or Author is required.
     Cannot search for books with the genre "18+".
-    Case insensitive, partial.
+    Case insensitive, partial: substring match in "substring" mode, token prefix match over the FTS5 index in "fulltext" mode.
 
     :param title: title of the book.
     :param author: author of the book.
+    :param limit: max number of books to return, ordered by ID.
+    :param after: ID of the last book of the previous page.
+    :param mode: "substring" scans the table, "fulltext" uses the books_fts index.
+    :param fields: select these fields only and return dicts of them, along with the ID, instead of books.
     """
-    filters = and_(
-        func.lower(Book.title).contains(title.lower()) if title else True,
-        func.lower(Book.author).contains(author.lower()) if author else True,
-        not_((Book.genre).contains("18+")),
-    )
+    # Lambda statements: every combination of the optional filters is built and compiled once,
+    # the values closed over are extracted as bound parameters on each call.
+    if fields is None:
+        statement = lambda_stmt(lambda: select(Book))
+    else:
+        # A tuple of columns closed over is part of the cache key: every projection is compiled once as well.
+        columns = tuple(getattr(Book, field) for field in BOOK_FIELDS if field in fields or field == "id")
+        statement = lambda_stmt(lambda: select(*columns))
+
+    if mode == "fulltext":
+        query = _fulltext_query(title=title, author=author)
+        if not query:
+            return []
+        statement += lambda s: s.filter(Book.id.in_(select(BookSearch.c.rowid).where(literal_column(BookSearch.name).match(query))))
+    else:
+        if title:
+            title = title.lower()
+            statement += lambda s: s.filter(func.lower(Book.title).contains(title))
+        if author:
+            author = author.lower()
+            statement += lambda s: s.filter(func.lower(Book.author).contains(author))
+
+    # After the matches above, which reject most rows before this check runs.
+    statement += lambda s: s.filter(not_(Book.genre.contains("18+")))
+    if after is not None:
+        statement += lambda s: s.filter(Book.id > after)
+    statement += lambda s: s.order_by(Book.id)
+    if limit is not None:
+        statement += lambda s: s.limit(limit)
+
+    result = await db.execute(statement)
+    return result.scalars().all() if fields is None else [row._asdict() for row in result]
+
+
+class BookFilters(NamedTuple):
+    """Filters of books, each a range of an index of Book: exact genre or author, publication years within bounds."""
+
+    genre: Optional[str] = None
+    author: Optional[str] = None
+    year_from: Optional[int] = None
+    year_to: Optional[int] = None
+
+    def clauses(self) -> List:
+        """Return the WHERE clauses of the filters set."""
+        clauses = []
+        if self.genre is not None:
+            clauses.append(Book.genre == self.genre)
+        if self.author is not None:
+            clauses.append(Book.author == self.author)
+        if self.year_from is not None:
+            clauses.append(Book.publication_year >= self.year_from)
+        if self.year_to is not None:
+            clauses.append(Book.publication_year <= self.year_to)
+        return clauses
+
+
+def sort_keyset(sort: BookSort, book: dict) -> Tuple:
+    """Return the sort key of a book returned by db_filter, the keyset of the page following it."""
+    return (book["id"],) if sort.lstrip("-") == "id" else (book["publication_year"], book["id"])
+
+
+def _sort_order(sort: BookSort) -> Tuple:
+    """Return the ORDER BY columns of the sort."""
+    columns = (Book.id,) if sort.lstrip("-") == "id" else (Book.publication_year, Book.id)
+    return tuple(column.desc() for column in columns) if sort.startswith("-") else columns
+
+
+def _after_keyset(sort: BookSort, after: Tuple) -> ColumnElement[bool]:
+    """
+    Return the clause matching books following the keyset in the order of the sort.
+
+    SQLite sorts books without a publication year first, so they come first in ascending order and last in descending order.
+    """
+    descending = sort.startswith("-")
+    if sort.lstrip("-") == "id":
+        (book_id,) = after
+        return Book.id < book_id if descending else Book.id > book_id
+
+    year, book_id = after
+    if year is None:
+        following = and_(Book.publication_year.is_(None), Book.id < book_id if descending else Book.id > book_id)
+        return following if descending else or_(following, Book.publication_year.is_not(None))
+    keyset = tuple_(Book.publication_year, Book.id)
+    return or_(keyset < tuple_(year, book_id), Book.publication_year.is_(None)) if descending else keyset > tuple_(year, book_id)
+
+
+async def db_filter(
+    db: AsyncSession,
+    filters: BookFilters,
+    sort: BookSort = "id",
+    limit: Optional[int] = None,
+    offset: int = 0,
+    after: Optional[Tuple] = None,
+) -> List[dict]:
+    """
+    Return books matching the filters in the order of the sort, as plain dicts shaped as schemas.book.CensoredBook.
+
+    Mask titles for books with the genre "18+" in SQL.
+    A genre, an author or a range of years is a range of ix_books_genre_id, ix_books_author_id or
+    ix_books_publication_year_id, ordered by ID or by (year, id): such pages are read in order without sorting.
+
+    :param filters: filters of books, all books by default.
+    :param sort: "id" or "publication_year", descending with a "-" prefix.
+    :param limit: max number of books to return.
+    :param offset: number of books to skip.
+    :param after: sort key of the last book of the previous page, see sort_keyset.
+    """
+    statement = select(*censored_book_columns).filter(*filters.clauses()).order_by(*_sort_order(sort)).limit(limit).offset(offset)
+    if after is not None:
+        statement = statement.where(_after_keyset(sort, after))
+    return [row._asdict() for row in await db.execute(statement)]
+
 
-    return db.query(Book).filter(filters).all()
+async def db_count_filtered(db: AsyncSession, filters: BookFilters) -> int:
+    """
+    Return the number of books matching the filters, from genre_counts for a genre alone.
+
+    :param filters: filters of books, all books by default.
+    """
+    if filters.genre is not None and filters == BookFilters(genre=filters.genre):
+        return await db_count_by_genre(db, filters.genre)
+    return await db.scalar(select(func.count()).select_from(Book).filter(*filters.clauses()))
+
+
+async def db_get_stats(db: AsyncSession) -> Dict[str, Dict]:
+    """Return the number of books per genre and per decade of publication, from the tables maintained by triggers."""
+    genres = await db.execute(select(GenreCount.genre, GenreCount.count).order_by(GenreCount.genre))
+    decades = await db.execute(select(DecadeCount.decade, DecadeCount.count).order_by(DecadeCount.decade))
+    return {"genres": dict(genres.all()), "decades": dict(decades.all())}
+
+
+def _fulltext_query(title: Optional[str] = None, author: Optional[str] = None) -> str:
+    """
+    Build an FTS5 MATCH query: every word of title/author must prefix a token of that column.
+
+    Return an empty query when a given value has no searchable words.
+
+    :param title: title of the book.
+    :param author: author of the book.
+    """
+    queries = []
+
+    for column, value in (("title", title), ("author", author)):
+        if not value:
+            continue
+
+        tokens = re.findall(r"[^\W_]+", value.lower())
+        if not tokens:
+            return ""
+
+        phrases = " ".join(f'"{token}"*' for token in tokens)
+        queries.append(f"{column} : ({phrases})")
+    return " AND ".join(queries)
+
+
+async def db_bulk_delete(db: AsyncSession, ids: List[int]) -> Tuple[List[int], Dict[int, str]]:
+    """
+    Delete books by IDs with a single statement and commit, keeping the last book of every genre.
+
+    The rule is checked for the whole batch against genre_counts in one query. As if books were deleted one by one
+    in the given order, the last requested book of a genre the batch would empty is kept.
+    Return deleted IDs and the kept IDs with their genre; other IDs were not found.
+
+    :param ids: IDs of books to delete, duplicates are ignored.
+    """
+    ids = list(dict.fromkeys(ids))
+    statement = select(Book.id, Book.genre, GenreCount.count).outerjoin(GenreCount, GenreCount.genre == Book.genre).filter(Book.id.in_(ids))
+    found = {book_id: (genre, count) for book_id, genre, count in await db.execute(statement)}
+
+    kept = last_books_of_emptied_genres(ids, found)
+    deleted = [book_id for book_id in ids if book_id in found and book_id not in kept]
+
+    if deleted:
+        await db.execute(delete(Book).filter(Book.id.in_(deleted)).execution_options(synchronize_session=False))
+        await _bump_version(db)
+    await db.commit()
+    return deleted, kept
+
+
+def last_books_of_emptied_genres(ids: List[int], found: Dict[int, Tuple[Optional[str], Optional[int]]]) -> Dict[int, str]:
+    """
+    Return the books to keep, with their genre, when deleting ids one by one in order.
+
+    :param ids: IDs of books to delete, without duplicates.
+    :param found: (genre, number of books of the genre) of the books which exist, by ID.
+    """
+    requested_by_genre: Dict[str, List[int]] = {}
+    for book_id in ids:
+        if book_id in found and found[book_id][0] is not None:
+            requested_by_genre.setdefault(found[book_id][0], []).append(book_id)
+    return {requested[-1]: genre for genre, requested in requested_by_genre.items() if len(requested) >= found[requested[0]][1]}
 
 
-def db_delete(db: Session, _id: int) -> None:
+async def db_delete(db: AsyncSession, _id: int) -> None:
     """
     Delete the book by ID.
 
     :param _id: book ID.
     """
-    db.query(Book).filter(Book.id == _id).delete()
-    db.commit()
+    await db.execute(delete(Book).filter(Book.id == _id))
+    await _bump_version(db)
+    await db.commit()
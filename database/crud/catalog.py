@@ -0,0 +1,37 @@
+"""
+CRUD functions of the configured catalog, for the API.
+
+database.crud.books over a single database, or database.crud.sharded_books when settings.SHARD_URLS is set,
+with the session factories of database.config matching the mode.
+"""
+
+from database.config import settings
+from database.crud import books, sharded_books
+
+SearchMode = books.SearchMode
+BookSort = books.BookSort
+BookFilters = books.BookFilters
+sort_keyset = books.sort_keyset
+BOOK_FIELDS = books.BOOK_FIELDS
+CENSORED_BOOK_FIELDS = books.CENSORED_BOOK_FIELDS
+
+_crud = sharded_books if settings.SHARD_URLS else books
+
+db_insert = _crud.db_insert
+db_bulk_insert = _crud.db_bulk_insert
+db_bulk_update = _crud.db_bulk_update
+db_get_version = _crud.db_get_version
+db_count_genres = _crud.db_count_genres
+db_count_by_genre = _crud.db_count_by_genre
+db_get_censored = _crud.db_get_censored
+db_get_censored_after = _crud.db_get_censored_after
+db_iter_books = _crud.db_iter_books
+db_iter_censored = _crud.db_iter_censored
+db_get_by_ids = _crud.db_get_by_ids
+db_get_by_id = _crud.db_get_by_id
+db_search = _crud.db_search
+db_filter = _crud.db_filter
+db_count_filtered = _crud.db_count_filtered
+db_get_stats = _crud.db_get_stats
+db_bulk_delete = _crud.db_bulk_delete
+db_delete = _crud.db_delete
@@ -0,0 +1,368 @@
+"""
+CRUD functions of database.crud.books over a catalog sharded by book ID, see database.sharding.
+
+Operations on known IDs go to the shards holding them; listings, searches and counts fan out to every shard
+concurrently and merge the results in the order of the single database functions.
+Writes are atomic within a shard only: a batch spanning shards commits shard by shard, after checks
+which read every shard without locking it (see ShardedSession), so concurrent writes can slip in between.
+Bulk updates are the exception: they apply to every shard before committing any, see db_bulk_update.
+"""
+
+import asyncio
+import heapq
+from collections.abc import AsyncIterator, Callable
+from itertools import count, islice
+from operator import attrgetter, itemgetter
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.exc import StaleDataError
+
+from database.crud import books
+from database.crud.books import BookFilters, BookSort, SearchMode, bump_version, group_by_genre, grouped_columns, last_books_of_emptied_genres
+from database.sharding import ShardedSession, shard_of
+from models.book import Book, GenreCount
+from schemas.book import BookGet
+
+# Shards take new books in turn, so that writes spread evenly.
+_next_shard = count()
+
+
+def _by_shard(db: ShardedSession, ids: List[int]) -> Dict[int, List[int]]:
+    """Group IDs by the index of their shard, keeping their order."""
+    grouped: Dict[int, List[int]] = {}
+    for book_id in ids:
+        grouped.setdefault(shard_of(book_id, len(db)), []).append(book_id)
+    return grouped
+
+
+async def _genre_counts(db: ShardedSession, genres: Optional[List[str]] = None) -> Dict[str, int]:
+    """Return the number of books of every genre, or of the given genres, summed over shards."""
+    statement = select(GenreCount.genre, GenreCount.count)
+    if genres is not None:
+        statement = statement.filter(GenreCount.genre.in_(genres))
+    counts: Dict[str, int] = {}
+    for rows in await asyncio.gather(*(reader.execute(statement) for reader in db.readers())):
+        for genre, genre_count in rows:
+            counts[genre] = counts.get(genre, 0) + genre_count
+    return counts
+
+
+async def db_insert(db: ShardedSession, data: Book) -> None:
+    """
+    Insert a book in the next shard and set its ID.
+
+    : param data: data to insert.
+    """
+    index = next(_next_shard) % len(db)
+    row = {column.name: getattr(data, column.name) for column in Book.__table__.columns if column.name != "id"}
+    [data.id] = await books.db_bulk_insert(db.shard(index), [row], remainder=index, modulus=len(db))
+
+
+async def db_bulk_insert(db: ShardedSession, data: List[dict]) -> List[int]:
+    """
+    Insert books spread over all shards, one executemany statement and commit per shard, concurrently.
+
+    Return IDs of the inserted books, in the order of data.
+
+    : param data: column values of books to insert.
+    """
+    shards = len(db)
+    offset = next(_next_shard)
+    parts = [(data[position::shards], (offset + position) % shards) for position in range(min(shards, len(data)))]
+    ids_by_part = await asyncio.gather(
+        *(books.db_bulk_insert(db.shard(index), part, remainder=index, modulus=shards) for part, index in parts),
+    )
+    return [ids_by_part[position % shards][position // shards] for position in range(len(data))]
+
+
+async def db_bulk_update(db: ShardedSession, data: List[BookGet]) -> Optional[List[Book]]:
+    """
+    Update books in the shards holding them, all or nothing, one executemany statement per shard.
+
+    Return updated books ordered by ID, or None without changing anything if some of the books do not exist.
+    Every shard applies its updates before any of them commits, and all of them roll back if a book is missing.
+    Shards are locked one after the other in the order of shards, so that concurrent updates cannot deadlock;
+    only a failure of a commit itself can leave earlier shards committed.
+
+    : param data: books to update.
+    """
+    grouped: Dict[int, List[BookGet]] = {}
+    for book in data:
+        grouped.setdefault(shard_of(book.id, len(db)), []).append(book)
+
+    updated = []
+    try:
+        for index in sorted(grouped):
+            shard = db.shard(index)
+            await shard.execute(books.update_books, [book.model_dump() for book in grouped[index]])
+            await shard.execute(bump_version)
+            # Read back within the transaction, which holds the lock of the shard already.
+            updated.append(await books.db_get_by_ids(shard, list({book.id for book in grouped[index]})))
+    except StaleDataError:
+        for index in grouped:
+            await db.shard(index).rollback()
+        return None
+
+    for index in sorted(grouped):
+        await db.shard(index).commit()
+    return list(heapq.merge(*updated, key=attrgetter("id")))
+
+
+async def db_get_version(db: ShardedSession) -> int:
+    """Return the catalog version: the sum of shard versions, bumped by every write to any shard."""
+    return sum(await asyncio.gather(*(books.db_get_version(reader) for reader in db.readers())))
+
+
+async def db_count_genres(db: ShardedSession) -> int:
+    """Return the number of distinct genres over all shards."""
+    return len(await _genre_counts(db))
+
+
+async def db_count_by_genre(db: ShardedSession, genre: str) -> int:
+    """
+    Return the number of books of the genre over all shards.
+
+    :param genre: genre of books.
+    """
+    return (await _genre_counts(db, [genre])).get(genre, 0)
+
+
+async def db_get_censored(db: ShardedSession, limit: Optional[int] = None, offset: int = 0, fields: Optional[Sequence[str]] = None) -> List[dict]:
+    """
+    Return a page of books grouped by genre and provide a count for each group, see books.db_get_censored.
+
+    Genres are paginated over the counts of all shards; books of the page are merged from every shard by (genre, id).
+
+    :param limit: max number of genres to return.
+    :param offset: number of genres to skip.
+    :param fields: fields of books to select and return, all by default.
+    """
+    counts = await _genre_counts(db)
+    genres = sorted(counts)[offset : None if limit is None else offset + limit]
+    if not genres:
+        return []
+
+    statement = select(*grouped_columns(fields)).filter(Book.genre.between(genres[0], genres[-1])).order_by(Book.genre, Book.id)
+    results = await asyncio.gather(*(reader.execute(statement) for reader in db.readers()))
+    rows = heapq.merge(*(result.all() for result in results), key=itemgetter(-2, -1))
+    # Counts and books are read apart: genres created since the counts were read are left for the next read.
+    return group_by_genre([(*row, counts[row[-2]]) for row in rows if row[-2] in counts], fields)
+
+
+async def db_get_censored_after(
+    db: ShardedSession,
+    limit: int,
+    after: Optional[Tuple[str, int]] = None,
+    fields: Optional[Sequence[str]] = None,
+) -> List[dict]:
+    """
+    Return the books following the (genre, id) keyset grouped by genre and provide a count for each group.
+
+    Every shard returns its first limit books after the keyset, the merged page keeps the first limit of them.
+
+    :param limit: max number of books to return.
+    :param after: (genre, id) of the last book of the previous page.
+    :param fields: fields of books to select and return, all by default.
+    """
+    statement = select(*grouped_columns(fields)).filter(Book.genre.is_not(None)).order_by(Book.genre, Book.id).limit(limit)
+    if after:
+        statement = statement.where(tuple_(Book.genre, Book.id) > tuple_(*after))
+    results = await asyncio.gather(*(reader.execute(statement) for reader in db.readers()))
+    rows = list(heapq.merge(*(result.all() for result in results), key=itemgetter(-2, -1)))[:limit]
+
+    counts = await _genre_counts(db, list({row[-2] for row in rows}))
+    # Counts and books are read apart: books of genres emptied since the books were read are gone by now.
+    return group_by_genre([(*row, counts[row[-2]]) for row in rows if row[-2] in counts], fields)
+
+
+async def db_iter_books(db: ShardedSession, batch_size: int = 10_000) -> AsyncIterator[Tuple[int, str, str, str]]:
+    """
+    Stream (id, title, author, genre) of all books of every shard, shard by shard.
+
+    :param batch_size: number of rows fetched from the cursor at once.
+    """
+    for reader in db.readers():
+        async for book in books.db_iter_books(reader, batch_size):
+            yield book
+
+
+async def db_iter_censored(
+    db: ShardedSession,
+    batch_size: int = 10_000,
+    fields: Optional[Sequence[str]] = None,
+) -> AsyncIterator[List[Tuple[int, str, str, int, str]]]:
+    """
+    Stream all books as batches of (id, title, author, publication_year, genre) rows ordered by ID, merged from every shard.
+
+    Mask titles for books with the genre "18+".
+
+    :param batch_size: number of rows fetched from the cursor at once.
+    :param fields: fields of books to select, see books.db_iter_censored; the ID always comes first.
+    """
+    iterators = [books.db_iter_censored(reader, batch_size, fields) for reader in db.readers()]
+    pending: List[Tuple[List[tuple], int]] = []
+    heads: List[Tuple[int, int, int]] = []
+
+    async def refill(index: int) -> None:
+        batch = await anext(iterators[index], None)
+        if batch:
+            pending[index] = (batch, 0)
+            heapq.heappush(heads, (batch[0][0], index, 0))
+
+    pending.extend(([], 0) for _ in iterators)
+    for index in range(len(iterators)):
+        await refill(index)
+
+    output: List[tuple] = []
+    while heads:
+        _, index, position = heapq.heappop(heads)
+        batch = pending[index][0]
+        output.append(batch[position])
+        if position + 1 < len(batch):
+            heapq.heappush(heads, (batch[position + 1][0], index, position + 1))
+        else:
+            await refill(index)
+        if len(output) >= batch_size:
+            yield output
+            output = []
+    if output:
+        yield output
+
+
+async def db_get_by_ids(db: ShardedSession, ids: List[int]) -> List[Book]:
+    """
+    Get books by ID from the shards holding them, ordered by ID.
+
+    :param ids: list if IDs.
+    """
+    return await _get_by_ids(db.shard, db, ids)
+
+
+async def _get_by_ids(session: Callable[[int], AsyncSession], db: ShardedSession, ids: List[int]) -> List[Book]:
+    """Get books by ID through the session of their shard returned by session, ordered by ID."""
+    results = await asyncio.gather(*(books.db_get_by_ids(session(index), shard_ids) for index, shard_ids in _by_shard(db, ids).items()))
+    return list(heapq.merge(*results, key=attrgetter("id")))
+
+
+async def db_get_by_id(db: ShardedSession, _id: int) -> Book:
+    """
+    Get book by ID from the shard holding it.
+
+    :param _id: book ID.
+    """
+    return await books.db_get_by_id(db.route(_id), _id)
+
+
+async def db_search(
+    db: ShardedSession,
+    title: Optional[str] = None,
+    author: Optional[str] = None,
+    limit: Optional[int] = None,
+    after: Optional[int] = None,
+    mode: SearchMode = "substring",
+    fields: Optional[Sequence[str]] = None,
+) -> Union[List[Book], List[dict]]:
+    """
+    Search every shard for books by title or author, see books.db_search, and merge results by ID.
+
+    :param title: title of the book.
+    :param author: author of the book.
+    :param limit: max number of books to return, ordered by ID.
+    :param after: ID of the last book of the previous page.
+    :param mode: "substring" scans the table, "fulltext" uses the books_fts index.
+    :param fields: select these fields only and return dicts of them, along with the ID, instead of books.
+    """
+    results = await asyncio.gather(
+        *(books.db_search(reader, title=title, author=author, limit=limit, after=after, mode=mode, fields=fields) for reader in db.readers()),
+    )
+    return list(heapq.merge(*results, key=attrgetter("id") if fields is None else itemgetter("id")))[:limit]
+
+
+async def db_filter(
+    db: ShardedSession,
+    filters: BookFilters,
+    sort: BookSort = "id",
+    limit: Optional[int] = None,
+    offset: int = 0,
+    after: Optional[Tuple] = None,
+) -> List[dict]:
+    """
+    Return books matching the filters from every shard, merged in the order of the sort, see books.db_filter.
+
+    Every shard returns its first offset + limit books after the keyset, the merged page skips offset of them.
+
+    :param filters: filters of books, all books by default.
+    :param sort: "id" or "publication_year", descending with a "-" prefix.
+    :param limit: max number of books to return.
+    :param offset: number of books to skip.
+    :param after: sort key of the last book of the previous page, see books.sort_keyset.
+    """
+    end = None if limit is None else offset + limit
+    results = await asyncio.gather(*(books.db_filter(reader, filters, sort, limit=end, after=after) for reader in db.readers()))
+    if sort.lstrip("-") == "id":
+        key = itemgetter("id")
+    else:
+        # Books without a publication year first, as SQLite sorts them.
+        def key(book: dict) -> Tuple[bool, int, int]:
+            return book["publication_year"] is not None, book["publication_year"] or 0, book["id"]
+
+    return list(islice(heapq.merge(*results, key=key, reverse=sort.startswith("-")), offset, end))
+
+
+async def db_count_filtered(db: ShardedSession, filters: BookFilters) -> int:
+    """
+    Return the number of books matching the filters over all shards.
+
+    :param filters: filters of books, all books by default.
+    """
+    return sum(await asyncio.gather(*(books.db_count_filtered(reader, filters) for reader in db.readers())))
+
+
+async def db_get_stats(db: ShardedSession) -> Dict[str, Dict]:
+    """Return the number of books per genre and per decade of publication, summed over shards."""
+    stats: Dict[str, Dict] = {"genres": {}, "decades": {}}
+    for shard_stats in await asyncio.gather(*(books.db_get_stats(reader) for reader in db.readers())):
+        for name, counts in shard_stats.items():
+            for value, value_count in counts.items():
+                stats[name][value] = stats[name].get(value, 0) + value_count
+    return {name: dict(sorted(counts.items())) for name, counts in stats.items()}
+
+
+async def db_bulk_delete(db: ShardedSession, ids: List[int]) -> Tuple[List[int], Dict[int, str]]:
+    """
+    Delete books by IDs from the shards holding them, keeping the last book of every genre, see books.db_bulk_delete.
+
+    The rule is checked against genre counts summed over shards, then every shard deletes its books with a single statement
+    and commits. Deletes running concurrently on other shards can still empty a genre.
+
+    :param ids: IDs of books to delete, duplicates are ignored.
+    """
+    ids = list(dict.fromkeys(ids))
+    statement = select(Book.id, Book.genre)
+    results = await asyncio.gather(*(db.reader(index).execute(statement.filter(Book.id.in_(shard_ids))) for index, shard_ids in _by_shard(db, ids).items()))
+    genres = {book_id: genre for result in results for book_id, genre in result}
+
+    counts = await _genre_counts(db, list({genre for genre in genres.values() if genre is not None}))
+    found = {book_id: (genre, counts.get(genre)) for book_id, genre in genres.items()}
+    kept = last_books_of_emptied_genres(ids, found)
+    deleted = [book_id for book_id in ids if book_id in found and book_id not in kept]
+
+    async def delete_from(index: int, shard_ids: List[int]) -> None:
+        shard = db.shard(index)
+        await shard.execute(delete(Book).filter(Book.id.in_(shard_ids)).execution_options(synchronize_session=False))
+        await shard.execute(bump_version)
+        await shard.commit()
+
+    await asyncio.gather(*(delete_from(index, shard_ids) for index, shard_ids in _by_shard(db, deleted).items()))
+    return deleted, kept
+
+
+async def db_delete(db: ShardedSession, _id: int) -> None:
+    """
+    Delete the book by ID from the shard holding it.
+
+    :param _id: book ID.
+    """
+    await books.db_delete(db.route(_id), _id)
@@ -0,0 +1,106 @@
+"""
+Upgrade existing databases to the current schema, see `python manage.py migrate`.
+
+Base.metadata.create_all only creates missing tables: it neither adds indexes to an existing books table
+nor runs the DDL attached to the creation of books, which makes books_fts and its triggers.
+Every step checks sqlite_master first, so that running the upgrade again changes nothing.
+"""
+
+from typing import Dict, List, Set, Tuple
+
+from sqlalchemy import Connection, create_engine
+
+from database.config import configure_sqlite
+from models.book import (
+    BOOK_SEARCH_TABLE,
+    BOOK_SEARCH_TRIGGERS,
+    DECADE_COUNTS_SEED,
+    DECADE_COUNTS_TRIGGERS,
+    GENRE_COUNTS_SEED,
+    GENRE_COUNTS_TRIGGERS,
+    Base,
+    Book,
+)
+
+# Single-column indexes of the first schema, replaced by ix_books_genre_id.
+OBSOLETE_INDEXES = ("ix_books_id", "ix_books_title", "ix_books_author", "ix_books_publication_year", "ix_books_genre")
+
+# Tables derived from books: the triggers keeping each of them up to date and the statements computing it from scratch.
+DERIVED_TABLES: Dict[str, Tuple[Dict[str, str], Tuple[str, ...]]] = {
+    "genre_counts": (GENRE_COUNTS_TRIGGERS, ("DELETE FROM genre_counts", GENRE_COUNTS_SEED)),
+    "decade_counts": (DECADE_COUNTS_TRIGGERS, ("DELETE FROM decade_counts", DECADE_COUNTS_SEED)),
+    "books_fts": (BOOK_SEARCH_TRIGGERS, ("INSERT INTO books_fts(books_fts) VALUES ('rebuild')",)),
+}
+
+
+def _names(connection: Connection, kind: str) -> Set[str]:
+    """Return the names of the schema objects of a kind: "table", "index" or "trigger"."""
+    return set(connection.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = ?", (kind,)).scalars())
+
+
+def _upgrade_indexes(connection: Connection) -> List[str]:
+    """Drop the indexes of earlier schemas and create the missing indexes of books."""
+    applied = []
+    indexes = _names(connection, "index")
+    for name in OBSOLETE_INDEXES:
+        if name in indexes:
+            connection.exec_driver_sql(f"DROP INDEX {name}")
+            applied.append(f"drop index {name}")
+    for index in Book.__table__.indexes:
+        if index.name not in indexes:
+            index.create(connection)
+            applied.append(f"create index {index.name}")
+    return applied
+
+
+def _upgrade_derived(connection: Connection) -> List[str]:
+    """Create books_fts and the missing triggers of derived tables, recomputing the tables which missed any."""
+    applied = []
+    if "books_fts" not in _names(connection, "table"):
+        connection.exec_driver_sql(BOOK_SEARCH_TABLE)
+        applied.append("create table books_fts")
+
+    # A table missing any of its triggers may have missed writes: recompute it before creating them.
+    triggers = _names(connection, "trigger")
+    for table, (table_triggers, seed) in DERIVED_TABLES.items():
+        missing = [name for name in table_triggers if name not in triggers]
+        if not missing:
+            continue
+        for statement in seed:
+            connection.exec_driver_sql(statement)
+        applied.append(f"seed {table}")
+        for name in missing:
+            connection.exec_driver_sql(table_triggers[name])
+            applied.append(f"create trigger {name}")
+    return applied
+
+
+def _upgrade(connection: Connection) -> List[str]:
+    """Apply the missing steps within the transaction of the connection, return a description of each of them."""
+    tables = _names(connection, "table")
+    Base.metadata.create_all(bind=connection)
+    applied = [f"create table {table.name}" for table in Base.metadata.sorted_tables if table.name not in tables]
+    applied += _upgrade_indexes(connection) + _upgrade_derived(connection)
+
+    if applied:
+        connection.exec_driver_sql("UPDATE catalog_version SET version = version + 1 WHERE id = 1")
+    return applied
+
+
+def upgrade(database_url: str) -> List[str]:
+    """
+    Bring the database to the schema of models.book in a single transaction, creating it if needed.
+
+    Drop the indexes of earlier schemas, create missing tables, indexes and triggers, and seed the tables derived
+    from books whose triggers were missing. The catalog version is bumped if anything changed, so that running
+    servers drop their cached responses.
+    Return a description of every applied step, none for an up to date database.
+    """
+    engine = create_engine(database_url)
+    # BEGIN IMMEDIATE up front, so that no write slips between seeding a table and creating its triggers.
+    configure_sqlite(engine, immediate=True)
+    try:
+        with engine.begin() as connection:
+            return _upgrade(connection)
+    finally:
+        engine.dispose()
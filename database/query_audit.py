@@ -0,0 +1,135 @@
+"""
+Audit the query plans of the CRUD layer.
+
+Every function of database.crud.books is called with representative arguments on a copy of the database,
+the SQL statements they execute are captured and explained with EXPLAIN QUERY PLAN.
+Full table scans are flagged, unless the function has to read the whole table anyway.
+"""
+
+import asyncio
+import re
+import sqlite3
+import tempfile
+from collections.abc import Awaitable, Callable
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from database.crud import books as crud
+from models.book import Book
+from schemas.book import BookGet
+
+# Functions reading every book by design: exports and substring search, which no B-tree index can serve,
+# and unfiltered listings, which walk an index in the order of their sort up to their limit.
+EXPECTED_SCANS = frozenset({"db_iter_books", "db_iter_censored", "db_search.substring", "db_filter.unfiltered"})
+
+# "SCAN books" reads the table, "SCAN books USING [COVERING] INDEX ..." reads a whole index instead.
+FULL_SCAN = re.compile(r"^SCAN (\w+)(?: USING (?:COVERING )?INDEX \w+)?$")
+
+
+class QueryPlan(NamedTuple):
+    """Query plan of a statement executed by a CRUD function."""
+
+    function: str
+    statement: str
+    plan: List[str]
+    full_scans: List[str]
+
+    @property
+    def flagged(self) -> bool:
+        """Whether the plan scans a table fully where no full scan is expected."""
+        return bool(self.full_scans) and self.function not in EXPECTED_SCANS
+
+
+def full_scans(plan: List[str]) -> List[str]:
+    """Return the full scans of books among the lines of a query plan."""
+    return [line for line in plan if (match := FULL_SCAN.match(line)) and match.group(1) == "books"]
+
+
+async def _capture(database: Path) -> List[Tuple[str, str, tuple]]:
+    """Call every CRUD function on the database and return (function, statement, parameters) of each executed statement."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{database}")
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    captured: List[Tuple[str, str, tuple]] = []
+    # Name of the function being called, read by the listener below.
+    function = ""
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _record(_connection, _cursor, statement, parameters, _context, executemany) -> None:  # noqa: ANN001
+        if function:
+            captured.append((function, statement, tuple(parameters[0] if executemany else parameters)))
+
+    async with session_factory() as db:
+        books = (await db.scalars(select(Book).order_by(Book.id).limit(4))).all()
+    if len(books) < 4:  # noqa: PLR2004
+        raise ValueError("The database needs at least 4 books to audit queries.")
+    book, *others = books
+    sample = BookGet.model_validate(book, from_attributes=True)
+
+    def consume(iterator: Callable[[AsyncSession], object]) -> Callable[[AsyncSession], Awaitable[None]]:
+        async def call(db: AsyncSession) -> None:
+            async for _ in iterator(db):
+                break
+
+        return call
+
+    calls: Dict[str, Callable[[AsyncSession], Awaitable[object]]] = {
+        "db_get_version": crud.db_get_version,
+        "db_count_genres": crud.db_count_genres,
+        "db_count_by_genre": lambda db: crud.db_count_by_genre(db, book.genre),
+        "db_get_censored": lambda db: crud.db_get_censored(db, limit=50, offset=10),
+        "db_get_censored_after": lambda db: crud.db_get_censored_after(db, 50, (book.genre, book.id)),
+        "db_iter_books": consume(crud.db_iter_books),
+        "db_iter_censored": consume(crud.db_iter_censored),
+        "db_get_by_id": lambda db: crud.db_get_by_id(db, book.id),
+        "db_get_by_ids": lambda db: crud.db_get_by_ids(db, [book.id, others[0].id]),
+        "db_filter.genre": lambda db: crud.db_filter(db, crud.BookFilters(genre=book.genre), limit=50, after=(book.id,)),
+        "db_filter.author": lambda db: crud.db_filter(db, crud.BookFilters(author=book.author), "-id", limit=50, offset=10),
+        "db_filter.years": lambda db: crud.db_filter(db, crud.BookFilters(year_from=1950, year_to=1999), "publication_year", limit=50, after=(1960, book.id)),
+        "db_filter.unfiltered": lambda db: crud.db_filter(db, crud.BookFilters(), "-publication_year", limit=50),
+        "db_count_filtered": lambda db: crud.db_count_filtered(db, crud.BookFilters(author=book.author, year_from=1950)),
+        "db_get_stats": crud.db_get_stats,
+        "db_search.substring": lambda db: crud.db_search(db, title=book.title[:3], limit=50, after=book.id),
+        "db_search.fulltext": lambda db: crud.db_search(db, title=book.title, author=book.author, limit=50, mode="fulltext"),
+        "db_insert": lambda db: crud.db_insert(db, Book(title="Audit", author="Audit", publication_year=2000, genre=book.genre)),
+        "db_bulk_insert": lambda db: crud.db_bulk_insert(db, [{"title": "Audit", "author": "Audit", "publication_year": 2000, "genre": book.genre}]),
+        "db_bulk_update": lambda db: crud.db_bulk_update(db, [sample]),
+        "db_bulk_delete": lambda db: crud.db_bulk_delete(db, [others[0].id, others[1].id]),
+        "db_delete": lambda db: crud.db_delete(db, others[2].id),
+    }
+    try:
+        for function, call in calls.items():  # noqa: B007
+            async with session_factory() as db:
+                await call(db)
+    finally:
+        await engine.dispose()
+    return captured
+
+
+def audit(database_url: str) -> List[QueryPlan]:
+    """
+    Return the query plan of every distinct statement executed by the CRUD functions.
+
+    The functions write, so they run on a temporary copy of the database of database_url.
+    """
+    source = database_url.removeprefix("sqlite:///")
+    with tempfile.TemporaryDirectory() as workdir:
+        database = Path(workdir) / "audit.db"
+        with closing(sqlite3.connect(source)) as connection, closing(sqlite3.connect(database)) as copy:
+            connection.backup(copy)
+
+        captured = asyncio.run(_capture(database))
+
+        plans: List[QueryPlan] = []
+        seen = set()
+        with closing(sqlite3.connect(database)) as connection:
+            for function, statement, parameters in captured:
+                if (function, statement) in seen or not statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+                    continue
+                seen.add((function, statement))
+                plan = [row[3] for row in connection.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+                plans.append(QueryPlan(function, " ".join(statement.split()), plan, full_scans(plan)))
+    return plans
@@ -0,0 +1,91 @@
+"""
+Sessions over a catalog partitioned across several SQLite databases.
+
+Books live in the shard of index id % number of shards: every shard allocates IDs of its own residue class,
+so IDs are globally unique and a book is found without asking other shards.
+"""
+
+from typing import Dict, List, Optional, Self, Type
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+
+def shard_of(book_id: int, shards: int) -> int:
+    """Return the index of the shard holding the book."""
+    return book_id % shards
+
+
+class ShardedSession:
+    """
+    One session per shard, opened on first use and closed together.
+
+    Only the shards an operation touches take a connection, so writes to different shards run in parallel.
+    Checks spanning shards read through reader sessions instead, so that writes seldom hold the locks of
+    several shards at once; those which do take them in the order of shards, so concurrent writes cannot deadlock.
+    """
+
+    def __init__(self, session_makers: List[async_sessionmaker], reader_session_makers: Optional[List[async_sessionmaker]] = None) -> None:
+        """
+        Open no session yet.
+
+        :param session_makers: session makers of the shards, in the order of shards.
+        :param reader_session_makers: session makers of read-only sessions of the shards, the same order; None to read through session_makers.
+        """
+        self._session_makers = session_makers
+        self._reader_session_makers = reader_session_makers
+        self._sessions: Dict[int, AsyncSession] = {}
+        self._readers: Dict[int, AsyncSession] = {}
+
+    def __len__(self) -> int:
+        """Return the number of shards."""
+        return len(self._session_makers)
+
+    def shard(self, index: int) -> AsyncSession:
+        """Return the session of the shard of index."""
+        if index not in self._sessions:
+            self._sessions[index] = self._session_makers[index]()
+        return self._sessions[index]
+
+    def route(self, book_id: int) -> AsyncSession:
+        """Return the session of the shard holding the book."""
+        return self.shard(shard_of(book_id, len(self)))
+
+    def reader(self, index: int) -> AsyncSession:
+        """Return the reader session of the shard of index, the session itself without reader session makers."""
+        if self._reader_session_makers is None:
+            return self.shard(index)
+        if index not in self._readers:
+            self._readers[index] = self._reader_session_makers[index]()
+        return self._readers[index]
+
+    def readers(self) -> List[AsyncSession]:
+        """Return the reader sessions of every shard, in the order of shards."""
+        return [self.reader(index) for index in range(len(self))]
+
+    async def close(self) -> None:
+        """Close the sessions opened so far, rolling back what they did not commit."""
+        for session in (*self._sessions.values(), *self._readers.values()):
+            await session.close()
+        self._sessions.clear()
+        self._readers.clear()
+
+    async def __aenter__(self) -> Self:
+        """Return the session itself, closed on exit."""
+        return self
+
+    async def __aexit__(self, exc_type: Optional[Type[BaseException]], *_: object) -> None:
+        """Close the sessions opened within the block."""
+        await self.close()
+
+
+class ShardedSessionMaker:
+    """Factory of ShardedSession, used in place of async_sessionmaker when the catalog is sharded."""
+
+    def __init__(self, session_makers: List[async_sessionmaker], reader_session_makers: Optional[List[async_sessionmaker]] = None) -> None:
+        """Make sessions over the shards of session_makers, see ShardedSession."""
+        self.session_makers = session_makers
+        self.reader_session_makers = reader_session_makers
+
+    def __call__(self) -> ShardedSession:
+        """Return a new sharded session, which opens no connection until used."""
+        return ShardedSession(self.session_makers, self.reader_session_makers)
@@ -1,12 +0,0 @@
-INSERT INTO books(id,title,author,publication_year,genre) 
-VALUES 
-(1, 'The Great Gatsby', 'F. Scott', 1925, 'Fiction'), 
-(2, 'To Kill a Mockingbird', 'Harper Lee', 1960, 'Fiction'), 
-(3, '1984', 'George Orwell', 1949, 'Fiction'), 
-(4, 'Moby Dick', 'Herman Melville', 1851, 'Fiction'), 
-(5, 'Fifty Shades of Grey', 'E.L. James', 2011, '18+'), 
-(6, 'The Da Vinci Code', 'Dan Brown', 2003, 'Mystery'), 
-(7, 'The Shining', 'Stephen King', 1977, 'Horror'), 
-(8, 'A Brief History of Time', 'Stephen Hawking', 1988, 'Nonfiction'), 
-(9, 'The Catcher in the Rye', 'J.D. Salinger', 1951, 'Fiction'), 
-(10, 'The Hobbit', 'J.R.R. Tolkien', 1937, 'Fantasy');
\ No newline at end of file
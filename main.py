@@ -1,17 +1,134 @@
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager, suppress
+from typing import List, Optional, Tuple
+
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi_pagination import add_pagination
 from fastapi_pagination.utils import disable_installed_extensions_check
+from sqlalchemy.exc import SQLAlchemyError
 
 from api.v1.router import api_router
-from utils.logger import log_config
+from database.config import ReadSessionLocal, read_engines, settings, write_engines
+from database.crud.catalog import db_get_version, db_iter_books, db_iter_censored
+from database.migrations import upgrade
+from utils.admission import AdmissionControl, AdmissionMiddleware, Limiter
+from utils.cache import ResponseCache, ResponseCacheMiddleware
+from utils.logger import logger
+from utils.metrics import MetricsMiddleware, instrument_engine, registry
+from utils.prefix_index import suggest_index
+from utils.single_flight import read_flights
+from utils.snapshot import Row, catalog_snapshot
+
+response_cache = ResponseCache(max_bytes=settings.RESPONSE_CACHE_MAX_BYTES)
+
+for async_engine in (*read_engines, *write_engines):
+    instrument_engine(async_engine.sync_engine, slow_query_seconds=settings.SLOW_QUERY_SECONDS)
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    """Upgrade the databases and build in-memory indexes on startup, close database connections on shutdown."""
+    for database_url in settings.SHARD_URLS or [settings.DATABASE_URL]:
+        applied = await asyncio.to_thread(upgrade, database_url)
+        if applied:
+            logger.info("Database upgraded.", extra={"database_url": database_url, "steps": applied})
+    await refresh_suggest_index()
+    logger.info("Suggest index built.", extra={"books": len(suggest_index)})
+    refresher = asyncio.get_running_loop().create_task(refresh_suggest_index_every(settings.SUGGEST_REFRESH_INTERVAL))
+    if catalog_snapshot.enabled:
+        await catalog_snapshot.rebuild()
+    yield
+    refresher.cancel()
+    with suppress(asyncio.CancelledError):
+        await refresher
+    await catalog_snapshot.wait()
+    for async_engine in (*read_engines, *write_engines):
+        await async_engine.dispose()
+
+
+async def catalog_version() -> int:
+    """Return the current catalog version."""
+    async with ReadSessionLocal() as db:
+        return await db_get_version(db)
+
+
+async def load_suggestions() -> Tuple[int, List[Tuple[int, str, str, str]]]:
+    """Return the catalog version and the (id, title, author, genre) rows of all books, read in one transaction."""
+    async with ReadSessionLocal() as db:
+        return await db_get_version(db), [book async for book in db_iter_books(db)]
+
+
+async def refresh_suggest_index() -> None:
+    """Rebuild the suggest index unless it is at the current catalog version, see PrefixIndex.refresh."""
+    await suggest_index.refresh(await catalog_version(), load_suggestions)
+
+
+async def refresh_suggest_index_every(interval: float) -> None:
+    """Refresh the suggest index every interval seconds, so that suggestions follow other processes without reading the database."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await refresh_suggest_index()
+        except SQLAlchemyError:
+            logger.exception("Suggest index refresh failed.")
 
-app = FastAPI()
+
+async def load_catalog() -> Tuple[int, List[Row]]:
+    """
+    Return the catalog version and all books as censored rows ordered by ID, for the catalog snapshot.
+
+    The version is read first: a write committed meanwhile leaves the snapshot behind the catalog version, so it is rebuilt.
+    """
+    async with ReadSessionLocal() as db:
+        version = await db_get_version(db)
+        rows = [row async for batch in db_iter_censored(db, batch_size=settings.EXPORT_BATCH_SIZE) for row in batch]
+    return version, rows
+
+
+catalog_snapshot.configure(settings.CATALOG_SNAPSHOT_PATH, get_version=catalog_version, load=load_catalog, min_interval=settings.CATALOG_SNAPSHOT_MIN_INTERVAL)
+
+
+def route_class(method: str, path: str) -> Optional[str]:
+    """Return the admission class of a request to the books API; suggestions, served from memory, have none."""
+    path = path.rstrip("/")
+    if not path.startswith("/api/v1/books") or path.endswith("/suggest"):
+        return None
+    if method not in {"GET", "HEAD"}:
+        return "write"
+    return "search" if path.endswith("/search") else "read"
+
+
+admission = AdmissionControl(
+    {name: Limiter(limit.concurrency, limit.queue, limit.timeout) for name, limit in settings.ADMISSION_LIMITS.items()},
+    route_class=route_class,
+    retry_after=settings.ADMISSION_RETRY_AFTER,
+)
+
+app = FastAPI(lifespan=lifespan)
 app.include_router(api_router, prefix="/api")
+app.add_middleware(ResponseCacheMiddleware, cache=response_cache, get_version=catalog_version, paths=["/api/v1/books", "/api/v1/books/search", "/api/v1/books/filter", "/api/v1/books/stats"])
+# Outside the cache, which reads the catalog version: shed requests never wait for a database connection.
+app.add_middleware(AdmissionMiddleware, admission=admission)
+app.add_middleware(MetricsMiddleware)
 add_pagination(app)
+registry.collectors.append(response_cache.render_metrics)
+registry.collectors.append(catalog_snapshot.render_metrics)
+registry.collectors.append(read_flights.render_metrics)
+registry.collectors.append(admission.render_metrics)
 
 disable_installed_extensions_check()
 
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics() -> PlainTextResponse:
+    """Endpoint to expose metrics of this process in Prometheus text format."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run(app, host="127.0.0.1", port=8081, log_config=log_config)
+    # Logging is already configured behind a queue by utils.logger.
+    uvicorn.run("main:app", host="127.0.0.1", port=8081, workers=settings.WORKERS, log_config=None)
@@ -0,0 +1,95 @@
+"""
+Administration commands.
+
+Usage:
+    python manage.py import books.csv [more.ndjson ...] [--chunk-size 10000] [--rebuild-indexes] [--fast]
+    python manage.py explain [--verbose]
+    python manage.py migrate
+"""
+
+import argparse
+import sys
+from itertools import chain
+from pathlib import Path
+
+from sqlalchemy.exc import IntegrityError
+
+from config import Settings
+from database.bulk_import import import_books, import_sharded_books, iter_rows
+from database.migrations import upgrade
+from database.query_audit import audit
+
+
+def import_command(args: argparse.Namespace, settings: Settings) -> int:
+    """Import books from CSV/NDJSON files into settings.DATABASE_URL, or the shards of settings.SHARD_URLS, and report the throughput."""
+    rows = chain.from_iterable(iter_rows(path, args.format) for path in args.files)
+    try:
+        if settings.SHARD_URLS:
+            stats = import_sharded_books(settings.SHARD_URLS, rows, chunk_size=args.chunk_size, rebuild_indexes=args.rebuild_indexes, fast=args.fast)
+        else:
+            stats = import_books(settings.DATABASE_URL, rows, chunk_size=args.chunk_size, rebuild_indexes=args.rebuild_indexes, fast=args.fast)
+    except (ValueError, TypeError) as error:
+        print(f"Import failed, nothing was imported: {error!s}", file=sys.stderr)  # noqa: T201
+        return 1
+    except IntegrityError as error:
+        # A duplicate explicit id, reported without the statement and its parameters.
+        print(f"Import failed, nothing was imported: {error.orig!s}", file=sys.stderr)  # noqa: T201
+        return 1
+    print(f"Imported {stats.rows} books in {stats.seconds:.2f}s ({stats.rows_per_second:,.0f} rows/s).")  # noqa: T201
+    return 0
+
+
+def explain_command(args: argparse.Namespace, settings: Settings) -> int:
+    """Print the query plans of the CRUD statements on settings.DATABASE_URL, fail on unexpected full scans."""
+    plans = audit(settings.DATABASE_URL)
+    flagged = [plan for plan in plans if plan.flagged]
+
+    for plan in plans:
+        if not (args.verbose or plan.flagged):
+            continue
+        marker = "FULL SCAN" if plan.flagged else ("expected scan" if plan.full_scans else "ok")
+        print(f"[{marker}] {plan.function}: {plan.statement}")  # noqa: T201
+        for line in plan.plan:
+            print(f"    {line}")  # noqa: T201
+
+    print(f"{len(plans)} statements explained, {len(flagged)} with unexpected full scans.")  # noqa: T201
+    return 1 if flagged else 0
+
+
+def migrate_command(_: argparse.Namespace, settings: Settings) -> int:
+    """Upgrade settings.DATABASE_URL, or every shard of settings.SHARD_URLS, to the current schema."""
+    for database_url in settings.SHARD_URLS or [settings.DATABASE_URL]:
+        applied = upgrade(database_url)
+        for step in applied:
+            print(f"{database_url}: {step}")  # noqa: T201
+        print(f"{database_url}: {len(applied)} steps applied.")  # noqa: T201
+    return 0
+
+
+def main() -> int:
+    """Parse the command line and run the command, return its exit code."""
+    settings = Settings()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="import books from CSV or NDJSON files")
+    import_parser.add_argument("files", nargs="+", type=Path, help="CSV files with a header line or NDJSON files")
+    import_parser.add_argument("--format", choices=["csv", "ndjson"], help="file format, by extension (.csv or anything else as NDJSON) by default")
+    import_parser.add_argument("--chunk-size", type=int, default=settings.IMPORT_CHUNK_SIZE, help="rows per executemany call")
+    import_parser.add_argument("--rebuild-indexes", action="store_true", help="drop secondary indexes and triggers for the load, rebuild them after")
+    import_parser.add_argument("--fast", action="store_true", help="relax durability pragmas for the load")
+    import_parser.set_defaults(handler=import_command)
+
+    explain_parser = commands.add_parser("explain", help="run EXPLAIN QUERY PLAN on every CRUD statement and flag full scans")
+    explain_parser.add_argument("--verbose", action="store_true", help="print the plans of all statements, not only flagged ones")
+    explain_parser.set_defaults(handler=explain_command)
+
+    migrate_parser = commands.add_parser("migrate", help="upgrade the database to the current schema, idempotent")
+    migrate_parser.set_defaults(handler=migrate_command)
+
+    args = parser.parse_args()
+    return args.handler(args, settings)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
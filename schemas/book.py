@@ -1,4 +1,4 @@
-from typing import List
+from typing import Dict, List
 
 from pydantic import BaseModel, root_validator
 
@@ -36,3 +36,53 @@ class BooksWithGenres(BaseModel):
     books: List[CensoredBook]
     genre: str
     count: int
+
+
+class BookSuggestion(BaseModel):
+    """Pydantic model for title/author autocomplete suggestion."""
+
+    id: int
+    title: str
+    author: str
+
+
+class BulkAccepted(BaseModel):
+    """Pydantic model for a row of a bulk upload that was added."""
+
+    row: int
+    id: int
+
+
+class BulkRejected(BaseModel):
+    """Pydantic model for a row of a bulk upload that was rejected."""
+
+    row: int
+    reason: str
+
+
+class BulkCreateResult(BaseModel):
+    """Pydantic model for the outcome of a bulk upload, rows are numbered from 0."""
+
+    accepted: List[BulkAccepted] = []
+    rejected: List[BulkRejected] = []
+
+
+class BulkDeleteRejected(BaseModel):
+    """Pydantic model for a book of a bulk delete that was not deleted."""
+
+    id: int
+    reason: str
+
+
+class BulkDeleteResult(BaseModel):
+    """Pydantic model for the outcome of a bulk delete, per book ID."""
+
+    deleted: List[int] = []
+    rejected: List[BulkDeleteRejected] = []
+
+
+class CatalogStats(BaseModel):
+    """Pydantic model for the histograms of the catalog: books per genre and per decade, keyed by its first year."""
+
+    genres: Dict[str, int]
+    decades: Dict[int, int]
@@ -21,7 +21,9 @@ def db_session() -> Generator[Session, None, None]:
     from sqlalchemy.orm import sessionmaker
 
     from config import Settings
+    from main import response_cache
     from models.book import Base
+    from utils.prefix_index import suggest_index
 
     settings = Settings()
     # Database setup
@@ -31,6 +33,8 @@ def db_session() -> Generator[Session, None, None]:
     transaction = connection.begin()
     Base.metadata.drop_all(bind=engine)
     Base.metadata.create_all(bind=engine)
+    suggest_index.clear()
+    response_cache.clear()
 
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     session = SessionLocal()
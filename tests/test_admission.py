@@ -0,0 +1,97 @@
+import asyncio
+from collections.abc import Generator
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+from sqlalchemy import event
+
+from config import RouteLimit, Settings
+from utils.admission import AdmissionRejectedError, Limiter
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    """Fixture to run the tests on asyncio only."""
+    return "asyncio"
+
+
+@pytest.fixture
+def saturated_reads() -> Generator[None, None, None]:
+    """Fixture to make read requests of the app find no slot and no room in the queue."""
+    from main import admission
+
+    limiters = admission.limiters
+    admission.limiters = {**limiters, "read": Limiter(concurrency=0, queue_size=0, timeout=0)}
+    yield
+    admission.limiters = limiters
+
+
+@pytest.mark.anyio
+async def test_limiter() -> None:
+    """Test that requests beyond the limit queue in order, and are rejected once the queue is full or their wait is over."""
+    # Arrange
+    limiter = Limiter(concurrency=1, queue_size=2, timeout=0.05)
+    order = []
+
+    async def request(name: str) -> None:
+        await limiter.acquire()
+        order.append(name)
+
+    # Act
+    await limiter.acquire()
+    queued = [asyncio.ensure_future(request(name)) for name in ("first", "second")]
+    await asyncio.sleep(0)
+    with pytest.raises(AdmissionRejectedError) as queue_full:
+        await limiter.acquire()
+    depth = limiter.queued
+    limiter.release()
+    await queued[0]
+    limiter.release()
+    await queued[1]
+    with pytest.raises(AdmissionRejectedError) as timeout:
+        await limiter.acquire()
+
+    # Assert
+    assert queue_full.value.reason == "queue_full"
+    assert depth == 2  # noqa: PLR2004
+    assert order == ["first", "second"]
+    assert timeout.value.reason == "timeout"
+    assert (limiter.active, limiter.queued) == (1, 0)
+
+
+def test_overloaded_reads_are_shed(test_app: TestClient, saturated_reads: None) -> None:  # noqa: ARG001
+    """Test that requests beyond the limits of their class get 503 with Retry-After, other classes are served."""
+    # Arrange
+    from database.config import read_engine
+
+    statements = []
+
+    def record(*args: object) -> None:
+        statements.append(args[2])
+
+    # Act
+    event.listen(read_engine.sync_engine, "before_cursor_execute", record)
+    rejected = test_app.get("/api/v1/books/")
+    event.remove(read_engine.sync_engine, "before_cursor_execute", record)
+    suggested = test_app.get("/api/v1/books/suggest?prefix=a")
+    metrics = test_app.get("/metrics").text
+
+    # Assert
+    assert rejected.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert rejected.headers["retry-after"] == "1"
+    assert rejected.json() == {"reason": "The server is overloaded, retry later."}
+    assert statements == []
+    assert suggested.status_code == status.HTTP_200_OK
+    assert 'admission_requests_total{result="queue_full",route_class="read"}' in metrics
+    assert 'admission_queue_depth{route_class="read"} 0' in metrics
+
+
+def test_read_limits_fit_the_read_pool() -> None:
+    """Test that settings admitting more reads and searches than the read pool has connections are rejected."""
+    limits = {"read": RouteLimit(concurrency=6, queue=0, timeout=0), "search": RouteLimit(concurrency=2, queue=0, timeout=0)}
+
+    assert Settings(ADMISSION_LIMITS=limits, DB_READ_POOL_SIZE=8).DB_READ_POOL_SIZE == 8  # noqa: PLR2004
+    with pytest.raises(ValidationError, match="DB_READ_POOL_SIZE"):
+        Settings(ADMISSION_LIMITS=limits, DB_READ_POOL_SIZE=4)
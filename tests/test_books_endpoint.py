@@ -1,9 +1,13 @@
 import json
 
+import pytest
 from fastapi import status
 from fastapi.testclient import TestClient
 
+from config import Settings
+from database.bulk_import import import_books
 from schemas.book import BookGet, BooksWithGenres
+from utils.pagination import encode_keyset
 
 
 def test_create_book(test_app: TestClient) -> None:
@@ -90,6 +94,89 @@ def test_get_all_books(test_app: TestClient) -> None:
     assert response[1].books[0].title == "Fifty Shades of Grey 4"
 
 
+def test_get_all_books_paginated_by_genre(test_app: TestClient) -> None:
+    """Test that get books endpoint paginates genres and keeps the full count of each genre."""
+    # Arrange
+    for genre in ("drama", "drama", "comedy", "fantasy"):
+        book = {
+            "title": "Fifty Shades of Grey 4",
+            "author": "E.L. James",
+            "publication_year": 1599,
+            "genre": genre,
+        }
+        test_app.post("/api/v1/books", json=book)
+
+    # Act
+    response = test_app.get("/api/v1/books?page=2&size=1")
+    assert response.status_code == status.HTTP_200_OK
+
+    response = json.loads(response.content)
+    items = [BooksWithGenres(**item) for item in response.get("items")]
+
+    # Assert
+    assert response.get("total") == 3
+    assert response.get("pages") == 3
+    assert len(items) == 1
+
+    assert items[0].genre == "drama"
+    assert items[0].count == 2
+    assert len(items[0].books) == 2
+
+
+def test_get_all_books_not_modified(test_app: TestClient) -> None:
+    """Test that get books endpoint answers 304 to a matching ETag until the catalog changes."""
+    # Arrange
+    book = {
+        "title": "Fifty Shades of Grey 4",
+        "author": "E.L. James",
+        "publication_year": 1599,
+        "genre": "drama",
+    }
+    test_app.post("/api/v1/books", json=book)
+    etag = test_app.get("/api/v1/books?size=10").headers["etag"]
+
+    # Act
+    not_modified = test_app.get("/api/v1/books?size=10", headers={"If-None-Match": etag})
+    other_query = test_app.get("/api/v1/books?size=20", headers={"If-None-Match": etag})
+    test_app.post("/api/v1/books", json=book)
+    modified = test_app.get("/api/v1/books?size=10", headers={"If-None-Match": etag})
+
+    # Assert
+    assert not_modified.status_code == status.HTTP_304_NOT_MODIFIED
+    assert other_query.status_code == status.HTTP_200_OK
+    assert modified.status_code == status.HTTP_200_OK
+    assert modified.headers["etag"] != etag
+    assert json.loads(modified.content).get("items")[0]["count"] == 2
+
+
+def test_get_all_books_if_none_match_any(test_app: TestClient) -> None:
+    """Test that get books endpoint answers 304 to If-None-Match: * only when the list exists."""
+    # Arrange
+    book = {
+        "title": "Fifty Shades of Grey 4",
+        "author": "E.L. James",
+        "publication_year": 1599,
+        "genre": "drama",
+    }
+    headers = {"If-None-Match": "*"}
+
+    # Act
+    missing = test_app.get("/api/v1/books?size=10", headers=headers)
+    test_app.post("/api/v1/books", json=book)
+    rendered = test_app.get("/api/v1/books?size=10", headers=headers)
+    cached = test_app.get("/api/v1/books?size=10", headers=headers)
+    response = test_app.get("/api/v1/books?size=10")
+
+    # Assert
+    assert missing.status_code == status.HTTP_404_NOT_FOUND
+    assert rendered.status_code == status.HTTP_304_NOT_MODIFIED
+    assert rendered.content == b""
+    assert cached.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["etag"] == rendered.headers["etag"] == cached.headers["etag"]
+    assert json.loads(response.content).get("items")[0]["count"] == 1
+
+
 def test_get_all_books_no_books(test_app: TestClient) -> None:
     """Test get books endpoint when no books exist."""
     # Act
@@ -167,6 +254,29 @@ def test_update_books_only_one_exists(test_app: TestClient) -> None:
     assert response.text == '{"reason":"Not all books found. Update is allowed only for existing books."}'
 
 
+def test_update_books_is_atomic(test_app: TestClient) -> None:
+    """Test that update books endpoint changes nothing when one of the books does not exist."""
+    # Arrange
+    book_1 = {
+        "title": "Fifty Shades of Grey 4",
+        "author": "E.L. James",
+        "publication_year": 1599,
+        "genre": "drama",
+    }
+    test_app.post("/api/v1/books", json=book_1)
+    book_2 = dict(book_1, id=2, title="NEW")
+    book_1 = dict(book_1, id=1, title="NEW")
+
+    # Act
+    response = test_app.put("/api/v1/books", json=[book_1, book_2])
+
+    # Assert
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    response = test_app.get("/api/v1/books/search?title=fifty")
+    assert response.status_code == status.HTTP_200_OK
+
+
 def test_delete_book(test_app: TestClient) -> None:
     """Test delete book endpoint when the book is not the last book of a genre."""
     # Arrange
@@ -218,6 +328,30 @@ def test_delete_last_genre_book(test_app: TestClient) -> None:
     assert response.text == '{"reason":"Cannnot delete the last book from the genre 18+."}'
 
 
+def test_delete_last_genre_book_after_genre_update(test_app: TestClient) -> None:
+    """Test that genre counts follow updated genres when deleting the last book of a genre."""
+    # Arrange
+    book = {
+        "title": "Fifty Shades of Grey 4",
+        "author": "E.L. James",
+        "publication_year": 1599,
+        "genre": "18+",
+    }
+    test_app.post("/api/v1/books", json=book)
+    test_app.post("/api/v1/books", json=book)
+    test_app.put("/api/v1/books", json=[dict(book, id=2, genre="drama")])
+
+    # Act
+    response = test_app.delete("/api/v1/books/1")
+
+    # Assert
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    response = json.loads(test_app.get("/api/v1/books").content)
+    response = [BooksWithGenres(**item) for item in response.get("items")]
+    assert [(item.genre, item.count) for item in response] == [("18+", 1), ("drama", 1)]
+
+
 def test_delete_book_does_not_exist(test_app: TestClient) -> None:
     """Test delete book endpoint when book does not exist."""
     # Act
@@ -228,6 +362,28 @@ def test_delete_book_does_not_exist(test_app: TestClient) -> None:
     assert response.text == '{"reason":"Book with ID 1 not found."}'
 
 
+def test_delete_books_bulk(test_app: TestClient) -> None:
+    """Test bulk delete endpoint reports per-ID outcomes and keeps the last requested book of an emptied genre."""
+    # Arrange
+    for title, genre in (("Dune", "Fantasy"), ("It", "Horror 2"), ("Carrie", "Horror 2"), ("Emma", "Drama"), ("Persuasion", "Drama")):
+        test_app.post("/api/v1/books", json={"title": title, "author": "Author", "publication_year": 1965, "genre": genre})
+
+    # Act
+    response = test_app.request("DELETE", "/api/v1/books", json=[2, 3, 4, 42, 2])
+
+    # Assert
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {
+        "deleted": [2, 4],
+        "rejected": [
+            {"id": 3, "reason": "Cannnot delete the last book from the genre Horror 2."},
+            {"id": 42, "reason": "Book with ID 42 not found."},
+        ],
+    }
+    response = test_app.get("/api/v1/books")
+    assert {group["genre"]: group["count"] for group in response.json()["items"]} == {"Drama": 1, "Fantasy": 1, "Horror 2": 1}
+
+
 def test_search_two_books_author(test_app: TestClient) -> None:
     """Test that search book endpoint returns 2 books when searched by author."""
     # Arrange
@@ -347,3 +503,380 @@ def test_search_no_author_and_title(test_app: TestClient) -> None:
     response = test_app.get("/api/v1/books/search")
     assert response.status_code == status.HTTP_400_BAD_REQUEST
     assert response.text == '{"reason":"At least one of parameters title or author is required."}'
+
+
+def test_get_all_books_cursor_pagination(test_app: TestClient) -> None:
+    """Test that get books endpoint in cursor mode walks all books by (genre, id) keyset."""
+    # Arrange
+    for genre in ("drama", "comedy", "drama"):
+        book = {
+            "title": "Fifty Shades of Grey 4",
+            "author": "E.L. James",
+            "publication_year": 1599,
+            "genre": genre,
+        }
+        test_app.post("/api/v1/books", json=book)
+
+    # Act
+    first = json.loads(test_app.get("/api/v1/books?pagination=cursor&size=2").content)
+    second = json.loads(test_app.get(f"/api/v1/books?cursor={first.get('next_page')}&size=2").content)
+
+    # Assert
+    first_items = [BooksWithGenres(**item) for item in first.get("items")]
+    assert [item.genre for item in first_items] == ["comedy", "drama"]
+    assert [book.id for book in first_items[1].books] == [1]
+    assert first_items[1].count == 2
+
+    second_items = [BooksWithGenres(**item) for item in second.get("items")]
+    assert [book.id for book in second_items[0].books] == [3]
+    assert second_items[0].count == 2
+    assert second.get("next_page") is None
+
+
+@pytest.mark.parametrize(
+    ("url", "params", "cursor"),
+    [
+        ("/api/v1/books", {}, "bm90LWEta2V5c2V0"),
+        ("/api/v1/books", {}, encode_keyset("x", {"a": 1})),
+        ("/api/v1/books", {}, encode_keyset([1], 2)),
+        ("/api/v1/books", {}, encode_keyset("x", True)),  # noqa: FBT003
+        ("/api/v1/books/search", {"title": "grey"}, encode_keyset({"a": 1})),
+        ("/api/v1/books/search", {"title": "grey"}, encode_keyset("1")),
+        ("/api/v1/books/filter", {}, encode_keyset({"a": 1})),
+        ("/api/v1/books/filter", {"sort": "publication_year"}, encode_keyset("1965", 1)),
+        ("/api/v1/books/filter", {"sort": "publication_year"}, encode_keyset(1965)),
+    ],
+)
+def test_invalid_cursor(test_app: TestClient, url: str, params: dict, cursor: str) -> None:
+    """Test that paginated endpoints reject a malformed cursor, or one with values of the wrong type."""
+    # Arrange
+    test_app.post("/api/v1/books", json={"title": "Grey", "author": "E.L. James", "publication_year": 1599, "genre": "drama"})
+
+    # Act
+    response = test_app.get(url, params={**params, "cursor": cursor})
+
+    # Assert
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json() == {"detail": "Invalid cursor value"}
+
+
+def test_search_cursor_pagination(test_app: TestClient) -> None:
+    """Test that search book endpoint in cursor mode walks results by ID."""
+    # Arrange
+    for title in ("Fifty Shades of Grey 4", "Forty Shades of Grey 7", "Thirty Shades of Grey 1"):
+        book = {
+            "title": title,
+            "author": "E.L. James",
+            "publication_year": 1599,
+            "genre": "drama",
+        }
+        test_app.post("/api/v1/books", json=book)
+
+    # Act
+    first = json.loads(test_app.get("/api/v1/books/search?author=james&pagination=cursor&size=2").content)
+    second = json.loads(test_app.get(f"/api/v1/books/search?author=james&cursor={first.get('next_page')}&size=2").content)
+
+    # Assert
+    assert [BookGet(**item).id for item in first.get("items")] == [1, 2]
+    assert [BookGet(**item).id for item in second.get("items")] == [3]
+    assert second.get("next_page") is None
+
+
+def test_search_fulltext_prefix(test_app: TestClient) -> None:
+    """Test that search book endpoint in fulltext mode matches word prefixes and skips genre '18+'."""
+    # Arrange
+    for title, genre in (("Fifty Shades of Grey 4", "drama"), ("Forty Shades of Grey 7", "drama"), ("Forty Shades of Grey 8", "18+")):
+        book = {
+            "title": title,
+            "author": "E.L. James",
+            "publication_year": 1599,
+            "genre": genre,
+        }
+        test_app.post("/api/v1/books", json=book)
+
+    # Act
+    response = test_app.get("/api/v1/books/search?title=for shad&author=jam&mode=fulltext")
+
+    # Assert
+    assert response.status_code == status.HTTP_200_OK
+
+    response = json.loads(response.content)
+    response = [BookGet(**item) for item in response.get("items")]
+    assert len(response) == 1
+    assert response[0].title == "Forty Shades of Grey 7"
+
+
+def test_search_fulltext_follows_updates(test_app: TestClient) -> None:
+    """Test that the fulltext index is kept in sync with updated books."""
+    # Arrange
+    book = {
+        "title": "Fifty Shades of Grey 4",
+        "author": "E.L. James",
+        "publication_year": 1599,
+        "genre": "drama",
+    }
+    test_app.post("/api/v1/books", json=book)
+    book["id"] = 1
+    book["title"] = "Blue Lagoon"
+    test_app.put("/api/v1/books", json=[book])
+
+    # Act
+    old_title = test_app.get("/api/v1/books/search?title=fifty&mode=fulltext")
+    new_title = test_app.get("/api/v1/books/search?title=lagoon&mode=fulltext")
+
+    # Assert
+    assert old_title.status_code == status.HTTP_404_NOT_FOUND
+    assert new_title.status_code == status.HTTP_200_OK
+
+
+def test_suggest_books(test_app: TestClient) -> None:
+    """Test that suggest endpoint matches title and author prefixes and skips genre '18+'."""
+    # Arrange
+    for title, author, genre in (
+        ("Fifty Shades of Grey 4", "E.L. James", "drama"),
+        ("Forty Shades of Grey 7", "Émile Zola", "drama"),
+        ("Fifty Shades of Grey 5", "E.L. James", "18+"),
+    ):
+        book = {
+            "title": title,
+            "author": author,
+            "publication_year": 1599,
+            "genre": genre,
+        }
+        test_app.post("/api/v1/books", json=book)
+
+    # Act
+    by_title = test_app.get("/api/v1/books/suggest?prefix=fif")
+    by_author = test_app.get("/api/v1/books/suggest?prefix=emile")
+
+    # Assert
+    assert by_title.status_code == status.HTTP_200_OK
+    assert [item["title"] for item in json.loads(by_title.content)] == ["Fifty Shades of Grey 4"]
+    assert [item["id"] for item in json.loads(by_author.content)] == [2]
+
+
+def test_suggest_books_follows_updates_and_deletes(test_app: TestClient) -> None:
+    """Test that suggest endpoint reflects updated and deleted books."""
+    # Arrange
+    for title in ("Fifty Shades of Grey 4", "Fifty Shades of Grey 5"):
+        book = {
+            "title": title,
+            "author": "E.L. James",
+            "publication_year": 1599,
+            "genre": "drama",
+        }
+        test_app.post("/api/v1/books", json=book)
+    book["id"] = 2
+    book["title"] = "Blue Lagoon"
+    test_app.put("/api/v1/books", json=[book])
+    test_app.delete("/api/v1/books/1")
+
+    # Act
+    old_titles = test_app.get("/api/v1/books/suggest?prefix=fifty")
+    new_title = test_app.get("/api/v1/books/suggest?prefix=blue")
+
+    # Assert
+    assert json.loads(old_titles.content) == []
+    assert [item["id"] for item in json.loads(new_title.content)] == [2]
+
+
+def test_suggest_books_follows_other_writers(test_app: TestClient) -> None:
+    """Test that suggest endpoint reflects books written by other processes, such as imports, once the index is refreshed."""
+    # Arrange
+    from main import refresh_suggest_index
+
+    book = {"title": "Fifty Shades of Grey 4", "author": "E.L. James", "publication_year": 1599, "genre": "drama"}
+    test_app.post("/api/v1/books", json=book)
+    import_books(Settings().DATABASE_URL, [(None, "Fifty Shades Darker", "E.L. James", 2012, "drama")], chunk_size=1)
+    before = test_app.get("/api/v1/books/suggest?prefix=fif")
+
+    # Act
+    test_app.portal.call(refresh_suggest_index)
+    after = test_app.get("/api/v1/books/suggest?prefix=fif")
+
+    # Assert
+    assert [item["id"] for item in json.loads(before.content)] == [1]
+    assert [item["title"] for item in json.loads(after.content)] == ["Fifty Shades Darker", "Fifty Shades of Grey 4"]
+
+
+def test_create_books_bulk_ndjson(test_app: TestClient) -> None:
+    """Test that bulk create endpoint adds valid NDJSON rows and reports rejected ones."""
+    # Arrange
+    rows = [
+        {"title": "Fifty Shades of Grey 4", "author": "E.L. James", "publication_year": 1599, "genre": "drama"},
+        {"title": "The Shining", "author": "Stephen King", "publication_year": 1977, "genre": "Horror"},
+        {"title": "No author", "publication_year": 1599, "genre": "drama"},
+        {"title": "Forty Shades of Grey 7", "author": "E.L. James", "publication_year": 1599, "genre": "drama"},
+    ]
+    body = "\n".join(json.dumps(row) for row in rows) + "\nnot json\n"
+
+    # Act
+    response = test_app.post("/api/v1/books/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+
+    # Assert
+    assert response.status_code == status.HTTP_200_OK
+
+    response = json.loads(response.content)
+    assert response.get("accepted") == [{"row": 0, "id": 1}, {"row": 3, "id": 2}]
+    assert [item["row"] for item in response.get("rejected")] == [1, 2, 4]
+    assert response.get("rejected")[0]["reason"] == "Books with genre Horror cannot be added."
+
+    response = json.loads(test_app.get("/api/v1/books").content)
+    assert response.get("items")[0]["count"] == 2
+
+
+def test_create_books_bulk_json_array(test_app: TestClient) -> None:
+    """Test that bulk create endpoint accepts a JSON array."""
+    # Arrange
+    rows = [
+        {"title": "Fifty Shades of Grey 4", "author": "E.L. James", "publication_year": 1599, "genre": "drama"},
+        {"title": "Forty Shades of Grey 7", "author": "E.L. James", "publication_year": 1599, "genre": "18+"},
+    ]
+
+    # Act
+    response = test_app.post("/api/v1/books/bulk", json=rows)
+
+    # Assert
+    assert response.status_code == status.HTTP_200_OK
+
+    response = json.loads(response.content)
+    assert [item["id"] for item in response.get("accepted")] == [1, 2]
+    assert response.get("rejected") == []
+
+
+def test_create_books_bulk_ids(test_app: TestClient) -> None:
+    """Test that bulk create endpoint assigns IDs after the highest ID, each to the book of its row."""
+    # Arrange
+    book = {"title": "Fifty Shades of Grey 4", "author": "E.L. James", "publication_year": 1599, "genre": "drama"}
+    for _ in range(2):
+        test_app.post("/api/v1/books", json=book)
+    test_app.delete("/api/v1/books/1")
+    rows = [{**book, "title": f"Fifty Shades of Grey {number}"} for number in (5, 6, 7)]
+
+    # Act
+    response = test_app.post("/api/v1/books/bulk", json=rows)
+
+    # Assert
+    assert [item["id"] for item in json.loads(response.content).get("accepted")] == [3, 4, 5]
+
+    response = test_app.get("/api/v1/books/export?format=ndjson")
+    assert [(item["id"], item["title"]) for item in map(json.loads, response.text.splitlines())] == [
+        (2, "Fifty Shades of Grey 4"),
+        (3, "Fifty Shades of Grey 5"),
+        (4, "Fifty Shades of Grey 6"),
+        (5, "Fifty Shades of Grey 7"),
+    ]
+
+
+def test_export_books_ndjson(test_app: TestClient) -> None:
+    """Test that export endpoint streams all books as NDJSON with censored titles for genre '18+'."""
+    # Arrange
+    for genre in ("drama", "18+"):
+        book = {
+            "title": "Fifty Shades of Grey 4",
+            "author": "E.L. James",
+            "publication_year": 1599,
+            "genre": genre,
+        }
+        test_app.post("/api/v1/books", json=book)
+
+    # Act
+    response = test_app.get("/api/v1/books/export?format=ndjson")
+
+    # Assert
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+
+    response = [BookGet(**json.loads(line)) for line in response.text.splitlines()]
+    assert [book.id for book in response] == [1, 2]
+    assert [book.title for book in response] == ["Fifty Shades of Grey 4", "CENSORED"]
+
+
+def test_export_books_csv(test_app: TestClient) -> None:
+    """Test that export endpoint streams all books as CSV with a header line."""
+    # Arrange
+    book = {
+        "title": "Fifty Shades of Grey, 4",
+        "author": "E.L. James",
+        "publication_year": 1599,
+        "genre": "drama",
+    }
+    test_app.post("/api/v1/books", json=book)
+
+    # Act
+    response = test_app.get("/api/v1/books/export?format=csv")
+
+    # Assert
+    assert response.status_code == status.HTTP_200_OK
+    assert response.text == 'id,title,author,publication_year,genre\n1,"Fifty Shades of Grey, 4",E.L. James,1599,drama\n'
+
+
+def test_sparse_fieldsets(test_app: TestClient) -> None:
+    """Test that list, search and export endpoints return the requested fields of books only."""
+    # Arrange
+    for title, genre in (("Dune", "Sci-Fi"), ("Dune Messiah", "Sci-Fi"), ("Emma", "Romance")):
+        test_app.post("/api/v1/books", json={"title": title, "author": "Author", "publication_year": 1965, "genre": genre})
+
+    # Act
+    books = test_app.get("/api/v1/books/?fields=title")
+    first_page = test_app.get("/api/v1/books/?pagination=cursor&size=1&fields=author, title")
+    next_page = test_app.get(f"/api/v1/books/?size=1&fields=title&cursor={first_page.json()['next_page']}")
+    search = test_app.get("/api/v1/books/search?title=dune&size=1&fields=id,title")
+    search_cursor = test_app.get("/api/v1/books/search?title=dune&pagination=cursor&fields=publication_year")
+    export = test_app.get("/api/v1/books/export?format=csv&fields=genre,title")
+    invalid = test_app.get("/api/v1/books/?fields=title,isbn")
+
+    # Assert
+    assert [group["books"] for group in books.json()["items"]] == [[{"title": "Emma"}], [{"title": "Dune"}, {"title": "Dune Messiah"}]]
+    assert first_page.json()["items"][0]["books"] == [{"title": "Emma", "author": "Author"}]
+    assert next_page.json()["items"][0]["books"] == [{"title": "Dune"}]
+    assert search.json() == {"items": [{"id": 1, "title": "Dune"}], "total": 2, "page": 1, "size": 1, "pages": 2}
+    assert search_cursor.json()["items"] == [{"publication_year": 1965}, {"publication_year": 1965}]
+    assert export.text == "title,genre\nDune,Sci-Fi\nDune Messiah,Sci-Fi\nEmma,Romance\n"
+    assert invalid.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_filter_books(test_app: TestClient) -> None:
+    """Test that books are filtered by genre, author and years, sorted and paginated in both modes."""
+    # Arrange
+    books = [
+        ("Carrie", "Stephen King", 1974, "Horror Fiction"),
+        ("Secret", "Stephen King", 1982, "18+"),
+        ("It", "Stephen King", 1986, "Horror Fiction"),
+        ("Dune", "Frank Herbert", 1965, "Sci-Fi"),
+        ("Misery", "Stephen King", 1987, "Horror Fiction"),
+    ]
+    for title, author, year, genre in books:
+        test_app.post("/api/v1/books", json={"title": title, "author": author, "publication_year": year, "genre": genre})
+
+    # Act
+    by_genre = test_app.get("/api/v1/books/filter?genre=Horror Fiction&size=2")
+    by_author = test_app.get("/api/v1/books/filter?author=Stephen King&year_from=1980&year_to=1986")
+    pages = [test_app.get("/api/v1/books/filter?sort=-publication_year&pagination=cursor&size=3")]
+    pages.append(test_app.get(f"/api/v1/books/filter?sort=-publication_year&size=3&cursor={pages[0].json()['next_page']}"))
+    not_found = test_app.get("/api/v1/books/filter?genre=Poetry")
+
+    # Assert
+    assert {key: value for key, value in by_genre.json().items() if key != "items"} == {"total": 3, "page": 1, "size": 2, "pages": 2}
+    assert [book["title"] for book in by_genre.json()["items"]] == ["Carrie", "It"]
+    assert [book["title"] for book in by_author.json()["items"]] == ["CENSORED", "It"]
+    assert [[book["publication_year"] for book in page.json()["items"]] for page in pages] == [[1987, 1986, 1982], [1974, 1965]]
+    assert pages[1].json()["next_page"] is None
+    assert not_found.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_stats_follow_writes(test_app: TestClient) -> None:
+    """Test that genre and decade histograms are kept up to date by inserts, updates and deletes."""
+    # Arrange
+    for title, year, genre in (("Dune", 1965, "Sci-Fi"), ("Emma", 1815, "Romance"), ("Neuromancer", 1984, "Sci-Fi"), ("Foundation", 1951, "Sci-Fi")):
+        test_app.post("/api/v1/books", json={"title": title, "author": "Author", "publication_year": year, "genre": genre})
+    before = test_app.get("/api/v1/books/stats").json()
+
+    # Act
+    test_app.put("/api/v1/books", json=[{"id": 1, "title": "Dune", "author": "Author", "publication_year": 1969, "genre": "Classics"}])
+    test_app.delete("/api/v1/books/3")
+    after = test_app.get("/api/v1/books/stats").json()
+
+    # Assert
+    assert before == {"genres": {"Romance": 1, "Sci-Fi": 3}, "decades": {"1810": 1, "1950": 1, "1960": 1, "1980": 1}}
+    assert after == {"genres": {"Classics": 1, "Romance": 1, "Sci-Fi": 1}, "decades": {"1810": 1, "1950": 1, "1960": 1}}
@@ -0,0 +1,97 @@
+import argparse
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+import pytest
+
+from config import Settings
+from database.bulk_import import import_books, import_sharded_books, iter_rows
+from manage import import_command
+
+
+@pytest.mark.parametrize("rebuild_indexes", [False, True])
+def test_import_books(tmp_path: Path, rebuild_indexes: bool) -> None:
+    """Test that CSV and NDJSON files are imported with ids, genre and decade counts and the full-text index kept consistent."""
+    # Arrange
+    database = tmp_path / "import.db"
+    books_csv = tmp_path / "books.csv"
+    books_csv.write_text("id,title,author,publication_year,genre\n7,The Shining,Stephen King,1977,Horror\n")
+    books_ndjson = tmp_path / "books.ndjson"
+    books_ndjson.write_text('{"title": "It", "author": "Stephen King", "publication_year": 1986, "genre": "Horror"}\n\n{"title": "The Hobbit", "author": "J.R.R. Tolkien", "genre": "Fantasy"}\n')
+    rows = [*iter_rows(books_csv), *iter_rows(books_ndjson)]
+
+    # Act
+    stats = import_books(f"sqlite:///{database}", rows, chunk_size=2, rebuild_indexes=rebuild_indexes, fast=True)
+
+    # Assert
+    assert stats.rows == 3
+    with closing(sqlite3.connect(database)) as connection:
+        connection.execute("INSERT INTO books(title, author, publication_year, genre) VALUES ('Dune', 'Frank Herbert', 1965, 'Fantasy')")
+        assert connection.execute("SELECT id, title FROM books ORDER BY id").fetchall() == [(7, "The Shining"), (8, "It"), (9, "The Hobbit"), (10, "Dune")]
+        assert connection.execute("SELECT genre, count FROM genre_counts ORDER BY genre").fetchall() == [("Fantasy", 2), ("Horror", 2)]
+        assert connection.execute("SELECT decade, count FROM decade_counts ORDER BY decade").fetchall() == [(1960, 1), (1970, 1), (1980, 1)]
+        assert connection.execute("SELECT rowid FROM books_fts WHERE books_fts MATCH 'king' ORDER BY rowid").fetchall() == [(7,), (8,)]
+        assert connection.execute("SELECT version FROM catalog_version").fetchone() == (1,)
+
+
+def test_import_books_invalid_record(tmp_path: Path) -> None:
+    """Test that nothing is imported when a record is invalid."""
+    # Arrange
+    database = tmp_path / "import.db"
+    books_ndjson = tmp_path / "books.ndjson"
+    books_ndjson.write_text('{"title": "It", "author": "Stephen King"}\n{"title": "Untitled"}\n')
+
+    # Act
+    with pytest.raises(ValueError, match=r"books\.ndjson:2"):
+        import_books(f"sqlite:///{database}", iter_rows(books_ndjson), chunk_size=1, rebuild_indexes=True)
+
+    # Assert
+    with closing(sqlite3.connect(database)) as connection:
+        assert connection.execute("SELECT count(*) FROM books").fetchone() == (0,)
+        assert connection.execute("SELECT count(*) FROM sqlite_master WHERE type = 'trigger'").fetchone() == (9,)
+
+
+@pytest.mark.parametrize(
+    ("content", "reason"),
+    [
+        ('{"title": "It", "author": "Stephen King"}\n["Untitled"]\n', "books.ndjson:2: invalid record: expected an object"),
+        ('{"id": 1, "title": "It", "author": "Stephen King"}\n{"id": 1, "title": "Carrie", "author": "Stephen King"}\n', "UNIQUE constraint failed: books.id"),
+    ],
+)
+def test_import_command_failure(tmp_path: Path, capsys: pytest.CaptureFixture, content: str, reason: str) -> None:
+    """Test that the import command reports non-object records and duplicate ids, and imports nothing."""
+    # Arrange
+    database = tmp_path / "import.db"
+    books_ndjson = tmp_path / "books.ndjson"
+    books_ndjson.write_text(content)
+    args = argparse.Namespace(files=[books_ndjson], format=None, chunk_size=10, rebuild_indexes=False, fast=False)
+
+    # Act
+    code = import_command(args, Settings(DATABASE_URL=f"sqlite:///{database}", SHARD_URLS=[]))
+
+    # Assert
+    assert code == 1
+    assert reason in capsys.readouterr().err
+    with closing(sqlite3.connect(database)) as connection:
+        assert connection.execute("SELECT count(*) FROM books").fetchone() == (0,)
+
+
+def test_import_sharded_books(tmp_path: Path) -> None:
+    """Test that rows are imported into the shard of their ID, rows without one numbered after the largest ID of all shards."""
+    # Arrange
+    shards = [tmp_path / f"shard{index}.db" for index in range(3)]
+    rows = [(None, f"Book {index}", "Author", 1965, "Drama") for index in range(5)]
+    import_sharded_books([f"sqlite:///{shard}" for shard in shards], [(10, "Dune", "Frank Herbert", 1965, "Sci-Fi")], chunk_size=2)
+
+    # Act
+    stats = import_sharded_books([f"sqlite:///{shard}" for shard in shards], rows, chunk_size=2)
+
+    # Assert
+    ids = {}
+    for index, shard in enumerate(shards):
+        with closing(sqlite3.connect(shard)) as connection:
+            ids[index] = [book_id for (book_id,) in connection.execute("SELECT id FROM books ORDER BY id")]
+            assert connection.execute("SELECT version FROM catalog_version").fetchone() == (2,)
+    assert stats.rows == 5  # noqa: PLR2004
+    assert ids == {0: [12, 15], 1: [10, 13], 2: [11, 14]}
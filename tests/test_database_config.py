@@ -0,0 +1,46 @@
+from pathlib import Path
+from typing import get_args
+
+import pytest
+from pydantic import ValidationError
+from sqlalchemy import text
+
+from config import Settings
+from database.config import create_async_engines, settings
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    """Fixture to run the tests on asyncio only."""
+    return "asyncio"
+
+
+async def test_connection_pragmas(tmp_path: Path) -> None:
+    """Test that reader and writer connections report the configured pragmas, and readers are read-only."""
+    # Arrange
+    write_engine, read_engine = create_async_engines(f"sqlite:///{tmp_path / 'pragmas.db'}")
+    pragmas = "SELECT * FROM pragma_journal_mode, pragma_synchronous, pragma_query_only"
+
+    # Act
+    async with write_engine.connect() as connection:
+        written = (await connection.execute(text(pragmas))).one()
+    async with read_engine.connect() as connection:
+        read = (await connection.execute(text(pragmas))).one()
+    await write_engine.dispose()
+    await read_engine.dispose()
+
+    # Assert
+    # synchronous reads back as the position of the mode in OFF, NORMAL, FULL, EXTRA.
+    synchronous = get_args(Settings.model_fields["SQLITE_SYNCHRONOUS"].annotation).index(settings.SQLITE_SYNCHRONOUS)
+    assert tuple(written) == (settings.SQLITE_JOURNAL_MODE.lower(), synchronous, 0)
+    assert tuple(read) == (settings.SQLITE_JOURNAL_MODE.lower(), synchronous, 1)
+
+
+def test_invalid_pragma_settings() -> None:
+    """Test that unknown journal and synchronous modes are rejected when settings load."""
+    with pytest.raises(ValidationError):
+        Settings(SQLITE_JOURNAL_MODE="JOURNAL")
+    with pytest.raises(ValidationError):
+        Settings(SQLITE_SYNCHRONOUS="SOMETIMES")
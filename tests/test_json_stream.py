@@ -0,0 +1,48 @@
+from collections.abc import AsyncIterator
+from typing import List
+
+import pytest
+
+from utils.json_stream import RecordError, iter_json_records
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    """Fixture to run the tests on asyncio only."""
+    return "asyncio"
+
+
+async def stream(*chunks: bytes) -> AsyncIterator[bytes]:
+    """Yield chunks as a request body would."""
+    for chunk in chunks:
+        yield chunk
+
+
+async def decode(*chunks: bytes, max_record_size: int = 16) -> List:
+    """Return the records decoded from chunks, with errors as their messages."""
+    return [str(record) if isinstance(record, RecordError) else record async for record in iter_json_records(stream(*chunks), max_record_size)]
+
+
+async def test_too_large_ndjson_records_are_skipped() -> None:
+    """Test that too large NDJSON lines are reported one by one and the following lines are still decoded."""
+    # Arrange
+    large = b'{"title": "' + b"x" * 40 + b'"}'
+
+    # Act
+    within_chunk = await decode(b'{"id": 1}\n' + large + b'\n{"id": 2}\n')
+    across_chunks = await decode(b'{"id": 1}\n' + large[:20], large[20:30], large[30:] + b'\n{"id"', b": 2}\n" + large)
+
+    # Assert
+    assert within_chunk == [{"id": 1}, "Record is too large.", {"id": 2}]
+    assert across_chunks == [{"id": 1}, "Record is too large.", {"id": 2}, "Record is too large."]
+
+
+async def test_too_large_array_element_ends_the_stream() -> None:
+    """Test that a too large JSON array element is reported and ends the stream, which cannot be resynchronized."""
+    # Act
+    records = await decode(b'[{"id": 1}, {"title": "' + b"x" * 20, b"x" * 20 + b'"}, {"id": 2}]')
+
+    # Assert
+    assert records == [{"id": 1}, "Record is too large."]
@@ -0,0 +1,39 @@
+import logging
+
+import orjson
+
+from utils.logger import JsonFormatter, SamplingFilter, truncate
+
+
+def test_truncate() -> None:
+    """Test that structured log fields are cut to the configured number of items and characters."""
+    # Act & Assert
+    assert truncate(list(range(30)), max_length=10, max_items=3) == [0, 1, 2, "... 27 more"]
+    assert truncate("x" * 30, max_length=10, max_items=3) == "xxxxxxxxxx... (30 chars)"
+    assert truncate({"a": 1, "b": 2}, max_length=10, max_items=1) == {"a": 1, "...": "1 more"}
+
+
+def test_json_formatter() -> None:
+    """Test that a record is rendered as one JSON object with its truncated structured fields."""
+    # Arrange
+    record = logging.makeLogRecord({"name": "app", "levelno": logging.INFO, "levelname": "INFO", "msg": "Updating books.", "count": 2, "books": ["a" * 5000, "b"]})
+
+    # Act
+    entry = orjson.loads(JsonFormatter().format(record))
+
+    # Assert
+    assert entry["logger"] == "app"
+    assert entry["message"] == "Updating books."
+    assert entry["count"] == 2
+    assert entry["books"][0].endswith("... (5000 chars)")
+    assert entry["books"][1] == "b"
+
+
+def test_sampling_filter() -> None:
+    """Test that sampling drops records below WARNING only."""
+    # Arrange
+    sampling_filter = SamplingFilter(0.0)
+
+    # Act & Assert
+    assert not sampling_filter.filter(logging.makeLogRecord({"levelno": logging.INFO}))
+    assert sampling_filter.filter(logging.makeLogRecord({"levelno": logging.WARNING}))
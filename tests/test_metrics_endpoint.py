@@ -0,0 +1,51 @@
+from fastapi import status
+from fastapi.testclient import TestClient
+
+
+def test_metrics(test_app: TestClient) -> None:
+    """Test that metrics endpoint exposes request latency and SQL statements per route in Prometheus text format."""
+    # Arrange
+    book = {
+        "title": "Fifty Shades of Grey 4",
+        "author": "E.L. James",
+        "publication_year": 1599,
+        "genre": "drama",
+    }
+    test_app.post("/api/v1/books", json=book)
+
+    # Act
+    response = test_app.get("/metrics")
+
+    # Assert
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/plain")
+
+    samples = dict(line.rsplit(" ", 1) for line in response.text.splitlines() if not line.startswith("#"))
+    labels = '{method="POST",route="/api/v1/books/",status="201"}'
+    assert "# TYPE http_request_duration_seconds histogram" in response.text
+    assert int(samples[f"http_request_duration_seconds_count{labels}"]) >= 1
+    assert float(samples[f"http_request_sql_statements_sum{labels}"]) >= 1
+
+
+def test_metrics_route_of_cached_responses(test_app: TestClient) -> None:
+    """Test that responses served from the response cache are recorded under the template of their route."""
+    # Arrange
+    book = {"title": "Dune", "author": "Frank Herbert", "publication_year": 1965, "genre": "Sci-Fi"}
+    test_app.post("/api/v1/books", json=book)
+    etag = test_app.get("/api/v1/books/search?title=dune").headers["etag"]
+    before = _samples(test_app)
+
+    # Act
+    test_app.get("/api/v1/books/search?title=dune")
+    test_app.get("/api/v1/books/search?title=dune", headers={"If-None-Match": etag})
+    after = _samples(test_app)
+
+    # Assert
+    for status_code in ("200", "304"):
+        name = f'http_request_duration_seconds_count{{method="GET",route="/api/v1/books/search",status="{status_code}"}}'
+        assert int(after[name]) - int(before.get(name, 0)) == 1
+
+
+def _samples(test_app: TestClient) -> dict:
+    """Return the samples of the metrics endpoint by name and labels."""
+    return dict(line.rsplit(" ", 1) for line in test_app.get("/metrics").text.splitlines() if not line.startswith("#"))
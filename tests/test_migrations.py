@@ -0,0 +1,155 @@
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+from sqlalchemy import create_engine
+
+from database.migrations import upgrade
+from models.book import BOOK_SEARCH_TRIGGERS, GENRE_COUNTS_TRIGGERS, Base
+
+# Schema of the first release, with single-column indexes and no derived tables.
+FIRST_SCHEMA = (
+    "CREATE TABLE books (id INTEGER NOT NULL, title VARCHAR, author VARCHAR, publication_year INTEGER, genre VARCHAR, PRIMARY KEY (id))",
+    "CREATE INDEX ix_books_id ON books (id)",
+    "CREATE INDEX ix_books_title ON books (title)",
+    "CREATE INDEX ix_books_author ON books (author)",
+    "CREATE INDEX ix_books_genre ON books (genre)",
+)
+
+
+BOOKS = [("Dune", "Frank Herbert", 1965, "Sci-Fi"), ("Emma", "Jane Austen", 1815, "Romance"), ("Solaris", "Stanislaw Lem", 1961, "Sci-Fi")]
+
+
+def older_database(path: Path, *statements: str) -> str:
+    """Create a database of the current schema holding BOOKS, run statements taking it back to an older one, return its URL."""
+    Base.metadata.create_all(bind=create_engine(f"sqlite:///{path}"))
+    with closing(sqlite3.connect(path)) as connection:
+        connection.executemany("INSERT INTO books(title, author, publication_year, genre) VALUES (?, ?, ?, ?)", BOOKS)
+        for statement in statements:
+            connection.execute(statement)
+        connection.commit()
+    return f"sqlite:///{path}"
+
+
+def schema(path: Path) -> set:
+    """Return the names of the tables, indexes and triggers of a database."""
+    with closing(sqlite3.connect(path)) as connection:
+        return {name for (name,) in connection.execute("SELECT name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'")}
+
+
+def test_upgrade_first_schema(tmp_path: Path) -> None:
+    """Test that upgrade brings a database of the first schema to the current one, then does nothing."""
+    # Arrange
+    path = tmp_path / "library.db"
+    with closing(sqlite3.connect(path)) as connection:
+        for statement in FIRST_SCHEMA:
+            connection.execute(statement)
+        connection.executemany(
+            "INSERT INTO books(title, author, publication_year, genre) VALUES (?, ?, ?, ?)",
+            [("Dune", "Frank Herbert", 1965, "Sci-Fi"), ("Emma", "Jane Austen", 1815, "Romance"), ("Solaris", "Stanislaw Lem", 1961, "Sci-Fi")],
+        )
+        connection.commit()
+
+    # Act
+    applied = upgrade(f"sqlite:///{path}")
+    applied_again = upgrade(f"sqlite:///{path}")
+
+    # Assert
+    current = tmp_path / "current.db"
+    Base.metadata.create_all(bind=create_engine(f"sqlite:///{current}"))
+    assert "drop index ix_books_title" in applied
+    assert applied_again == []
+    assert schema(path) == schema(current)
+    with closing(sqlite3.connect(path)) as connection:
+        assert connection.execute("SELECT genre, count FROM genre_counts ORDER BY genre").fetchall() == [("Romance", 1), ("Sci-Fi", 2)]
+        assert connection.execute("SELECT decade, count FROM decade_counts ORDER BY decade").fetchall() == [(1810, 1), (1960, 2)]
+        assert connection.execute("SELECT rowid FROM books_fts WHERE books_fts MATCH 'austen'").fetchall() == [(2,)]
+        assert connection.execute("SELECT version FROM catalog_version").fetchall() == [(1,)]
+
+
+def test_upgrade_reseeds_tables_missing_triggers(tmp_path: Path) -> None:
+    """Test that upgrade recomputes a derived table whose triggers were missing while books changed."""
+    # Arrange
+    path = tmp_path / "library.db"
+    Base.metadata.create_all(bind=create_engine(f"sqlite:///{path}"))
+    with closing(sqlite3.connect(path)) as connection:
+        connection.execute("DROP TRIGGER decade_counts_insert")
+        connection.execute("INSERT INTO books(title, author, publication_year, genre) VALUES ('Dune', 'Frank Herbert', 1965, 'Sci-Fi')")
+        connection.commit()
+
+    # Act
+    applied = upgrade(f"sqlite:///{path}")
+
+    # Assert
+    assert applied == ["seed decade_counts", "create trigger decade_counts_insert"]
+    with closing(sqlite3.connect(path)) as connection:
+        assert connection.execute("SELECT decade, count FROM decade_counts").fetchall() == [(1960, 1)]
+        assert connection.execute("SELECT genre, count FROM genre_counts").fetchall() == [("Sci-Fi", 1)]
+
+
+def test_upgrade_adds_fulltext_index(tmp_path: Path) -> None:
+    """Test that upgrade creates and fills books_fts and its triggers on a database predating full-text search."""
+    # Arrange
+    path = tmp_path / "library.db"
+    database_url = older_database(path, "DROP TABLE books_fts", *(f"DROP TRIGGER {name}" for name in BOOK_SEARCH_TRIGGERS))
+
+    # Act
+    applied = upgrade(database_url)
+
+    # Assert
+    assert applied == ["create table books_fts", "seed books_fts", *(f"create trigger {name}" for name in BOOK_SEARCH_TRIGGERS)]
+    with closing(sqlite3.connect(path)) as connection:
+        connection.execute("INSERT INTO books(title, author, publication_year, genre) VALUES ('Persuasion', 'Jane Austen', 1817, 'Romance')")
+        assert connection.execute("SELECT rowid FROM books_fts WHERE books_fts MATCH 'austen' ORDER BY rowid").fetchall() == [(2,), (4,)]
+
+
+def test_upgrade_adds_genre_counts(tmp_path: Path) -> None:
+    """Test that upgrade creates, seeds and maintains genre_counts on a database predating it."""
+    # Arrange
+    path = tmp_path / "library.db"
+    database_url = older_database(path, *(f"DROP TRIGGER {name}" for name in GENRE_COUNTS_TRIGGERS), "DROP TABLE genre_counts")
+
+    # Act
+    applied = upgrade(database_url)
+
+    # Assert
+    assert applied == ["create table genre_counts"]
+    with closing(sqlite3.connect(path)) as connection:
+        connection.execute("DELETE FROM books WHERE title = 'Emma'")
+        assert connection.execute("SELECT genre, count FROM genre_counts").fetchall() == [("Sci-Fi", 2)]
+
+
+def test_upgrade_adds_catalog_version(tmp_path: Path) -> None:
+    """Test that upgrade creates the catalog version of a database predating it, bumped past the initial version."""
+    # Arrange
+    path = tmp_path / "library.db"
+    database_url = older_database(path, "DROP TABLE catalog_version")
+
+    # Act
+    applied = upgrade(database_url)
+
+    # Assert
+    assert applied == ["create table catalog_version"]
+    with closing(sqlite3.connect(path)) as connection:
+        assert connection.execute("SELECT id, version FROM catalog_version").fetchall() == [(1, 1)]
+
+
+def test_upgrade_replaces_single_column_indexes(tmp_path: Path) -> None:
+    """Test that upgrade replaces the single-column indexes of books with the covering (genre, id) index."""
+    # Arrange
+    path = tmp_path / "library.db"
+    database_url = older_database(
+        path,
+        "DROP INDEX ix_books_genre_id",
+        "CREATE INDEX ix_books_genre ON books (genre)",
+        "CREATE INDEX ix_books_title ON books (title)",
+    )
+
+    # Act
+    applied = upgrade(database_url)
+
+    # Assert
+    assert applied == ["drop index ix_books_title", "drop index ix_books_genre", "create index ix_books_genre_id"]
+    with closing(sqlite3.connect(path)) as connection:
+        plan = connection.execute("EXPLAIN QUERY PLAN SELECT id, title FROM books WHERE genre = 'Sci-Fi' ORDER BY id").fetchall()
+        assert [row[-1] for row in plan] == ["SEARCH books USING COVERING INDEX ix_books_genre_id (genre=?)"]
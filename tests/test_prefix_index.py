@@ -0,0 +1,59 @@
+from typing import List, Tuple
+
+import pytest
+
+from utils.prefix_index import PrefixIndex
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    """Fixture to run the tests on asyncio only."""
+    return "asyncio"
+
+
+async def test_refresh_drops_rebuild_racing_writes() -> None:
+    """Test that a rebuild loaded while this process wrote is dropped, keeping the write, until the next refresh."""
+    # Arrange
+    index = PrefixIndex()
+    index.build([(1, "Dune", "Frank Herbert", "Sci-Fi")], version=1)
+
+    async def load_during_write() -> Tuple[int, List[Tuple[int, str, str, str]]]:
+        index.add(2, "Emma", "Jane Austen", "Romance")
+        return 2, [(1, "Dune", "Frank Herbert", "Sci-Fi")]
+
+    async def load() -> Tuple[int, List[Tuple[int, str, str, str]]]:
+        return 3, [(1, "Dune", "Frank Herbert", "Sci-Fi"), (2, "Emma", "Jane Austen", "Romance")]
+
+    # Act
+    await index.refresh(2, load_during_write)
+    racing = index.suggest("emma")
+    await index.refresh(3, load)
+
+    # Assert
+    assert racing == [(2, "Emma", "Jane Austen")]
+    assert (index.version, len(index)) == (3, 2)
+
+
+def test_add_many_and_remove_many() -> None:
+    """Test that batches of books are merged into and removed from the index as single adds and removes would."""
+    # Arrange
+    books = [(_id, f"Title {_id % 7}", f"Author {_id % 5}", "18+" if _id % 11 == 0 else "Drama") for _id in range(1, 200)]
+    one_by_one, batched = PrefixIndex(), PrefixIndex()
+    one_by_one.build(books[:100])
+    batched.build(books[:100])
+    updates = [*books[100:], (3, "Renamed", "Someone", "Drama"), (4, "Hidden", "Someone", "18+")]
+
+    # Act
+    for book in updates:
+        one_by_one.add(*book)
+    batched.add_many(updates)
+    for _id in range(0, 200, 3):
+        one_by_one.remove(_id)
+    batched.remove_many(range(0, 200, 3))
+
+    # Assert
+    assert len(batched) == len(one_by_one)
+    assert batched._keys == one_by_one._keys  # noqa: SLF001
+    assert batched.suggest("title 1", limit=100) == one_by_one.suggest("title 1", limit=100)
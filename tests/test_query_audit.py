@@ -0,0 +1,18 @@
+from pathlib import Path
+
+from database.bulk_import import import_books, iter_rows
+from database.query_audit import audit
+
+
+def test_no_unexpected_full_scans(tmp_path: Path) -> None:
+    """Test that no CRUD statement scans the books table, except those reading every book by design."""
+    # Arrange
+    database_url = f"sqlite:///{tmp_path / 'audit.db'}"
+    import_books(database_url, iter_rows(Path("dataset.csv")), chunk_size=100)
+
+    # Act
+    plans = audit(database_url)
+
+    # Assert
+    assert {plan.function for plan in plans} >= {"db_get_censored", "db_get_censored_after", "db_search.fulltext", "db_filter.years", "db_bulk_delete"}
+    assert [plan for plan in plans if plan.flagged] == []
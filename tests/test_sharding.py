@@ -0,0 +1,225 @@
+from collections.abc import AsyncGenerator
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pytest
+from sqlalchemy import create_engine
+
+from database.config import create_async_engines, make_session
+from database.crud import books, sharded_books
+from database.crud.books import BookFilters, sort_keyset
+from database.sharding import ShardedSession, ShardedSessionMaker
+from models.book import Base, Book
+from schemas.book import BookGet
+
+pytestmark = pytest.mark.anyio
+
+SHARDS = 3
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    """Fixture to run the tests on asyncio only."""
+    return "asyncio"
+
+
+@pytest.fixture
+async def shards(tmp_path: Path) -> AsyncGenerator[ShardedSessionMaker, None]:
+    """Fixture to yield a session factory over empty shards."""
+    engines = []
+    for index in range(SHARDS):
+        url = f"sqlite:///{tmp_path / f'shard{index}.db'}"
+        sync_engine = create_engine(url)
+        Base.metadata.create_all(bind=sync_engine)
+        sync_engine.dispose()
+        engines.append(create_async_engines(url))
+
+    yield ShardedSessionMaker([make_session(write) for write, _ in engines], [make_session(read) for _, read in engines])
+
+    for write, read in engines:
+        await write.dispose()
+        await read.dispose()
+
+
+def book(title: str, genre: str) -> dict:
+    """Return the column values of a book."""
+    return {"title": title, "author": "Author", "publication_year": 1965, "genre": genre}
+
+
+async def test_insert_and_get(shards: ShardedSessionMaker) -> None:
+    """Test that books are spread over shards with IDs unique across them and found by ID."""
+    # Arrange
+    async with shards() as db:
+        db_book = Book(**book("Dune", "Fantasy"))
+        await sharded_books.db_insert(db, db_book)
+
+        # Act
+        ids = await sharded_books.db_bulk_insert(db, [book(f"Book {index}", "Drama") for index in range(7)])
+        found = await sharded_books.db_get_by_ids(db, [*ids, db_book.id])
+        one = await sharded_books.db_get_by_id(db, ids[3])
+        version = await sharded_books.db_get_version(db)
+
+    # Assert
+    assert len({*ids, db_book.id}) == 8
+    assert {book_id % SHARDS for book_id in ids} == set(range(SHARDS))
+    assert [found_book.id for found_book in found] == sorted([*ids, db_book.id])
+    assert one.title == "Book 3"
+    assert version == 1 + SHARDS
+
+
+async def test_bulk_insert_ids(shards: ShardedSessionMaker) -> None:
+    """Test that bulk insert assigns IDs after the max ID, in the order of rows and in the residue class of a shard."""
+    # Arrange
+    async with shards.session_makers[0]() as db:
+        await books.db_insert(db, Book(id=7, **book("Dune", "Fantasy")))
+
+        # Act
+        ids = await books.db_bulk_insert(db, [book(f"Book {index}", "Drama") for index in range(3)])
+        shard_ids = await books.db_bulk_insert(db, [book(f"Shard {index}", "Drama") for index in range(2)], remainder=1, modulus=SHARDS)
+        found = await books.db_get_by_ids(db, [*ids, *shard_ids])
+
+    # Assert
+    assert ids == [8, 9, 10]
+    assert shard_ids == [13, 16]
+    assert [found_book.title for found_book in found] == ["Book 0", "Book 1", "Book 2", "Shard 0", "Shard 1"]
+
+
+async def test_grouped_listing(shards: ShardedSessionMaker) -> None:
+    """Test that genre groups are merged from every shard with counts summed over shards."""
+    # Arrange
+    async with shards() as db:
+        await sharded_books.db_bulk_insert(db, [book(f"{genre} {index}", genre) for genre in ("A", "B", "C") for index in range(4)])
+
+        # Act
+        page = await sharded_books.db_get_censored(db, limit=2, offset=1)
+        keyset_pages = [await sharded_books.db_get_censored_after(db, 5)]
+        while len(books := [item for group in keyset_pages[-1] for item in group["books"]]) == 5:  # noqa: PLR2004
+            keyset_pages.append(await sharded_books.db_get_censored_after(db, 5, (books[-1]["genre"], books[-1]["id"])))
+
+    # Assert
+    assert [(group["genre"], group["count"], len(group["books"])) for group in page] == [("B", 4, 4), ("C", 4, 4)]
+    assert [[item["id"] for item in group["books"]] for group in page] == [sorted(item["id"] for item in group["books"]) for group in page]
+    listed = [(item["genre"], item["id"]) for keyset_page in keyset_pages for group in keyset_page for item in group["books"]]
+    assert listed == sorted(listed)
+    assert len(listed) == 12  # noqa: PLR2004
+    assert {group["count"] for keyset_page in keyset_pages for group in keyset_page} == {4}
+
+
+async def test_grouped_listing_with_interleaved_writes(shards: ShardedSessionMaker, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that genres created or emptied between the reads of counts and books are left out of grouped listings."""
+    # Arrange
+    async with shards() as db:
+        ids = await sharded_books.db_bulk_insert(db, [book("Dune", "A"), book("Emma", "C"), book("Ulysses", "E")])
+    genre_counts = sharded_books._genre_counts  # noqa: SLF001
+
+    async def write_then_count(db: ShardedSession, genres: Optional[List[str]] = None) -> Dict[str, int]:
+        async with shards() as writer:
+            if genres is None:
+                await sharded_books.db_bulk_insert(writer, [book("Beloved", "B")])
+            else:
+                await sharded_books.db_delete(writer, ids[1])
+        return await genre_counts(db, genres)
+
+    async def counts_then_write(db: ShardedSession, genres: Optional[List[str]] = None) -> Dict[str, int]:
+        counts = await genre_counts(db, genres)
+        async with shards() as writer:
+            await sharded_books.db_bulk_insert(writer, [book("Beloved", "B")])
+        return counts
+
+    # Act
+    async with shards() as db:
+        monkeypatch.setattr(sharded_books, "_genre_counts", counts_then_write)
+        page = await sharded_books.db_get_censored(db)
+        monkeypatch.setattr(sharded_books, "_genre_counts", write_then_count)
+        keyset_page = await sharded_books.db_get_censored_after(db, 10)
+
+    # Assert
+    assert [group["genre"] for group in page] == ["A", "C", "E"]
+    assert [group["genre"] for group in keyset_page] == ["A", "B", "E"]
+
+
+async def test_search_and_export(shards: ShardedSessionMaker) -> None:
+    """Test that searches and the export are merged from every shard in ID order."""
+    # Arrange
+    async with shards() as db:
+        ids = await sharded_books.db_bulk_insert(db, [book(f"River {index}", "Drama") for index in range(10)] + [book("Secret river", "18+")])
+
+        # Act
+        found = await sharded_books.db_search(db, title="river", limit=4, after=sorted(ids)[1])
+        fulltext = await sharded_books.db_search(db, title="river", mode="fulltext")
+        exported = [row async for batch in sharded_books.db_iter_censored(db, batch_size=4) for row in batch]
+
+    # Assert
+    assert [found_book.id for found_book in found] == sorted(ids[:10])[2:6]
+    assert len(fulltext) == 10  # noqa: PLR2004
+    assert [row[0] for row in exported] == sorted(ids)
+    assert {row[0]: row[1] for row in exported}[ids[-1]] == "CENSORED"
+
+
+async def test_filter_and_stats(shards: ShardedSessionMaker) -> None:
+    """Test that filtered listings are merged from every shard in the order of the sort, and histograms summed over shards."""
+    # Arrange
+    years = [1995, None, 1961, 2003, 1968, None, 1999, 1961]
+    async with shards() as db:
+        ids = await sharded_books.db_bulk_insert(db, [{**book(f"Book {index}", "Drama"), "publication_year": year} for index, year in enumerate(years)])
+
+        # Act
+        pages = [await sharded_books.db_filter(db, BookFilters(genre="Drama"), "publication_year", limit=3)]
+        while len(pages[-1]) == 3:  # noqa: PLR2004
+            after = sort_keyset("publication_year", pages[-1][-1])
+            pages.append(await sharded_books.db_filter(db, BookFilters(genre="Drama"), "publication_year", limit=3, after=after))
+        newest = await sharded_books.db_filter(db, BookFilters(year_from=1961, year_to=1999), "-publication_year", limit=2, offset=1)
+        count = await sharded_books.db_count_filtered(db, BookFilters(year_from=1961, year_to=1999))
+        stats = await sharded_books.db_get_stats(db)
+
+    # Assert
+    expected = sorted(zip(years, ids, strict=True), key=lambda pair: (pair[0] is not None, pair[0] or 0, pair[1]))
+    assert [(item["publication_year"], item["id"]) for page in pages for item in page] == expected
+    assert [item["publication_year"] for item in newest] == [1995, 1968]
+    assert count == 5  # noqa: PLR2004
+    assert stats == {"genres": {"Drama": 8}, "decades": {1960: 3, 1990: 2, 2000: 1}}
+
+
+async def test_update_and_delete(shards: ShardedSessionMaker) -> None:
+    """Test that updates and deletes reach the shards holding the books and the last book of a genre is kept."""
+    # Arrange
+    async with shards() as db:
+        ids = await sharded_books.db_bulk_insert(db, [book(f"Book {index}", "Drama") for index in range(4)] + [book("Dune", "Fantasy")])
+
+        # Act
+        updated = await sharded_books.db_bulk_update(db, [BookGet(id=book_id, **book("Renamed", "Drama")) for book_id in ids[:2]])
+        missing = await sharded_books.db_bulk_update(db, [BookGet(id=999, **book("Missing", "Drama"))])
+        deleted, kept = await sharded_books.db_bulk_delete(db, [*ids, 999])
+        remaining = await sharded_books.db_get_by_ids(db, ids)
+        counts = (await sharded_books.db_count_by_genre(db, "Drama"), await sharded_books.db_count_genres(db))
+
+    # Assert
+    assert [updated_book.title for updated_book in updated] == ["Renamed", "Renamed"]
+    assert missing is None
+    assert deleted == ids[:3]
+    assert kept == {ids[3]: "Drama", ids[4]: "Fantasy"}
+    assert [remaining_book.id for remaining_book in remaining] == ids[3:]
+    assert counts == (1, 2)
+
+
+async def test_bulk_update_is_all_or_nothing(shards: ShardedSessionMaker) -> None:
+    """Test that an update missing a book of a later shard leaves the books of earlier shards unchanged."""
+    # Arrange
+    async with shards() as db:
+        ids = await sharded_books.db_bulk_insert(db, [book(f"Book {index}", "Drama") for index in range(SHARDS)])
+        first = min(ids, key=lambda book_id: book_id % SHARDS)
+        missing = max(ids) + (SHARDS - 1 - max(ids) % SHARDS) + SHARDS
+        version = await sharded_books.db_get_version(db)
+
+        # Act
+        updated = await sharded_books.db_bulk_update(db, [BookGet(id=book_id, **book("Renamed", "Drama")) for book_id in (first, missing)])
+
+    async with shards() as db:
+        unchanged = await sharded_books.db_get_by_id(db, first)
+        after = await sharded_books.db_get_version(db)
+
+    # Assert
+    assert first % SHARDS < missing % SHARDS
+    assert updated is None
+    assert unchanged.title != "Renamed"
+    assert after == version
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from utils.single_flight import SingleFlight
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    """Fixture to run the tests on asyncio only."""
+    return "asyncio"
+
+
+async def test_concurrent_calls_share_one_run() -> None:
+    """Test that concurrent calls with the same key share one run and its result, other keys run on their own."""
+    # Arrange
+    flights = SingleFlight()
+    runs = []
+    release = asyncio.Event()
+
+    async def read(key: str) -> list:
+        runs.append(key)
+        await release.wait()
+        return [key]
+
+    # Act
+    calls = [asyncio.ensure_future(flights.run(key, lambda key=key: read(key))) for key in ("a", "a", "a", "b")]
+    await asyncio.sleep(0)
+    in_flight = len(flights)
+    release.set()
+    results = await asyncio.gather(*calls)
+
+    # Assert
+    assert runs == ["a", "b"]
+    assert results == [["a"], ["a"], ["a"], ["b"]]
+    assert results[0] is results[1]
+    assert (in_flight, len(flights), flights.leaders, flights.followers) == (2, 0, 2, 2)
+
+
+async def test_failures_and_cancellations() -> None:
+    """Test that a failure reaches every caller and is not kept, and that a caller going away does not cancel the run."""
+    # Arrange
+    flights = SingleFlight()
+    release = asyncio.Event()
+
+    async def fail() -> None:
+        await release.wait()
+        raise ValueError("boom")
+
+    async def read() -> int:
+        await release.wait()
+        return 1
+
+    # Act
+    failed = [asyncio.ensure_future(flights.run("fail", fail)) for _ in range(2)]
+    leader = asyncio.ensure_future(flights.run("read", read))
+    follower = asyncio.ensure_future(flights.run("read", read))
+    await asyncio.sleep(0)
+    leader.cancel()
+    release.set()
+    failures = await asyncio.gather(*failed, return_exceptions=True)
+
+    # Assert
+    assert [str(failure) for failure in failures] == ["boom", "boom"]
+    assert await follower == 1
+    assert leader.cancelled()
+    assert await flights.run("fail", read) == 1
@@ -0,0 +1,96 @@
+from collections.abc import Generator
+from pathlib import Path
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from utils.snapshot import CatalogSnapshot, catalog_snapshot, write_snapshot
+
+ROWS = [
+    (1, "Dune", "Frank Herbert", 1965, "Sci-Fi"),
+    (2, "CENSORED", "Anonymous", 2001, "18+"),
+    (3, "Emma", "Jane Austen", 1815, "Romance"),
+    (5, "Dune Messiah", "Frank Herbert", 1969, "Sci-Fi"),
+    (8, "Ducks", "Unknown", None, None),
+    (9, "Ünder the Dome", "Stephen King", 2009, "Sci-Fi"),
+]
+
+
+@pytest.fixture
+def shared_snapshot(test_app: TestClient, tmp_path: Path) -> Generator[None, None, None]:
+    """Fixture to enable the catalog snapshot of the app in a temporary file."""
+    from main import catalog_version, load_catalog
+
+    catalog_snapshot.configure(str(tmp_path / "catalog.snapshot"), get_version=catalog_version, load=load_catalog)
+    yield
+    test_app.portal.call(catalog_snapshot.wait)
+    catalog_snapshot.configure(None, get_version=catalog_version, load=load_catalog)
+
+
+def test_snapshot_queries(tmp_path: Path) -> None:
+    """Test that a mapped snapshot answers listings and searches as the database queries do."""
+    # Arrange
+    path = tmp_path / "catalog.snapshot"
+    write_snapshot(path, 7, ROWS)
+
+    # Act
+    snapshot = CatalogSnapshot(path)
+    pages = [snapshot.get_censored_after(2)]
+    pages.append(snapshot.get_censored_after(2, ("Romance", 3)))
+
+    # Assert
+    assert (snapshot.generation, len(snapshot), snapshot.count_genres()) == (7, 6, 3)
+    assert [(group["genre"], group["count"], [book["id"] for book in group["books"]]) for group in snapshot.get_censored(limit=2, offset=1)] == [
+        ("Romance", 1, [3]),
+        ("Sci-Fi", 3, [1, 5, 9]),
+    ]
+    assert snapshot.get_censored(limit=1)[0]["books"] == [{"title": "CENSORED", "author": "Anonymous", "publication_year": 2001, "genre": "18+", "id": 2}]
+    assert [[book["id"] for group in page for book in group["books"]] for page in pages] == [[2, 3], [1, 5]]
+    assert [book["id"] for book in snapshot.search(title="DUNE")] == [1, 5]
+    assert [book["id"] for book in snapshot.search(title="du", limit=1, after=1)] == [5]
+    assert [book["id"] for book in snapshot.search(title="dune", author="king")] == []
+    assert [book["id"] for book in snapshot.search(author="herbert")] == [1, 5]
+    # Lowercased as SQLite lower() does: ASCII letters only.
+    assert [book["id"] for book in snapshot.search(title="Ünder the")] == []
+    assert [book["id"] for book in snapshot.search(title="nder THE")] == [9]
+    assert snapshot.search(title="anonymous") == snapshot.search(title="ducks") == []
+    # Matches never span two values.
+    assert snapshot.search(title="neemma") == []
+
+
+def test_endpoints_served_from_snapshot(test_app: TestClient, shared_snapshot: None) -> None:  # noqa: ARG001
+    """Test that listings and searches served from the snapshot match the database ones, and follow writes."""
+    # Arrange
+    books = [
+        {"title": "Dune", "author": "Frank Herbert", "publication_year": 1965, "genre": "Sci-Fi"},
+        {"title": "Secret", "author": "Anonymous", "publication_year": 2001, "genre": "18+"},
+        {"title": "Dune Messiah", "author": "Frank Herbert", "publication_year": 1969, "genre": "Sci-Fi"},
+        {"title": "Germinal", "author": "Émile Zola", "publication_year": 1885, "genre": "Novel"},
+    ]
+    for book in books:
+        test_app.post("/api/v1/books", json=book)
+    urls = (
+        "/api/v1/books/",
+        "/api/v1/books/?pagination=cursor&size=1",
+        "/api/v1/books/?pagination=cursor&size=1&fields=title",
+        "/api/v1/books/search?title=dune",
+        "/api/v1/books/search?title=dune&fields=author,id",
+        "/api/v1/books/search?author=émile",
+        "/api/v1/books/search?author=MILE zola",
+    )
+    from_database = [test_app.get(url).json() for url in urls]
+
+    # Act
+    test_app.portal.call(catalog_snapshot.rebuild)
+    from_snapshot = [test_app.get(url).json() for url in urls]
+    test_app.post("/api/v1/books", json={"title": "Dune Children", "author": "Frank Herbert", "publication_year": 1976, "genre": "Sci-Fi"})
+    after_write = test_app.get("/api/v1/books/search?title=dune")
+
+    # Assert
+    assert catalog_snapshot.rebuilds >= 1
+    assert from_snapshot == from_database
+    # Non-ASCII capitals are kept by lower() in the database as in the snapshot.
+    assert [response.get("total") for response in from_snapshot[-2:]] == [None, 1]
+    assert after_write.status_code == status.HTTP_200_OK
+    assert after_write.json()["total"] == 3  # noqa: PLR2004
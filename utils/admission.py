@@ -0,0 +1,132 @@
+import asyncio
+import math
+from collections import deque
+from collections.abc import Callable
+from typing import Deque, Dict, List, Optional
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from utils.metrics import Counter, registry
+
+admission_requests = registry.register(Counter("admission_requests_total", "Requests admitted or rejected by admission control, per route class."))
+
+
+class AdmissionRejectedError(Exception):
+    """Request rejected by admission control."""
+
+    def __init__(self, reason: str) -> None:
+        """Reject for reason, "queue_full" or "timeout", as counted by admission_requests_total."""
+        super().__init__(reason)
+        self.reason = reason
+
+
+class Limiter:
+    """
+    Concurrency limit with a bounded FIFO queue of requests waiting for a slot, each for at most timeout seconds.
+
+    A released slot is handed to the first waiting request directly, so newcomers cannot overtake the queue.
+    """
+
+    def __init__(self, concurrency: int, queue_size: int, timeout: float) -> None:
+        """Let concurrency requests run at once and queue_size more wait for up to timeout seconds each."""
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def queued(self) -> int:
+        """Number of requests waiting for a slot."""
+        return len(self._waiters)
+
+    async def acquire(self) -> None:
+        """Take a slot, waiting in the queue if needed; raise AdmissionRejectedError if the queue is full or the wait times out."""
+        if self.active < self.concurrency and not self._waiters:
+            self.active += 1
+            return
+        if len(self._waiters) >= self.queue_size:
+            raise AdmissionRejectedError("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.timeout)
+        except BaseException as error:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over as the wait ended, pass it on.
+                self.release()
+            else:
+                self._waiters.remove(waiter)
+            if isinstance(error, TimeoutError):
+                raise AdmissionRejectedError("timeout") from error
+            raise
+
+    def release(self) -> None:
+        """Hand the slot to the first waiting request, or free it."""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+class AdmissionControl:
+    """
+    Limiters of the route classes, and the class of each request.
+
+    route_class returns the class of a request from its method and path; requests without a class or with a class
+    without a limiter are never limited. Rejected clients are told to retry after retry_after seconds.
+    """
+
+    def __init__(self, limiters: Dict[str, Limiter], route_class: Callable[[str, str], Optional[str]], retry_after: float) -> None:
+        """Limit the route classes of limiters, see the class docstring."""
+        self.limiters = limiters
+        self.route_class = route_class
+        self.retry_after = retry_after
+
+    def render_metrics(self) -> List[str]:
+        """Return requests running and waiting per route class in Prometheus text format."""
+        lines = ["# HELP admission_in_flight Requests running, per route class.", "# TYPE admission_in_flight gauge"]
+        lines.extend(f'admission_in_flight{{route_class="{name}"}} {limiter.active}' for name, limiter in self.limiters.items())
+        lines += ["# HELP admission_queue_depth Requests waiting for a slot, per route class.", "# TYPE admission_queue_depth gauge"]
+        lines.extend(f'admission_queue_depth{{route_class="{name}"}} {limiter.queued}' for name, limiter in self.limiters.items())
+        return lines
+
+
+class AdmissionMiddleware:
+    """
+    Limit concurrent requests per route class and shed the excess with 503 Service Unavailable and Retry-After.
+
+    Requests beyond the limit of their class wait in a bounded queue for a while; once it is full or the wait is over,
+    they fail fast instead of piling up on the database, so admitted requests keep finishing in time.
+    """
+
+    def __init__(self, app: ASGIApp, admission: AdmissionControl) -> None:
+        """Wrap app, admitting its requests as admission says."""
+        self.app = app
+        self.admission = admission
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Run the request once it holds a slot of its route class, or answer 503 if it is rejected."""
+        route_class = self.admission.route_class(scope["method"], scope["path"]) if scope["type"] == "http" else None
+        limiter = self.admission.limiters.get(route_class)
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await limiter.acquire()
+        except AdmissionRejectedError as rejected:
+            admission_requests.inc(route_class=route_class, result=rejected.reason)
+            retry_after = str(math.ceil(self.admission.retry_after)).encode()
+            await send({"type": "http.response.start", "status": 503, "headers": [(b"content-type", b"application/json"), (b"retry-after", retry_after)]})
+            await send({"type": "http.response.body", "body": b'{"reason":"The server is overloaded, retry later."}'})
+            return
+
+        admission_requests.inc(route_class=route_class, result="admitted")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
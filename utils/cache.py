@@ -0,0 +1,167 @@
+import hashlib
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Iterable
+from typing import List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+Headers = List[Tuple[bytes, bytes]]
+
+
+class CachedResponse(NamedTuple):
+    """Rendered response for a cache key at a catalog version."""
+
+    version: int
+    headers: Headers
+    body: bytes
+
+
+class ResponseCache:
+    """
+    LRU cache of rendered responses capped by the total size of their bodies.
+
+    Entries are stored along with the catalog version they were rendered at and ignored once the version moves on.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        """Start empty, holding up to max_bytes of response bodies."""
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, CachedResponse] = OrderedDict()
+
+    def __len__(self) -> int:
+        """Return the number of cached responses."""
+        return len(self._entries)
+
+    def get(self, key: str, version: int) -> Optional[CachedResponse]:
+        """Return the response cached for the key at the version, if any."""
+        entry = self._entries.get(key)
+        if entry is None or entry.version != version:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: str, entry: CachedResponse) -> None:
+        """Cache the response for the key, evicting least recently used ones above max_bytes."""
+        self.pop(key)
+        if len(entry.body) > self.max_bytes:
+            return
+
+        self._entries[key] = entry
+        self.size += len(entry.body)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted.body)
+
+    def pop(self, key: str) -> None:
+        """Remove the response cached for the key, if any."""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry.body)
+
+    def clear(self) -> None:
+        """Remove all cached responses."""
+        self._entries.clear()
+        self.size = 0
+
+    def render_metrics(self) -> List[str]:
+        """Return hits, misses and size of the cache in Prometheus text format."""
+        return [
+            "# HELP response_cache_requests_total Lookups of the response cache.",
+            "# TYPE response_cache_requests_total counter",
+            f'response_cache_requests_total{{result="hit"}} {self.hits}',
+            f'response_cache_requests_total{{result="miss"}} {self.misses}',
+            "# HELP response_cache_bytes Size of the cached response bodies.",
+            "# TYPE response_cache_bytes gauge",
+            f"response_cache_bytes {self.size}",
+        ]
+
+
+class ResponseCacheMiddleware:
+    """
+    Cache successful GET responses of the given paths by query parameters and catalog version.
+
+    Responses carry an ETag derived from the cache key and the catalog version,
+    a matching If-None-Match is answered with 304 Not Modified before the endpoint runs.
+    If-None-Match: * matches any representation: it is answered with 304 Not Modified if a response is cached,
+    or once the endpoint renders a successful one, which is cached; other responses go through unchanged.
+    """
+
+    def __init__(self, app: ASGIApp, cache: ResponseCache, get_version: Callable[[], Awaitable[int]], paths: Iterable[str]) -> None:
+        """
+        Wrap app, caching its responses in cache.
+
+        :param get_version: return the current catalog version, which responses are cached at.
+        :param paths: paths of the cached routes, with or without a trailing slash.
+        """
+        self.app = app
+        self.cache = cache
+        self.get_version = get_version
+        self.paths = {path.rstrip("/") for path in paths}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Answer GET requests of the cached paths from the cache or with 304 Not Modified if possible, pass other requests through."""
+        path = scope.get("path", "").rstrip("/")
+        if scope["type"] != "http" or scope["method"] != "GET" or path not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        version = await self.get_version()
+        query = urlencode(sorted(parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True)))
+        key = f"{path}?{query}"
+        etag = f'"{version}-{hashlib.sha1(key.encode(), usedforsecurity=False).hexdigest()[:16]}"'.encode()
+
+        if_none_match = dict(scope["headers"]).get(b"if-none-match", b"")
+        if etag in [tag.strip().removeprefix(b"W/") for tag in if_none_match.split(b",")]:
+            await _send_not_modified(send, etag)
+            return
+
+        # Only an existing representation matches "*": a cached one, or the one the endpoint renders below.
+        any_match = if_none_match.strip() == b"*"
+        entry = self.cache.get(key, version)
+        if entry is not None and any_match:
+            await _send_not_modified(send, etag)
+            return
+        if entry is not None:
+            await send({"type": "http.response.start", "status": 200, "headers": [*entry.headers, (b"etag", etag)]})
+            await send({"type": "http.response.body", "body": entry.body})
+            return
+
+        await self._render(scope, receive, send, key=key, version=version, etag=etag, any_match=any_match)
+
+    async def _render(self, scope: Scope, receive: Receive, send: Send, *, key: str, version: int, etag: bytes, any_match: bool) -> None:
+        """Run the endpoint and cache its response if successful, answering with 304 Not Modified instead if any_match."""
+        start: Message = {}
+        body: List[bytes] = []
+
+        async def send_and_cache(message: Message) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                if start["status"] == 200 and any_match:  # noqa: PLR2004
+                    return
+                if start["status"] == 200:  # noqa: PLR2004
+                    message = {**message, "headers": [*message.get("headers", []), (b"etag", etag)]}
+            elif message["type"] == "http.response.body" and start.get("status") == 200:  # noqa: PLR2004
+                body.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    self.cache.set(key, CachedResponse(version, list(start.get("headers", [])), b"".join(body)))
+                    if any_match:
+                        await _send_not_modified(send, etag)
+                if any_match:
+                    return
+            await send(message)
+
+        await self.app(scope, receive, send_and_cache)
+
+
+async def _send_not_modified(send: Send, etag: bytes) -> None:
+    """Answer with 304 Not Modified and the ETag of the current representation."""
+    await send({"type": "http.response.start", "status": 304, "headers": [(b"etag", etag)]})
+    await send({"type": "http.response.body", "body": b""})
@@ -0,0 +1,128 @@
+import codecs
+import json
+from collections.abc import AsyncIterator
+from typing import List, Tuple, Union
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+
+
+class RecordError(ValueError):
+    """A record of the stream could not be decoded."""
+
+
+async def iter_json_records(chunks: AsyncIterator[bytes], max_record_size: int) -> AsyncIterator[Union[object, RecordError]]:
+    """
+    Incrementally decode a JSON array or an NDJSON stream, one record at a time.
+
+    Only the current record is buffered, so memory stays flat regardless of the stream size.
+    Undecodable or too large NDJSON lines are yielded as RecordError and decoding goes on with the next line,
+    the rest of a too large line being skipped without buffering it.
+    An undecodable or too large JSON array element is yielded as RecordError and ends the stream, as the array cannot be resynchronized.
+
+    :param chunks: raw body chunks.
+    :param max_record_size: max length of a single record, in characters.
+    """
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    is_array = None
+    skipping = False
+
+    async for chunk in chunks:
+        buffer += utf8.decode(chunk)
+
+        if is_array is None:
+            buffer = buffer.lstrip(_WHITESPACE)
+            if not buffer:
+                continue
+            is_array = buffer.startswith("[")
+            if is_array:
+                buffer = buffer[1:]
+
+        records, buffer, done, skipping = _decode_buffer(buffer, is_array=is_array, final=False, max_record_size=max_record_size, skipping=skipping)
+        for record in records:
+            yield record
+        if done:
+            return
+
+    buffer += utf8.decode(b"", final=True)
+    records, buffer, done, skipping = _decode_buffer(buffer, is_array=bool(is_array), final=True, max_record_size=max_record_size, skipping=skipping)
+    for record in records:
+        yield record
+
+    if is_array and not done:
+        yield RecordError("Unterminated JSON array.")
+
+
+def _decode_buffer(buffer: str, is_array: bool, final: bool, max_record_size: int, skipping: bool) -> Tuple[List, str, bool, bool]:
+    """Decode complete records from the buffer, return them along with the undecoded rest, whether the stream ended and whether the rest of an NDJSON line is skipped."""
+    if is_array:
+        return (*_decode(buffer, final=final, max_record_size=max_record_size), False)
+    records, buffer, skipping = _decode_ndjson(buffer, final=final, max_record_size=max_record_size, skipping=skipping)
+    return records, buffer, False, skipping
+
+
+def _decode_ndjson(buffer: str, final: bool, max_record_size: int, skipping: bool) -> Tuple[List, str, bool]:
+    """
+    Decode the complete lines of the buffer, return them along with the undecoded rest and whether the rest of the line is skipped.
+
+    :param skipping: the buffer starts within a too large line, which was reported already: drop it up to its end.
+    """
+    lines = buffer.split("\n")
+    buffer = "" if final else lines.pop()
+    if skipping:
+        if not lines:
+            return [], "", True
+        lines.pop(0)
+
+    records = _decode_lines(lines, max_record_size)
+    if len(buffer) > max_record_size:
+        records.append(RecordError("Record is too large."))
+        return records, "", True
+    return records, buffer, False
+
+
+def _decode(buffer: str, final: bool, max_record_size: int) -> Tuple[List, str, bool]:
+    """Decode complete JSON array elements from the buffer, return them along with the undecoded rest and whether the array ended."""
+    records = []
+    position = 0
+
+    while True:
+        while position < len(buffer) and buffer[position] in _WHITESPACE + ",":
+            position += 1
+        if position == len(buffer) or buffer[position] == "]":
+            return records, buffer[position:], position < len(buffer)
+
+        try:
+            record, end = _decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as error:
+            if final:
+                records.append(RecordError(f"Invalid JSON: {error.msg}."))
+                return records, "", True
+            if len(buffer) - position > max_record_size:
+                records.append(RecordError("Record is too large."))
+                return records, "", True
+            return records, buffer[position:], False
+
+        if end == len(buffer) and not final:
+            # A number or a literal may continue in the next chunk.
+            return records, buffer[position:], False
+
+        records.append(record)
+        position = end
+
+
+def _decode_lines(lines: List[str], max_record_size: int) -> List:
+    """Decode NDJSON lines, skipping blank ones."""
+    records = []
+    for line in lines:
+        if not line.strip(_WHITESPACE):
+            continue
+        if len(line) > max_record_size:
+            records.append(RecordError("Record is too large."))
+            continue
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError as error:
+            records.append(RecordError(f"Invalid JSON: {error.msg}."))
+    return records
@@ -1,27 +1,132 @@
+import atexit
 import logging
 import logging.config
+import queue
+import random
+from collections.abc import Mapping
+from logging.handlers import QueueHandler, QueueListener
 
+import orjson
 from pydantic import BaseModel
+from uvicorn.logging import DefaultFormatter
+
+from config import Settings
 
 logger = logging.getLogger("app")
 
+settings = Settings()
+
+# Attributes every LogRecord has; anything else was passed with ``extra=`` and is a structured field.
+RECORD_ATTRIBUTES = frozenset(logging.makeLogRecord({}).__dict__) | {"message", "asctime", "color_message"}
+
+
+def truncate(value: object, max_length: int = settings.LOG_MAX_FIELD_LENGTH, max_items: int = settings.LOG_MAX_FIELD_ITEMS) -> object:
+    """
+    Shorten a structured field so that logging a large payload stays cheap.
+
+    Sequences are cut to the first max_items items, anything else which is not a number
+    is rendered with str() and cut to max_length characters.
+    """
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, Mapping):
+        items = list(value.items())
+        shortened = {str(key): truncate(item, max_length, max_items) for key, item in items[:max_items]}
+        if len(items) > max_items:
+            shortened["..."] = f"{len(items) - max_items} more"
+        return shortened
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = list(value)
+        shortened = [truncate(item, max_length, max_items) for item in items[:max_items]]
+        if len(items) > max_items:
+            shortened.append(f"... {len(items) - max_items} more")
+        return shortened
+    text = str(value)
+    if len(text) > max_length:
+        return f"{text[:max_length]}... ({len(text)} chars)"
+    return text
+
+
+def record_fields(record: logging.LogRecord) -> dict:
+    """Return the structured fields of the record, truncated."""
+    return {key: truncate(value) for key, value in record.__dict__.items() if key not in RECORD_ATTRIBUTES}
+
+
+class TextFormatter(DefaultFormatter):
+    """Uvicorn console formatter which appends the structured fields of the record as JSON."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Format the record as uvicorn does, followed by its structured fields."""
+        message = super().format(record)
+        fields = record_fields(record)
+        if fields:
+            message = f"{message} | {orjson.dumps(fields, default=str).decode()}"
+        return message
+
+
+class JsonFormatter(logging.Formatter):
+    """Formatter which renders every record as a single JSON object."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Format the record as a JSON object of its time, level, logger, message, structured fields and exception."""
+        entry = {
+            "time": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": truncate(record.getMessage()),
+            **record_fields(record),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry, default=str).decode()
+
+
+class SamplingFilter(logging.Filter):
+    """Let through only a share of the records below WARNING, warnings and errors are always kept."""
+
+    def __init__(self, rate: float) -> None:
+        """Keep a rate share of the records below WARNING, between 0 and 1."""
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """Return whether to keep the record."""
+        return record.levelno >= logging.WARNING or random.random() < self.rate  # noqa: S311 - sampling logs, not security.
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    Queue handler which leaves formatting to the listener thread.
+
+    The stock QueueHandler formats the message before enqueueing it, on the request path.
+    Records are consumed within the process, so they are passed on as they are.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Return the record unchanged, to be formatted by the handlers of the listener."""
+        return record
+
 
 class LogConfig(BaseModel):
-    """Logging configuration to be set for the server"""
+    """Logging configuration to be set for the server."""
 
     version: int = 1
 
     formatters: dict = {
         "default": {
-            "()": "uvicorn.logging.DefaultFormatter",
+            "()": TextFormatter,
             "fmt": "%(levelprefix)s | %(asctime)s | %(message)s",
             "datefmt": "%Y-%m-%d %H:%M:%S",
         },
+        "json": {
+            "()": JsonFormatter,
+            "datefmt": "%Y-%m-%dT%H:%M:%S%z",
+        },
     }
     handlers: dict = {
         "console": {
             "class": "logging.StreamHandler",
-            "formatter": "default",
+            "formatter": "json" if settings.LOG_FORMAT == "json" else "default",
             "level": logging.DEBUG,
         },
     }
@@ -37,5 +142,34 @@ class LogConfig(BaseModel):
     }
 
 
+def setup_logging(config: dict) -> QueueListener:
+    """
+    Apply the logging configuration and move its handlers behind a queue.
+
+    Loggers only put records on the queue; a listener thread formats and writes them.
+    Loggers listed in settings.LOG_SAMPLE_RATES keep only that share of their records below WARNING.
+    """
+    logging.config.dictConfig(config)
+
+    handlers = {}
+    for name in config["loggers"]:
+        configured_logger = logging.getLogger(name)
+        for handler in configured_logger.handlers:
+            handlers[id(handler)] = handler
+        configured_logger.handlers = []
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = LazyQueueHandler(log_queue)
+    for name in config["loggers"]:
+        logging.getLogger(name).addHandler(queue_handler)
+    for name, rate in settings.LOG_SAMPLE_RATES.items():
+        logging.getLogger(name).addFilter(SamplingFilter(rate))
+
+    listener = QueueListener(log_queue, *handlers.values(), respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
 log_config = LogConfig().dict()
-logging.config.dictConfig(log_config)
+log_listener = setup_logging(log_config)
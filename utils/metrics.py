@@ -0,0 +1,200 @@
+import time
+from bisect import bisect_left
+from collections.abc import Callable, Iterable
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple, TypeVar, Union
+
+from sqlalchemy import Connection, Engine, event
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from utils.logger import logger
+
+Labels = Tuple[Tuple[str, str], ...]
+Metric = TypeVar("Metric", bound=Union["Counter", "Histogram"])
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100, 1000)
+
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in labels]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    """Prometheus counter, per label values."""
+
+    def __init__(self, name: str, documentation: str) -> None:
+        """Start with no label values, named and documented as rendered."""
+        self.name = name
+        self.documentation = documentation
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        """Increase the counter of the labels by amount."""
+        key = tuple(sorted(labels.items()))
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        """Return the counter in Prometheus text format."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        lines.extend(f"{self.name}{_format_labels(labels)} {value}" for labels, value in self.values.items())
+        return lines
+
+
+class Histogram:
+    """Prometheus histogram with fixed buckets, per label values."""
+
+    def __init__(self, name: str, documentation: str, buckets: Iterable[float]) -> None:
+        """Start with no label values, counting observations up to each of the increasing upper bounds of buckets."""
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.values: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Record an observation for the labels."""
+        key = tuple(sorted(labels.items()))
+        counts, total = self.values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+        counts[bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def render(self) -> List[str]:
+        """Return the histogram in Prometheus text format, buckets being cumulative."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts, strict=True):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total[0]}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Metrics of this process, rendered in Prometheus text format.
+
+    Collectors are callables returning extra lines, for values owned by other components.
+    """
+
+    def __init__(self) -> None:
+        """Start with no metrics and no collectors."""
+        self.metrics: List[Union[Counter, Histogram]] = []
+        self.collectors: List[Callable[[], List[str]]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        """Register a Counter or a Histogram."""
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Return all metrics in Prometheus text format."""
+        lines = [line for metric in self.metrics for line in metric.render()]
+        lines.extend(line for collector in self.collectors for line in collector())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+request_duration = registry.register(Histogram("http_request_duration_seconds", "Latency of HTTP requests.", LATENCY_BUCKETS))
+request_sql_statements = registry.register(Histogram("http_request_sql_statements", "SQL statements executed per HTTP request.", STATEMENT_BUCKETS))
+request_sql_duration = registry.register(Histogram("http_request_sql_duration_seconds", "Total SQL time per HTTP request.", LATENCY_BUCKETS))
+sql_statements = registry.register(Counter("sql_statements_total", "SQL statements executed."))
+slow_sql_statements = registry.register(Counter("sql_slow_statements_total", "SQL statements slower than settings.SLOW_QUERY_SECONDS."))
+
+
+class RequestStats:
+    """SQL statements and time of the current request."""
+
+    __slots__ = ("sql_seconds", "sql_statements")
+
+    def __init__(self) -> None:
+        """Start with no statements."""
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+def instrument_engine(engine: Engine, slow_query_seconds: float) -> None:
+    """
+    Count and time SQL statements of the engine, per request, and log slow ones with their parameters.
+
+    :param slow_query_seconds: statements slower than this are logged.
+    """
+
+    # Listeners take the connection, cursor, statement, parameters, context and executemany flag, positionally.
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn: Connection, *_: object) -> None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _stop(conn: Connection, _cursor: object, statement: str, parameters: object, *_: object) -> None:
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        sql_statements.inc()
+
+        stats = current_request.get()
+        if stats is not None:
+            stats.sql_statements += 1
+            stats.sql_seconds += elapsed
+
+        if elapsed >= slow_query_seconds:
+            slow_sql_statements.inc()
+            logger.warning("Slow query.", extra={"seconds": round(elapsed, 3), "statement": statement, "parameters": parameters})
+
+
+def route_template(scope: Scope) -> str:
+    """
+    Return the path template of the route of a request, "unmatched" if none.
+
+    The router sets it in the scope; requests answered before routing, e.g. from the response cache, are matched here.
+    """
+    route = scope.get("route")
+    if route is None:
+        route = next((candidate for candidate in getattr(scope.get("app"), "routes", ()) if candidate.matches(scope)[0] == Match.FULL), None)
+    return route.path if route is not None else "unmatched"
+
+
+class MetricsMiddleware:
+    """Record latency, SQL statements and SQL time of every HTTP request, per route template, method and status."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        """Wrap app."""
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Run the request, then record its metrics, including failed ones as status 500."""
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            current_request.reset(token)
+            labels = {"method": scope["method"], "route": route_template(scope), "status": str(status)}
+            request_duration.observe(time.perf_counter() - started, **labels)
+            request_sql_statements.observe(stats.sql_statements, **labels)
+            request_sql_duration.observe(stats.sql_seconds, **labels)
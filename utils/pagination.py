@@ -0,0 +1,42 @@
+import json
+from typing import Literal, Optional, Tuple, Union
+
+from fastapi import HTTPException, status
+from fastapi_pagination.cursor import decode_cursor, encode_cursor
+
+PaginationMode = Literal["offset", "cursor"]
+
+
+def encode_keyset(*values: object) -> str:
+    """
+    Encode the sort key of the last returned row into an opaque cursor.
+
+    :param values: values of the sort key columns, in order.
+    """
+    return encode_cursor(json.dumps(values, separators=(",", ":")))
+
+
+def decode_keyset(cursor: Optional[str], *types: Union[type, Tuple[type, ...]]) -> Optional[Tuple]:
+    """
+    Decode an opaque cursor back into the sort key of the last returned row.
+
+    :param cursor: cursor from the previous page, if any.
+    :param types: expected type of each sort key column, in order; a tuple of types accepts any of them,
+        e.g. (int, type(None)) for a nullable integer column.
+    """
+    if not cursor:
+        return None
+
+    try:
+        values = json.loads(decode_cursor(cursor))
+    except ValueError:
+        values = None
+
+    if not (isinstance(values, list) and len(values) == len(types) and all(map(_is_instance, values, types))):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor value")
+    return tuple(values)
+
+
+def _is_instance(value: object, expected: Union[type, Tuple[type, ...]]) -> bool:
+    # JSON booleans are ints to isinstance, never a valid sort key.
+    return not isinstance(value, bool) and isinstance(value, expected)
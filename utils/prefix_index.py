@@ -0,0 +1,180 @@
+import unicodedata
+from bisect import bisect_left, insort
+from heapq import merge
+from collections.abc import Awaitable, Callable
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+def normalize(text: Optional[str]) -> str:
+    """Casefold, strip accents and collapse whitespace."""
+    text = unicodedata.normalize("NFKD", (text or "").casefold())
+    return " ".join("".join(char for char in text if not unicodedata.combining(char)).split())
+
+
+class PrefixIndex:
+    """
+    In-memory prefix index over normalized book titles and authors.
+
+    Keys are (normalized text, book ID) pairs kept in a sorted list and looked up with bisect,
+    so suggestions are served without touching the database. Batches of writes go through add_many and remove_many,
+    which rebuild the list in one pass instead of inserting or deleting keys one by one. Books with the genre "18+" are not indexed.
+
+    The index holds the catalog at version, None when unknown. Writes of this process are applied as they happen;
+    writes of other processes or imports move the catalog version away from it, and refresh rebuilds it.
+    """
+
+    def __init__(self) -> None:
+        """Start empty, at an unknown catalog version."""
+        self._keys: List[Tuple[str, int]] = []
+        self._books: Dict[int, Tuple[str, str]] = {}
+        self._writes = 0
+        self.version: Optional[int] = None
+
+    def __len__(self) -> int:
+        """Return the number of indexed books."""
+        return len(self._books)
+
+    def build(self, books: Iterable[Tuple[int, str, str, str]], version: Optional[int] = None) -> None:
+        """
+        Replace the index content.
+
+        :param books: (id, title, author, genre) rows.
+        :param version: catalog version the rows were read at.
+        """
+        keys: List[Tuple[str, int]] = []
+        indexed: Dict[int, Tuple[str, str]] = {}
+
+        for _id, title, author, genre in books:
+            if self._excluded(genre):
+                continue
+            indexed[_id] = (title, author)
+            keys.extend(self._keys_for(_id, title, author))
+
+        keys.sort()
+        self._keys, self._books, self.version = keys, indexed, version
+
+    def clear(self) -> None:
+        """Remove all books from the index."""
+        self._keys, self._books, self.version = [], {}, None
+
+    def advance(self, version: int) -> None:
+        """
+        Record the catalog version following a write applied to the index.
+
+        The index is at that version only if no other write came in between, its version is unknown otherwise.
+        Writes bumping the version more than once, e.g. spanning shards, leave it unknown as well.
+        """
+        self.version = version if self.version is not None and version - self.version in {0, 1} else None
+
+    async def refresh(self, version: int, load: Callable[[], Awaitable[Tuple[int, List[Tuple[int, str, str, str]]]]]) -> None:
+        """
+        Rebuild the index from load unless it is at the catalog version.
+
+        Books added or removed while load runs may be missing from what it returns: the rebuild is then dropped,
+        and made again by the next refresh.
+
+        :param version: current catalog version.
+        :param load: return the catalog version and the (id, title, author, genre) rows of all books, read at that version.
+        """
+        if version != self.version:
+            writes = self._writes
+            loaded_version, books = await load()
+            if self._writes == writes:
+                self.build(books, loaded_version)
+
+    def add(self, _id: int, title: str, author: str, genre: str) -> None:
+        """
+        Add a book, replacing the previous entry with the same ID.
+
+        :param _id: book ID.
+        """
+        self.remove(_id)
+        self._writes += 1
+        if self._excluded(genre):
+            return
+
+        self._books[_id] = (title, author)
+        for key in self._keys_for(_id, title, author):
+            insort(self._keys, key)
+
+    def add_many(self, books: Iterable[Tuple[int, str, str, str]]) -> None:
+        """
+        Add books, replacing previous entries with the same IDs, in a single merge of their sorted keys.
+
+        :param books: (id, title, author, genre) rows, the last one wins for a repeated ID.
+        """
+        books_by_id = {book[0]: book for book in books}
+        self.remove_many(books_by_id)
+
+        keys: List[Tuple[str, int]] = []
+        for _id, title, author, genre in books_by_id.values():
+            if self._excluded(genre):
+                continue
+            self._books[_id] = (title, author)
+            keys.extend(self._keys_for(_id, title, author))
+
+        keys.sort()
+        self._keys = list(merge(self._keys, keys))
+
+    def remove_many(self, ids: Iterable[int]) -> None:
+        """
+        Remove books if indexed, in a single pass over the keys.
+
+        :param ids: book IDs.
+        """
+        self._writes += 1
+        removed = {_id for _id in ids if self._books.pop(_id, None) is not None}
+        if removed:
+            self._keys = [key for key in self._keys if key[1] not in removed]
+
+    def remove(self, _id: int) -> None:
+        """
+        Remove a book if indexed.
+
+        :param _id: book ID.
+        """
+        self._writes += 1
+        book = self._books.pop(_id, None)
+        if book is None:
+            return
+
+        for key in self._keys_for(_id, *book):
+            position = bisect_left(self._keys, key)
+            if position < len(self._keys) and self._keys[position] == key:
+                del self._keys[position]
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Tuple[int, str, str]]:
+        """
+        Return up to limit (id, title, author) of books whose title or author starts with the prefix.
+
+        :param prefix: prefix typed by the user.
+        :param limit: max number of books to return.
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        result: List[Tuple[int, str, str]] = []
+        seen = set()
+
+        position = bisect_left(self._keys, (prefix,))
+        while position < len(self._keys) and len(result) < limit:
+            key, _id = self._keys[position]
+            if not key.startswith(prefix):
+                break
+            if _id not in seen:
+                seen.add(_id)
+                result.append((_id, *self._books[_id]))
+            position += 1
+        return result
+
+    @staticmethod
+    def _excluded(genre: Optional[str]) -> bool:
+        return "18+" in (genre or "")
+
+    @staticmethod
+    def _keys_for(_id: int, title: str, author: str) -> List[Tuple[str, int]]:
+        return [(key, _id) for key in {normalize(title), normalize(author)} if key]
+
+
+suggest_index = PrefixIndex()
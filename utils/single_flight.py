@@ -0,0 +1,58 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Dict, List, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Share one in-flight call and its result among concurrent callers with the same key.
+
+    The call runs as a task of its own, so a caller going away does not cancel it for the others.
+    Results are shared as they are: callers must not mutate them.
+    """
+
+    def __init__(self) -> None:
+        """Start with no call in flight, counting calls run (leaders) and calls sharing one (followers)."""
+        self.leaders = 0
+        self.followers = 0
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        """Return the number of calls in flight."""
+        return len(self._calls)
+
+    async def run(self, key: Hashable, call: Callable[[], Awaitable[T]]) -> T:
+        """Return the result of call, or of the call already in flight for the key."""
+        task = self._calls.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(call())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.followers += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception as retrieved when every caller went away before the call failed.
+        if not task.cancelled():
+            task.exception()
+
+    def render_metrics(self) -> List[str]:
+        """Return calls run and joined, and calls in flight, in Prometheus text format."""
+        return [
+            "# HELP single_flight_calls_total Coalesced read calls, run by a leader or joined by a follower.",
+            "# TYPE single_flight_calls_total counter",
+            f'single_flight_calls_total{{role="leader"}} {self.leaders}',
+            f'single_flight_calls_total{{role="follower"}} {self.followers}',
+            "# HELP single_flight_in_flight Coalesced read calls in flight.",
+            "# TYPE single_flight_in_flight gauge",
+            f"single_flight_in_flight {len(self)}",
+        ]
+
+
+read_flights = SingleFlight()
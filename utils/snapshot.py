@@ -0,0 +1,408 @@
+"""
+Read-only catalog snapshot shared by worker processes through a memory-mapped file.
+
+Books are stored as columns: fixed-width arrays for IDs and years, UTF-8 blobs with an array of offsets for
+titles and authors, and positions of books ordered by (genre, id) for grouped listings.
+Every worker maps the same file, so its pages live once in the page cache however many workers run,
+and values are decoded only for the books a request returns.
+
+A snapshot carries the catalog version it was built at as its generation. A new snapshot is written to a temporary
+file and renamed over the previous one, so workers map either version whole; those still reading the previous one
+keep their mapping until they let it go.
+"""
+
+import asyncio
+import fcntl
+import mmap
+import os
+import struct
+import tempfile
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Awaitable, Callable, Iterable, Iterator
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from utils.logger import logger
+
+# (id, title, author, publication_year, genre), with titles masked for books with the genre "18+".
+Row = Tuple[int, str, str, Optional[int], Optional[str]]
+
+MAGIC = b"BOOKSNP1"
+# Magic, generation, number of books.
+HEADER = struct.Struct("<8sqq")
+SECTIONS = (
+    "ids",
+    "years",
+    "title_offsets",
+    "titles",
+    "titles_lower",
+    "author_offsets",
+    "authors",
+    "authors_lower",
+    "searchable",
+    "row_genres",
+    "by_genre",
+    "genre_starts",
+    "genre_offsets",
+    "genres",
+)
+# (offset, length) in bytes of every section.
+TABLE = struct.Struct(f"<{2 * len(SECTIONS)}q")
+INTEGER_SECTIONS = frozenset({"ids", "years", "title_offsets", "author_offsets", "row_genres", "by_genre", "genre_starts", "genre_offsets"})
+NULL_YEAR = -(2**63)
+
+
+def _encode(values: Iterable[str]) -> Tuple[array, bytearray]:
+    """Return the offsets and the blob of UTF-8 encoded values, value i being blob[offsets[i]:offsets[i + 1]]."""
+    offsets, blob = array("q", [0]), bytearray()
+    for value in values:
+        blob += value.encode()
+        offsets.append(len(blob))
+    return offsets, blob
+
+
+def pack(rows: Iterable[Row]) -> Dict[str, object]:
+    """
+    Return the sections of a snapshot of rows ordered by ID.
+
+    Lowercased titles and authors are lowercased as SQLite lower() does, ASCII only, so they keep the offsets of the originals.
+    """
+    ids, years, titles, authors, row_genres = array("q"), array("q"), [], [], []
+    searchable = bytearray()
+    positions_by_genre: Dict[str, array] = {}
+
+    for position, (book_id, title, author, publication_year, genre) in enumerate(rows):
+        ids.append(book_id)
+        years.append(NULL_YEAR if publication_year is None else publication_year)
+        titles.append(title)
+        authors.append(author)
+        row_genres.append(genre)
+        # Same rule as the search queries: NOT (genre LIKE '%18+%') is not true for books without a genre.
+        searchable.append(genre is not None and "18+" not in genre)
+        if genre is not None:
+            positions_by_genre.setdefault(genre, array("q")).append(position)
+
+    genres = sorted(positions_by_genre)
+    genre_indexes = {genre: index for index, genre in enumerate(genres)}
+    by_genre, genre_starts = array("q"), array("q", [0])
+    for genre in genres:
+        by_genre.extend(positions_by_genre[genre])
+        genre_starts.append(len(by_genre))
+
+    title_offsets, title_blob = _encode(titles)
+    author_offsets, author_blob = _encode(authors)
+    genre_offsets, genre_blob = _encode(genres)
+    return {
+        "ids": ids,
+        "years": years,
+        "title_offsets": title_offsets,
+        "titles": title_blob,
+        "titles_lower": title_blob.lower(),
+        "author_offsets": author_offsets,
+        "authors": author_blob,
+        "authors_lower": author_blob.lower(),
+        "searchable": searchable,
+        "row_genres": array("q", (-1 if genre is None else genre_indexes[genre] for genre in row_genres)),
+        "by_genre": by_genre,
+        "genre_starts": genre_starts,
+        "genre_offsets": genre_offsets,
+        "genres": genre_blob,
+    }
+
+
+def write_snapshot(path: Path, generation: int, rows: Iterable[Row]) -> None:
+    """Write a snapshot of rows ordered by ID next to path and rename it over path."""
+    sections = pack(rows)
+    layout: List[int] = []
+    offset = HEADER.size + TABLE.size
+    for name in SECTIONS:
+        # Integer sections are cast in place, keep every section 8 bytes aligned.
+        offset += -offset % 8
+        layout += [offset, memoryview(sections[name]).nbytes]
+        offset += layout[-1]
+
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=f"{path.name}.", suffix=".tmp", delete=False) as file:
+        try:
+            file.write(HEADER.pack(MAGIC, generation, len(sections["ids"])))
+            file.write(TABLE.pack(*layout))
+            for name, start in zip(SECTIONS, layout[::2], strict=True):
+                file.write(bytes(start - file.tell()))
+                file.write(sections[name])
+        except BaseException:
+            Path(file.name).unlink()
+            raise
+    Path(file.name).replace(path)
+
+
+def read_generation(path: Path) -> Optional[int]:
+    """Return the generation of the snapshot at path, None if there is none."""
+    try:
+        with path.open("rb") as file:
+            magic, generation, _ = HEADER.unpack(file.read(HEADER.size))
+    except (FileNotFoundError, struct.error):
+        return None
+    return generation if magic == MAGIC else None
+
+
+class CatalogSnapshot:
+    """
+    Catalog snapshot mapped from a file, answering the read queries of database.crud.books without copying it.
+
+    Listings match db_get_censored and db_get_censored_after, search matches db_search in "substring" mode
+    for search terms without LIKE wildcards.
+    """
+
+    def __init__(self, path: Path) -> None:
+        """Map the snapshot file at path, raise ValueError if it is not one."""
+        with path.open("rb") as file:
+            self.inode = os.fstat(file.fileno()).st_ino
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.generation, self._size = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a catalog snapshot.")
+
+        layout = TABLE.unpack_from(self._map, HEADER.size)
+        self._starts = dict(zip(SECTIONS, layout[::2], strict=True))
+        view = memoryview(self._map)
+        self._sections = {
+            name: view[start : start + length].cast("q") if name in INTEGER_SECTIONS else view[start : start + length]
+            for name, start, length in zip(SECTIONS, layout[::2], layout[1::2], strict=True)
+        }
+        self._ids = self._sections["ids"]
+        self._by_genre = self._sections["by_genre"]
+        self._genre_starts = self._sections["genre_starts"]
+        self._genres = [self._text("genres", "genre_offsets", index) for index in range(len(self._genre_starts) - 1)]
+
+    def __len__(self) -> int:
+        """Return the number of books of the snapshot."""
+        return self._size
+
+    def _text(self, blob: str, offsets: str, row: int) -> str:
+        positions = self._sections[offsets]
+        return str(self._sections[blob][positions[row] : positions[row + 1]], "utf-8")
+
+    def _book(self, row: int) -> dict:
+        """Return the book of row as a dict shaped as schemas.book.CensoredBook."""
+        publication_year = self._sections["years"][row]
+        genre = self._sections["row_genres"][row]
+        return {
+            "title": self._text("titles", "title_offsets", row),
+            "author": self._text("authors", "author_offsets", row),
+            "publication_year": None if publication_year == NULL_YEAR else publication_year,
+            "genre": None if genre < 0 else self._genres[genre],
+            "id": self._ids[row],
+        }
+
+    def _groups(self, start: int, stop: int, genre: int) -> List[dict]:
+        """Group the books of by_genre[start:stop] by genre, the first of them being of the genre of index genre."""
+        result = []
+        while start < stop:
+            while self._genre_starts[genre + 1] <= start:
+                genre += 1
+            end = min(stop, self._genre_starts[genre + 1])
+            result.append(
+                {
+                    "books": [self._book(row) for row in self._by_genre[start:end]],
+                    "genre": self._genres[genre],
+                    "count": self._genre_starts[genre + 1] - self._genre_starts[genre],
+                },
+            )
+            start = end
+        return result
+
+    def count_genres(self) -> int:
+        """Return the number of distinct genres."""
+        return len(self._genres)
+
+    def get_censored(self, limit: Optional[int] = None, offset: int = 0) -> List[dict]:
+        """
+        Return a page of books grouped by genre and provide a count for each group, see books.db_get_censored.
+
+        :param limit: max number of genres to return.
+        :param offset: number of genres to skip.
+        """
+        first = min(offset, len(self._genres))
+        last = len(self._genres) if limit is None else min(offset + limit, len(self._genres))
+        return self._groups(self._genre_starts[first], self._genre_starts[last], first)
+
+    def get_censored_after(self, limit: int, after: Optional[Tuple[str, int]] = None) -> List[dict]:
+        """
+        Return the books following the (genre, id) keyset grouped by genre, see books.db_get_censored_after.
+
+        :param limit: max number of books to return.
+        :param after: (genre, id) of the last book of the previous page.
+        """
+        genre, start = 0, 0
+        if after:
+            genre = bisect_left(self._genres, after[0])
+            start = self._genre_starts[genre]
+            if genre < len(self._genres) and self._genres[genre] == after[0]:
+                start = bisect_right(self._by_genre, after[1], start, self._genre_starts[genre + 1], key=self._ids.__getitem__)
+        return self._groups(start, min(start + limit, len(self._by_genre)), genre)
+
+    def _rows_containing(self, blob: str, offsets: str, needle: bytes, row: int) -> Iterator[int]:
+        """Yield the rows from row on whose value in blob contains needle, found by scanning the mapped blob."""
+        base, positions = self._starts[blob], self._sections[offsets]
+        position, end = base + positions[row], base + positions[-1]
+        while (found := self._map.find(needle, position, end)) != -1:
+            row = bisect_right(positions, found - base, row) - 1
+            if found - base + len(needle) <= positions[row + 1]:
+                yield row
+                position = base + positions[row + 1]
+            else:
+                # The match spans two values, look again from its next byte.
+                position = found + 1
+
+    def _contains(self, blob: str, offsets: str, needle: bytes, row: int) -> bool:
+        base, positions = self._starts[blob], self._sections[offsets]
+        return self._map.find(needle, base + positions[row], base + positions[row + 1]) != -1
+
+    def search(self, title: Optional[str] = None, author: Optional[str] = None, limit: Optional[int] = None, after: Optional[int] = None) -> List[dict]:
+        """
+        Search for books by title or author, see books.db_search in "substring" mode.
+
+        Search terms are literal: unlike LIKE patterns, "%" and "_" only match themselves.
+        As in the database, terms are lowercased with str.lower() but titles and authors as SQLite lower() does,
+        ASCII only: a term never matches an uppercase non-ASCII letter, e.g. "émile" does not match "Émile".
+        Return dicts shaped as schemas.book.BookGet, ordered by ID.
+
+        :param title: title of the book.
+        :param author: author of the book.
+        :param limit: max number of books to return.
+        :param after: ID of the last book of the previous page.
+        """
+        needles = [(blob, offsets, value.lower().encode()) for blob, offsets, value in (("titles_lower", "title_offsets", title), ("authors_lower", "author_offsets", author)) if value]
+        start = 0 if after is None else bisect_right(self._ids, after)
+        rows = self._rows_containing(*needles[0], start) if needles else range(start, self._size)
+
+        searchable = self._sections["searchable"]
+        result: List[dict] = []
+        for row in rows:
+            if limit is not None and len(result) >= limit:
+                break
+            if searchable[row] and all(self._contains(*needle, row) for needle in needles[1:]):
+                result.append(self._book(row))
+        return result
+
+
+class SharedSnapshot:
+    """
+    The catalog snapshot of a file shared by worker processes, disabled until configured with a path.
+
+    A worker serves from the snapshot only while its generation equals the catalog version, otherwise it falls back to
+    the database and schedules a rebuild. One worker at a time rebuilds, holding an exclusive lock on path + ".lock";
+    the others remap the file once it is replaced.
+    """
+
+    def __init__(self) -> None:
+        """Start disabled, see configure."""
+        self.path: Optional[Path] = None
+        self.rebuilds = 0
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._get_version: Optional[Callable[[], Awaitable[int]]] = None
+        self._load: Optional[Callable[[], Awaitable[Tuple[int, List[Row]]]]] = None
+        self._min_interval = 0.0
+        self._last_rebuild = -float("inf")
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        """Whether a snapshot path is configured."""
+        return self.path is not None
+
+    def configure(
+        self,
+        path: Optional[str],
+        get_version: Callable[[], Awaitable[int]],
+        load: Callable[[], Awaitable[Tuple[int, List[Row]]]],
+        min_interval: float = 0.0,
+    ) -> None:
+        """
+        Enable the snapshot at path, or disable it if path is None.
+
+        :param get_version: return the current catalog version.
+        :param load: return the catalog version and all rows ordered by ID, the version being read before the rows.
+        :param min_interval: min number of seconds between two rebuilds scheduled by the same worker.
+        """
+        self.path = None if path is None else Path(path)
+        self._get_version, self._load, self._min_interval = get_version, load, min_interval
+        self._snapshot = None
+
+    def current(self, generation: int) -> Optional[CatalogSnapshot]:
+        """Return the snapshot of the generation, remapping the file if replaced; schedule a rebuild and return None if there is none."""
+        if not self.enabled:
+            return None
+        if self._snapshot is None or self._snapshot.generation != generation:
+            self._remap()
+        if self._snapshot is not None and self._snapshot.generation == generation:
+            return self._snapshot
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._scheduled_rebuild())
+        return None
+
+    def _remap(self) -> None:
+        """Map the file at path if it is not the one mapped already."""
+        try:
+            inode = self.path.stat().st_ino
+        except FileNotFoundError:
+            return
+        if self._snapshot is None or self._snapshot.inode != inode:
+            self._snapshot = CatalogSnapshot(self.path)
+
+    async def wait(self) -> None:
+        """Wait for the rebuild scheduled by this worker, if any."""
+        if self._task is not None:
+            await self._task
+
+    async def _scheduled_rebuild(self) -> None:
+        await asyncio.sleep(self._last_rebuild + self._min_interval - time.monotonic())
+        self._last_rebuild = time.monotonic()
+        try:
+            await self.rebuild()
+        except (OSError, SQLAlchemyError):
+            logger.exception("Catalog snapshot rebuild failed.")
+
+    async def rebuild(self) -> bool:
+        """
+        Rebuild the snapshot unless it is at the current catalog version or another worker is rebuilding it.
+
+        Return whether this worker wrote a new snapshot.
+        """
+        with (self.path.parent / f"{self.path.name}.lock").open("a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+
+            if read_generation(self.path) == await self._get_version():
+                self._remap()
+                return False
+
+            started = time.perf_counter()
+            generation, rows = await self._load()
+            await asyncio.to_thread(write_snapshot, self.path, generation, rows)
+            self._remap()
+
+        self.rebuilds += 1
+        logger.info("Catalog snapshot rebuilt.", extra={"generation": generation, "books": len(rows), "seconds": round(time.perf_counter() - started, 3)})
+        return True
+
+    def render_metrics(self) -> List[str]:
+        """Return the mapped generation and the rebuilds of this worker in Prometheus text format."""
+        return [
+            "# HELP catalog_snapshot_generation Catalog version of the mapped snapshot, -1 if none.",
+            "# TYPE catalog_snapshot_generation gauge",
+            f"catalog_snapshot_generation {-1 if self._snapshot is None else self._snapshot.generation}",
+            "# HELP catalog_snapshot_rebuilds_total Snapshots written by this worker.",
+            "# TYPE catalog_snapshot_rebuilds_total counter",
+            f"catalog_snapshot_rebuilds_total {self.rebuilds}",
+        ]
+
+
+catalog_snapshot = SharedSnapshot()